@@ -0,0 +1,63 @@
+import os
+
+from panda3d.core import BamFile, BamWriter, Filename, NodePath, LoaderOptions
+from panda3d.core import Loader as PandaLoader
+
+# Cache de modelos convertidos para .bam. O .bam guarda as texturas já
+# decodificadas e redimensionadas (modo rawdata), então carregar o skybox não
+# decodifica mais os PNGs nem reescala para potência de 2, e os .glb não
+# precisam do importador. Um .bam só é usado se for mais novo que o original.
+
+
+def cachedPath(cacheDir, source):
+    return os.path.join(cacheDir, source.replace('/', '_').replace('\\', '_') + '.bam')
+
+
+def isFresh(cacheDir, source):
+    bam = cachedPath(cacheDir, source)
+    return os.path.exists(bam) and os.path.getmtime(bam) >= os.path.getmtime(source)
+
+
+def modelPath(cacheDir, source):
+    # Caminho que deve ser carregado: o .bam se estiver em dia, senão o original
+    if cacheDir and isFresh(cacheDir, source):
+        return Filename.fromOsSpecific(os.path.abspath(cachedPath(cacheDir, source)))
+    return source
+
+
+def requestModel(cacheDir, source):
+    # Começa a carregar em uma thread do Loader; modelResult espera o fim
+    loader = PandaLoader.getGlobalPtr()
+    request = loader.makeAsyncRequest(Filename(modelPath(cacheDir, source)), LoaderOptions())
+    loader.loadAsync(request)
+    return request
+
+
+def modelResult(request):
+    node = request.result()
+    if node is None:
+        raise IOError(f'could not load {request.getFilename()}')
+    return NodePath(node)
+
+
+def writeModel(cacheDir, source, model):
+    os.makedirs(cacheDir, exist_ok=True)
+    path = cachedPath(cacheDir, source)
+    temporary = path + '.tmp'
+    bam = BamFile()
+    if not bam.openWrite(Filename.fromOsSpecific(temporary)):
+        raise IOError(f'could not write {temporary}')
+    bam.getWriter().setFileTextureMode(BamWriter.BTM_rawdata)
+    bam.writeObject(model.node() if isinstance(model, NodePath) else model)
+    bam.close()
+    os.replace(temporary, path)
+
+
+def bakeModels(loader, cacheDir, sources, force=False):
+    # -> fontes convertidas agora
+    baked = []
+    for source in sources:
+        if force or not isFresh(cacheDir, source):
+            writeModel(cacheDir, source, loader.loadModel(source, noCache=True))
+            baked.append(source)
+    return baked
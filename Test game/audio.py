@@ -0,0 +1,78 @@
+from collections import deque
+
+from panda3d.core import AudioSound
+
+# Sons curtos carregados uma vez, cada um com um número fixo de vozes
+# (AudioSounds que dividem os mesmos dados decodificados). Tocar um som só
+# escolhe uma voz livre, sem carregar nem alocar nada. Quando todas as vozes
+# estão tocando, ou o limite de sons simultâneos foi atingido, a voz mais
+# antiga é interrompida e reaproveitada.
+
+
+class SoundPool:
+    def __init__(self, loader, fileName, voices):
+        self.voices = [loader.loadSfx(fileName) for _ in range(voices)]
+        self.next = 0
+
+    def voice(self):
+        for _ in range(len(self.voices)):
+            voice = self.voices[self.next]
+            self.next = (self.next + 1) % len(self.voices)
+            if voice.status() != AudioSound.PLAYING:
+                return voice
+        # Todas ocupadas: rouba a que começou primeiro
+        voice = self.voices[self.next]
+        self.next = (self.next + 1) % len(self.voices)
+        voice.stop()
+        return voice
+
+
+class AudioManager:
+    def __init__(self, loader, taskMgr, voicesPerSound=4, maxVoices=8):
+        self.loader = loader
+        self.taskMgr = taskMgr
+        self.voicesPerSound = voicesPerSound
+        self.maxVoices = maxVoices
+        self.pools = {}
+        self.playing = deque()  # vozes na ordem em que começaram
+        self.music = None
+
+    def preload(self, *fileNames):
+        for fileName in fileNames:
+            if fileName not in self.pools:
+                self.pools[fileName] = SoundPool(self.loader, fileName, self.voicesPerSound)
+
+    def playSound(self, fileName, volume=1.0):
+        pool = self.pools.get(fileName)
+        if pool is None:
+            self.preload(fileName)
+            pool = self.pools[fileName]
+
+        while self.playing and self.playing[0].status() != AudioSound.PLAYING:
+            self.playing.popleft()
+        voice = pool.voice()
+        if voice in self.playing:
+            self.playing.remove(voice)
+        if len(self.playing) >= self.maxVoices:
+            self.playing.popleft().stop()
+
+        voice.setVolume(volume)
+        voice.play()
+        self.playing.append(voice)
+
+    def playMusic(self, fileName, loop=True, volume=0.3):
+        # Espera o primeiro frame e carrega em segundo plano (o Loader abre
+        # a música como stream, sem decodificar o arquivo inteiro)
+        def start(music):
+            self.music = music
+            music.setLoop(loop)
+            music.setVolume(volume)
+            music.play()
+
+        def load(task):
+            if task.frame < 1:
+                return task.cont
+            self.loader.loadMusic(fileName, callback=start)
+            return task.done
+
+        self.taskMgr.add(load, 'load-music')
@@ -0,0 +1,33 @@
+import argparse
+
+from panda3d.core import loadPrcFile, loadPrcFileData, ConfigVariableString
+
+from assets import bakeModels
+from blocks import BLOCK_TYPES
+
+# Converte os modelos do jogo para .bam no cache antes de jogar, para a
+# primeira partida já abrir com o cache quente.
+#
+#   python bakeassets.py [--force]
+
+MODELS = [blockType.model for blockType in BLOCK_TYPES.values()] + ['skybox/skybox.egg']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--force', action='store_true', help='converte mesmo os que estão em dia')
+    args = parser.parse_args()
+
+    loadPrcFile('settings.prc')
+    loadPrcFileData('', 'window-type none\naudio-library-name null')
+    cacheDir = ConfigVariableString('asset-cache-dir', 'cache').getValue()
+
+    from direct.showbase.Loader import Loader
+    loader = Loader(None)
+    baked = bakeModels(loader, cacheDir, MODELS, args.force)
+    for source in MODELS:
+        print(f"{source:<22} {'baked' if source in baked else 'up to date'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import time
+import argparse
+
+from world import World, CHUNK_VOLUME
+from terrain import TerrainGenerator
+from lighting import LightMap
+from meshing import buildChunkMesh
+
+# Custo da oclusão ambiente nas malhas: vértices e tempo de malha de uma área
+# de raio N colunas, com e sem oclusão, nos dois modos de malha. Também mede o
+# que uma edição custa: refazer o chunk do bloco (e os vizinhos de borda, que
+# com oclusão incluem os das diagonais). Não precisa do Panda3D.
+#
+#   python bench_ao.py [--radius 4] [--amplitude 24] [--edits 50]
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--radius', type=int, default=4, help='raio, em colunas de chunks')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--amplitude', type=int, default=24)
+    parser.add_argument('--edits', type=int, default=50, help='chunks refeitos para medir uma edição')
+    return parser.parse_args()
+
+
+def meshArea(world, keys, greedy, light, ao):
+    vertices = triangles = 0
+    start = time.perf_counter()
+    for key in keys:
+        mesh = buildChunkMesh(world, key, greedy, 0, light, ao)
+        vertices += mesh.vertexCount
+        triangles += mesh.triangleCount
+    return vertices, triangles, time.perf_counter() - start
+
+
+def main():
+    args = parseArgs()
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    world = World()
+    light = LightMap(world)
+    # Uma coluna a mais em volta para as faces da borda
+    for cx in range(-args.radius - 1, args.radius + 2):
+        for cy in range(-args.radius - 1, args.radius + 2):
+            for chunk in generator.generateColumn(cx, cy):
+                world.addChunk(chunk)
+    for cx in range(-args.radius - 1, args.radius + 2):
+        for cy in range(-args.radius - 1, args.radius + 2):
+            light.lightColumn(cx, cy)
+    keys = [key for cx in range(-args.radius, args.radius + 1) for cy in range(-args.radius, args.radius + 1)
+            for key in world.columnKeys(cx, cy)]
+    print(f"radius {args.radius} columns, {len(keys)} chunks meshed")
+
+    for mode, greedy in (('culled', False), ('greedy', True)):
+        baseline = None
+        for ao in (False, True):
+            vertices, triangles, seconds = meshArea(world, keys, greedy, light, ao)
+            if baseline is None:
+                baseline = vertices, seconds
+            print(f"{mode:<7} ao {'on ' if ao else 'off'}  vertices {vertices:8d} ({vertices / baseline[0]:5.1%})   "
+                  f"triangles {triangles:8d}   build {seconds:6.2f} s ({seconds / baseline[1]:4.2f}x)   "
+                  f"{seconds / len(keys) * 1000:6.2f} ms/chunk")
+
+    # Uma edição: os chunks com superfície (nem vazios nem cheios), refeitos um a um
+    edited = [key for key in keys if world.getChunk(*key).count not in (0, CHUNK_VOLUME)][:args.edits]
+    for mode, greedy in (('culled', False), ('greedy', True)):
+        times = []
+        for ao in (False, True):
+            start = time.perf_counter()
+            for key in edited:
+                buildChunkMesh(world, key, greedy, 0, light, ao)
+            times.append((time.perf_counter() - start) / len(edited) * 1000)
+        # Sem oclusão uma edição no canto refaz até 4 chunks; com oclusão, até 8
+        print(f"{mode:<7} rebuild per chunk  ao off {times[0]:6.2f} ms   ao on {times[1]:6.2f} ms   "
+              f"corner edit  ao off {times[0] * 4:6.2f} ms   ao on {times[1] * 8:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
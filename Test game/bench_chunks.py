@@ -0,0 +1,89 @@
+import time
+import random
+import argparse
+from array import array
+
+from world import World, Chunk, CHUNK_VOLUME, PALETTE_BITS, AIR, STONE
+from terrain import TerrainGenerator
+
+# Chunks com paleta contra um array de bytes por chunk: memória por chunk,
+# get/set aleatórios e leitura do chunk inteiro (toBytes, usado pelas malhas).
+#
+#   python bench_chunks.py [--size 32] [--seed 1234] [--amplitude 24] [--ops 200000]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--size', type=int, default=32, help='lado da área, em colunas de chunks')
+parser.add_argument('--seed', type=int, default=1234)
+parser.add_argument('--amplitude', type=int, default=24)
+parser.add_argument('--ops', type=int, default=200000, help='gets e sets aleatórios')
+args = parser.parse_args()
+
+
+def rate(count, seconds):
+    return f"{count / seconds / 1e6:6.2f} M/s"
+
+
+def main():
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    world = World()
+    for cx in range(-args.size // 2, args.size // 2):
+        for cy in range(-args.size // 2, args.size // 2):
+            for chunk in generator.generateColumn(cx, cy):
+                world.addChunk(chunk)
+
+    stats = world.memoryStats()
+    chunks = list(world.chunks.values())
+    raw = [array('B', chunk.toBytes()) for chunk in chunks]
+    rawBytes = sum(blocks.buffer_info()[1] + 64 for blocks in raw)  # itens + cabeçalho do array
+    byBits = '  '.join(f"{bits}b:{stats['byBits'][bits]}" for bits in PALETTE_BITS)
+    print(f"{stats['chunks']} chunks, {stats['blocks'] / 1e6:.2f} M blocks  ({byBits})")
+    print(f"palette  {stats['bytes'] / 1e6:8.2f} MB  {stats['bytesPerChunk']:7.0f} B/chunk")
+    print(f"raw      {rawBytes / 1e6:8.2f} MB  {rawBytes / len(raw):7.0f} B/chunk  "
+          f"({rawBytes / stats['bytes']:.1f}x more)")
+
+    # Acessos aleatórios nos mesmos índices, na paleta e no array
+    rng = random.Random(args.seed)
+    picks = [(rng.randrange(len(chunks)), rng.randrange(CHUNK_VOLUME)) for _ in range(args.ops)]
+    start = time.perf_counter()
+    for chunkIndex, index in picks:
+        chunks[chunkIndex].get(index)
+    paletteGet = time.perf_counter() - start
+    start = time.perf_counter()
+    for chunkIndex, index in picks:
+        raw[chunkIndex][index]
+    rawGet = time.perf_counter() - start
+    print(f"get      palette {rate(args.ops, paletteGet)}  raw {rate(args.ops, rawGet)}")
+
+    values = [rng.choice((AIR, STONE)) for _ in range(args.ops)]
+    start = time.perf_counter()
+    for (chunkIndex, index), blockId in zip(picks, values):
+        chunks[chunkIndex].set(index, blockId)
+    paletteSet = time.perf_counter() - start
+    start = time.perf_counter()
+    for (chunkIndex, index), blockId in zip(picks, values):
+        raw[chunkIndex][index] = blockId
+    rawSet = time.perf_counter() - start
+    print(f"set      palette {rate(args.ops, paletteSet)}  raw {rate(args.ops, rawSet)}")
+    assert all(chunk.toBytes() == blocks.tobytes() for chunk, blocks in zip(chunks, raw))
+
+    # Chunk inteiro em bytes, do jeito que as malhas e o save leem
+    start = time.perf_counter()
+    for chunk in chunks:
+        chunk.toBytes()
+    paletteBulk = time.perf_counter() - start
+    start = time.perf_counter()
+    for blocks in raw:
+        blocks.tobytes()
+    rawBulk = time.perf_counter() - start
+    blocks = len(chunks) * CHUNK_VOLUME
+    print(f"toBytes  palette {rate(blocks, paletteBulk)}  raw {rate(blocks, rawBulk)}  "
+          f"({paletteBulk / len(chunks) * 1e6:.0f} us/chunk)")
+
+    start = time.perf_counter()
+    packed = [Chunk.fromBytes(chunk.key, blocks.tobytes(), chunk.count) for chunk, blocks in zip(chunks, raw)]
+    fromBytes = time.perf_counter() - start
+    print(f"fromBytes        {rate(blocks, fromBytes)}  ({fromBytes / len(packed) * 1e6:.0f} us/chunk)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import time
+import argparse
+
+import numpy as np
+
+from world import World, BLOCK_SIZE, CHUNK_SIZE, DIRT, STONE
+from terrain import TerrainGenerator
+from lighting import LightMap
+from physics import GRAVITY, moveBox
+from entities import Entities, ITEM, MOB
+
+try:
+    from chunkgeom import EntityGeom
+    from panda3d.core import RenderState
+except ImportError:  # sem Panda3D não mede a cópia para o Geom
+    EntityGeom = None
+
+# Entidades (entities.py) em degraus de quantidade num terreno com morros:
+# itens e mobs caem de alturas ao acaso, assentam, e os mobs continuam
+# andando. Por degrau mostra o custo por frame, como no jogo a 60 FPS: um
+# tick, uma busca de coleta no hash espacial, os vértices de desenho e a
+# cópia para o Geom, e quanto disso cabe no frame. Para comparar, o custo por entidade de mover uma
+# a uma em Python com physics.moveBox, como é feito para o jogador.
+#
+#   python bench_entities.py [--counts 1000,5000,10000,20000] [--mobs 0.25]
+
+DT = 1 / 60
+FRAME_MS = 1000 / 60
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counts', default='1000,2500,5000,10000,20000', help='quantidades de entidades')
+    parser.add_argument('--mobs', type=float, default=0.25, help='fração de mobs, o resto são itens')
+    parser.add_argument('--radius', type=int, default=6, help='área em colunas de chunks em volta da origem')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--amplitude', type=int, default=24)
+    parser.add_argument('--warmup', type=int, default=180, help='ticks até os itens assentarem')
+    parser.add_argument('--ticks', type=int, default=300, help='ticks medidos')
+    parser.add_argument('--scalar', type=int, default=500, help='entidades no teste uma a uma')
+    args = parser.parse_args()
+    args.counts = [int(count) for count in args.counts.split(',')]
+    return args
+
+
+def buildWorld(args):
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    world = World()
+    light = LightMap(world)
+    columns = {(cx, cy) for cx in range(-args.radius, args.radius) for cy in range(-args.radius, args.radius)}
+    for cx, cy in columns:
+        for chunk in generator.generateColumn(cx, cy):
+            world.addChunk(chunk)
+    for cx, cy in columns:
+        light.lightColumn(cx, cy)
+    return generator, world, light, columns
+
+
+def spawnPositions(rng, generator, count, extent):
+    # Espalhadas na área, de 2 a 20 unidades acima do chão
+    xs = rng.uniform(-extent, extent, count)
+    ys = rng.uniform(-extent, extent, count)
+    ground = np.array([generator.heightAt(int(x // BLOCK_SIZE), int(y // BLOCK_SIZE)) for x, y in zip(xs, ys)])
+    return np.column_stack([xs, ys, ground * BLOCK_SIZE + 1 + rng.uniform(2, 20, count)])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def runStep(args, generator, world, light, columns, count):
+    rng = np.random.default_rng(count)
+    extent = (args.radius - 1) * CHUNK_SIZE * BLOCK_SIZE
+    entities = Entities(world, light, seed=args.seed)
+    mobs = int(count * args.mobs)
+    entities.spawn(MOB, spawnPositions(rng, generator, mobs, extent), (0, 0, 0), DIRT)
+    velocities = np.column_stack([rng.uniform(-2, 2, count - mobs), rng.uniform(-2, 2, count - mobs), np.full(count - mobs, 4.0)])
+    entities.spawn(ITEM, spawnPositions(rng, generator, count - mobs, extent), velocities, rng.integers(1, STONE + 1, count - mobs))
+    for _ in range(args.warmup):
+        entities.step(DT, columns)
+
+    # Um frame como no jogo: um tick, a coleta em volta de um ponto (refaz o
+    # hash), os vértices e a cópia para o Geom
+    geom = EntityGeom(RenderState.makeEmpty()) if EntityGeom is not None else None
+    entities.buildVertices(0.5)
+    timings = {name: [] for name in ('tick', 'query', 'vertices', 'upload')}
+    points = np.column_stack([rng.uniform(-extent, extent, args.ticks), rng.uniform(-extent, extent, args.ticks),
+                              np.zeros(args.ticks)])
+    for frame in range(args.ticks):
+        start = time.perf_counter()
+        entities.step(DT, columns)
+        tick = time.perf_counter()
+        entities.nearby(points[frame], 8.0)
+        query = time.perf_counter()
+        vertices, indices = entities.buildVertices(0.5)
+        built = time.perf_counter()
+        if geom is not None:
+            geom.update(vertices, indices)
+        uploaded = time.perf_counter()
+        timings['tick'].append((tick - start) * 1000)
+        timings['query'].append((query - tick) * 1000)
+        timings['vertices'].append((built - query) * 1000)
+        timings['upload'].append((uploaded - built) * 1000)
+    frames = [sum(parts) for parts in zip(*timings.values())]
+
+    n = entities.count
+    resting = int((entities.onGround[:n] & (entities.vel[:n, 0] == 0) & (entities.vel[:n, 1] == 0)).sum())
+    median = {name: percentile(values, 0.5) for name, values in timings.items()}
+    print(f"entities {count:6d} ({n:6d} after merging, {resting:6d} resting)   "
+          f"tick {median['tick']:5.2f}   hash + query {median['query']:5.2f}   vertices {median['vertices']:5.2f}   "
+          f"upload {median['upload']:5.2f} ms   frame p50 {percentile(frames, 0.5):6.2f} ms   "
+          f"p99 {percentile(frames, 0.99):6.2f} ms ({percentile(frames, 0.99) / FRAME_MS:5.1%} of the budget)")
+    return median['tick'] / count * 1000
+
+
+def runScalar(args, generator, world, count):
+    # Mesmo movimento, entidade por entidade (caixa do jogador, physics.moveBox)
+    rng = np.random.default_rng(0)
+    extent = (args.radius - 1) * CHUNK_SIZE * BLOCK_SIZE
+    positions = spawnPositions(rng, generator, count, extent).tolist()
+    velocities = [[rng.uniform(-3, 3), rng.uniform(-3, 3), 0.0] for _ in range(count)]
+    times = []
+    for _ in range(args.warmup // 3 + 30):
+        start = time.perf_counter()
+        for index in range(count):
+            velocity = velocities[index]
+            velocity[2] = max(velocity[2] + GRAVITY * DT, -40.0)
+            positions[index], blocked = moveBox(world, positions[index], [component * DT for component in velocity])
+            if blocked[2]:
+                velocity[2] = 0.0
+        times.append((time.perf_counter() - start) * 1000)
+    return percentile(times[-30:], 0.5) / count * 1000
+
+
+def main():
+    args = parseArgs()
+    generator, world, light, columns = buildWorld(args)
+    print(f"{len(columns)} columns, {len(world.chunks)} chunks, mobs {args.mobs:.0%}, "
+          f"{args.ticks} ticks per step after {args.warmup} warmup, frame budget {FRAME_MS:.1f} ms")
+    perEntity = [runStep(args, generator, world, light, columns, count) for count in args.counts]
+    scalarUs = runScalar(args, generator, world, args.scalar)
+    print(f"per entity and tick: numpy {min(perEntity):.2f}-{max(perEntity):.2f} us, "
+          f"one by one in Python {scalarUs:.2f} us ({args.scalar} entities) -> "
+          f"{FRAME_MS * 1000 / scalarUs:.0f} entities fill a 60 FPS frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+# Roda o jogo sem janela (offscreen ou window-type none) com roteiros de
+# jogador e grava tempos de frame, inicialização, geração de terreno e
+# memória em JSON, para comparar entre versões numa máquina sem GPU.
+#
+#   python bench_game.py [--scenarios walk,sprint] [--frames 600] [--output bench_game.json]
+#   python bench_game.py --replay sessao.rec   (sessão gravada com input-record-file)
+#
+# Cada cenário roda num processo separado (um ShowBase por processo). O
+# relógio do jogo anda 1/60 s por frame, então a simulação é a mesma em
+# qualquer máquina; só o tempo de cada frame muda. Um replay roda até o fim
+# da sessão gravada, e a posição final do jogador mostra se ela se repetiu.
+
+SCENARIOS = ['walk', 'sprint', 'mass-place', 'mass-remove', 'world-edge']
+WARMUP_FRAMES = 60
+
+# Colunas em volta do jogador (em blocos) onde os cenários de edição mexem
+EDIT_RING = [(x, y) for x in range(-5, 6) for y in range(-5, 6) if max(abs(x), abs(y)) >= 3]
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--window-type', default='offscreen', choices=['offscreen', 'none'])
+    parser.add_argument('--output', default='bench_game.json')
+    parser.add_argument('--replay', default=None, help='sessão gravada para repetir no lugar dos cenários')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def peakMemoryMb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1e6
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Roteiros: chamados antes de cada frame com (jogo, frame)
+
+def walk(game, frame):
+    # Anda em quadrado
+    game.keyMap['forward'] = True
+    game.playerNode.setH((frame // 120) * 90)
+
+
+def sprint(game, frame):
+    game.keyMap['forward'] = True
+    game.keyMap['sprint'] = True
+    game.keyMap['up'] = frame % 60 < 5
+
+
+def aimAtColumn(game, frame):
+    # Mira no topo de uma coluna do anel, uma diferente por frame
+    from world import blockToWorld, worldToBlock
+    px, py, pz = worldToBlock(*game.playerNode.getPos())
+    dx, dy = EDIT_RING[frame % len(EDIT_RING)]
+    x, y = px + dx, py + dy
+    z = pz + 8
+    while z > pz - 16 and not game.world.isSolid(x, y, z):
+        z -= 1
+    wx, wy, wz = blockToWorld(x, y, z)
+    game.camera.lookAt(game.render, wx, wy, wz + 1)
+
+
+def massPlace(game, frame):
+    # Um bloco por frame em cima das colunas em volta (vira pilares)
+    aimAtColumn(game, frame)
+    game.placeBlock()
+
+
+def massRemove(game, frame):
+    # Um bloco por frame do topo das colunas em volta (vira buracos)
+    aimAtColumn(game, frame)
+    game.removeBlock()
+
+
+def worldEdge(game, frame):
+    # Corre na diagonal, sempre na borda do que já foi carregado
+    game.keyMap['forward'] = True
+    game.keyMap['sprint'] = True
+    game.playerNode.setH(45)
+
+
+SCRIPTS = {
+    'walk': walk,
+    'sprint': sprint,
+    'mass-place': massPlace,
+    'mass-remove': massRemove,
+    'world-edge': worldEdge,
+}
+
+
+def runScenario(name, frames, windowType, replay=None):
+    from panda3d.core import loadPrcFileData, ClockObject, PerspectiveLens
+
+    start = time.perf_counter()
+    import minecraft
+    # Depois do settings.prc, para valer por cima dele
+    loadPrcFileData('bench_game', '\n'.join([
+        f'window-type {windowType}',
+        'win-size 800 600',
+        'audio-library-name null',
+        'sync-video #f',
+        'world-save-dir',
+        'quality-governor #f',
+        f'input-replay-file {replay or ""}',
+    ]))
+    class BenchmarkGame(minecraft.Minecraft):
+        edits = 0
+        replayDone = False
+
+        def captureMouse(self):
+            self.cameraSwingActivated = False
+
+        def releaseMouse(self):
+            self.cameraSwingActivated = False
+
+        def setupCamera(self):
+            if self.camera is None:
+                # window-type none: sem janela o ShowBase não cria câmera
+                self.camera = self.render.attachNewNode('camera')
+                self.camLens = PerspectiveLens()
+            super().setupCamera()
+
+        def blockChanged(self, x, y, z, old):
+            self.edits += 1
+            super().blockChanged(x, y, z, old)
+
+        def replayFinished(self):
+            self.replayDone = True
+            super().replayFinished()
+
+    game = BenchmarkGame()
+    startupMs = (time.perf_counter() - start) * 1000
+
+    for frame in range(WARMUP_FRAMES):
+        game.taskMgr.step()
+    # Depois do menu (o slider de FPS liga o limite de 60 FPS ao ser criado)
+    clock = ClockObject.getGlobalClock()
+    clock.setMode(ClockObject.MNonRealTime)
+    clock.setFrameRate(60)
+
+    script = SCRIPTS.get(name)
+    origin = game.playerNode.getPos()
+    frameTimes = []
+    stalled = 0
+    # Um replay roda até acabar a sessão, não um número fixo de frames
+    for frame in range(sys.maxsize if replay else frames):
+        if game.replayDone:
+            break
+        if script is not None:
+            script(game, frame)
+        begin = time.perf_counter()
+        game.taskMgr.step()
+        frameTimes.append((time.perf_counter() - begin) * 1000)
+        if not game.streamer.isLoaded(game.playerNode.getX(), game.playerNode.getY()):
+            stalled += 1
+
+    phases = {phase: seconds * 1000 for phase, seconds, deferred in game.startup.phases}
+    result = {
+        'frames': len(frameTimes),
+        'frameMs': {
+            'mean': sum(frameTimes) / len(frameTimes),
+            'p50': percentile(frameTimes, 0.50),
+            'p90': percentile(frameTimes, 0.90),
+            'p99': percentile(frameTimes, 0.99),
+            'max': max(frameTimes),
+        },
+        'startupMs': startupMs,
+        'firstFrameMs': game.startup.firstFrame * 1000 if game.startup.firstFrame is not None else None,
+        'terrainMs': phases.get('terrain data', 0.0) + phases.get('terrain meshes', 0.0),
+        'startupPhasesMs': phases,
+        'peakMemoryMb': peakMemoryMb(),
+        'chunks': len(game.world.chunks),
+        'chunkMemory': game.world.memoryStats(),
+        'meshedChunks': len(game.streamer.chunkNodes),
+        'culling': game.culling.stats if game.culling is not None else None,
+        'edits': game.edits,
+        'stalledFrames': stalled,
+        'sectionsMs': {name: {'mean': mean, 'max': peak} for name, (mean, peak) in game.profiler.summary(frames).items()},
+        'distance': (game.playerNode.getPos() - origin).length(),
+        'finalPos': list(game.player.pos),
+        'simulationTicks': game.simulationTick,
+    }
+    game.streamer.shutdown()
+    return result
+
+
+def main():
+    args = parseArgs()
+    names = ['replay'] if args.replay else args.scenarios.split(',')
+    for name in names:
+        if name not in SCRIPTS and not args.replay:
+            sys.exit(f'unknown scenario {name}; choose from {", ".join(SCENARIOS)}')
+
+    if args.child:
+        result = runScenario(names[0], args.frames, args.window_type, args.replay)
+        print(json.dumps(result))
+        # Sai sem desmontar o ShowBase
+        sys.stdout.flush()
+        os._exit(0)
+
+    report = {
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'windowType': args.window_type,
+        'scenarios': {},
+    }
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in names:
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--scenarios', name,
+                   '--frames', str(args.frames), '--window-type', args.window_type]
+        if args.replay:
+            command += ['--replay', os.path.abspath(args.replay)]
+        output = subprocess.run(command, cwd=here, capture_output=True, text=True)
+        lines = output.stdout.strip().splitlines()
+        if output.returncode != 0 or not lines:
+            print(output.stderr, file=sys.stderr)
+            sys.exit(f'scenario {name} failed')
+        result = report['scenarios'][name] = json.loads(lines[-1])
+        frameMs = result['frameMs']
+        memory = f"{result['peakMemoryMb']:.0f} MB" if result['peakMemoryMb'] is not None else 'n/a'
+        culling = result['culling']
+        drawn = f"  drawn {culling['drawn']}/{culling['chunks']} chunks" if culling is not None else ''
+        print(f"{name:<12} p50 {frameMs['p50']:6.2f} ms  p90 {frameMs['p90']:6.2f}  p99 {frameMs['p99']:6.2f}  "
+              f"max {frameMs['max']:7.2f}  startup {result['startupMs']:6.0f} ms  terrain {result['terrainMs']:5.0f} ms  "
+              f"memory {memory}  edits {result['edits']}{drawn}")
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import time
+import argparse
+
+from world import World
+from terrain import TerrainGenerator
+from meshing import buildChunkMesh
+
+# Vértices, memória das malhas e tempo de malha de uma área de raio N colunas
+# em volta da origem, sem LOD e com o LOD do ChunkStreamer (mesmos níveis por
+# distância). Não precisa do Panda3D.
+#
+#   python bench_lod.py [--radius 8] [--lod-distance 3]
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--radius', type=int, default=8, help='raio de visão, em colunas de chunks')
+    parser.add_argument('--lod-distance', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--amplitude', type=int, default=6)
+    return parser.parse_args()
+
+
+def levelAt(distance, lodDistance):
+    if lodDistance <= 0:
+        return 0
+    return sum(1 for threshold in (lodDistance, lodDistance * 2) if distance >= threshold)
+
+
+def meshArea(world, radius, lodDistance):
+    vertices = triangles = memory = 0
+    start = time.perf_counter()
+    for cx in range(-radius, radius + 1):
+        for cy in range(-radius, radius + 1):
+            level = levelAt(max(abs(cx), abs(cy)), lodDistance)
+            for key in world.columnKeys(cx, cy):
+                mesh = buildChunkMesh(world, key, True, level)
+                vertices += mesh.vertexCount
+                triangles += mesh.triangleCount
+                memory += mesh.vertices.itemsize * len(mesh.vertices) + mesh.indices.itemsize * len(mesh.indices)
+    return vertices, triangles, memory, time.perf_counter() - start
+
+
+def main():
+    args = parseArgs()
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    world = World()
+    # Uma coluna a mais em volta para as faces da borda
+    for cx in range(-args.radius - 1, args.radius + 2):
+        for cy in range(-args.radius - 1, args.radius + 2):
+            for chunk in generator.generateColumn(cx, cy):
+                world.addChunk(chunk)
+    print(f"radius {args.radius} columns, {len(world.chunks)} chunks")
+
+    baseline = None
+    for name, lodDistance in (('full', 0), (f'lod {args.lod_distance}', args.lod_distance)):
+        vertices, triangles, memory, seconds = meshArea(world, args.radius, lodDistance)
+        if baseline is None:
+            baseline = vertices
+        print(f"{name:<8} vertices {vertices:8d}   triangles {triangles:8d}   meshes {memory / 1e6:6.2f} MB   "
+              f"build {seconds:6.2f} s   vertices {vertices / baseline:5.1%}")
+
+
+if __name__ == '__main__':
+    main()
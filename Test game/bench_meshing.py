@@ -0,0 +1,129 @@
+import time
+import argparse
+
+from panda3d.core import loadPrcFileData
+
+# Compara o caminho antigo (um nó instanciado por bloco) com as malhas
+# por chunk (só faces visíveis, e com greedy meshing) no terreno padrão de
+# generateTerrain.
+#
+#   python bench_meshing.py [--frames 300] [--window-type offscreen|none]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--frames', type=int, default=300)
+parser.add_argument('--window-type', default='offscreen')
+args = parser.parse_args()
+
+loadPrcFileData('', f'window-type {args.window_type}')
+loadPrcFileData('', 'audio-library-name null')
+loadPrcFileData('', 'sync-video false')
+
+from direct.showbase.ShowBase import ShowBase
+from panda3d.core import SceneGraphAnalyzer, DirectionalLight, AmbientLight
+
+from world import World, blockToWorld, generateDefaultTerrain
+from blocks import BLOCK_TYPES
+from meshing import buildChunkMesh, chunkOrigin
+from chunkgeom import makeChunkGeomNode, makeChunkState
+
+
+def analyze(root):
+    analyzer = SceneGraphAnalyzer()
+    analyzer.addNode(root.node())
+
+    # O analyzer conta vértices compartilhados uma vez só; aqui interessa o
+    # que é enviado para a GPU, então soma por caminho (cada instância)
+    vertices = 0
+    for geomNodePath in root.findAllMatches('**/+GeomNode'):
+        geomNode = geomNodePath.node()
+        for i in range(geomNode.getNumGeoms()):
+            vertices += geomNode.getGeom(i).getVertexData().getNumRows()
+
+    return {
+        'nodes': analyzer.getNumNodes() + analyzer.getNumInstances(),
+        'geoms': analyzer.getNumGeoms(),
+        'vertices': vertices,
+        'triangles': analyzer.getNumTris(),
+    }
+
+
+def buildInstanced(world, root, models):
+    for x, y, z, blockId in world.iterBlocks():
+        blockNode = root.attachNewNode('new-block-placeholder')
+        blockNode.setPos(*blockToWorld(x, y, z))
+        models[blockId].instanceTo(blockNode)
+
+
+def buildMerged(world, root, chunkState, greedy=False):
+    for key in world.chunks:
+        mesh = buildChunkMesh(world, key, greedy)
+        if mesh.isEmpty():
+            continue
+        chunkNode = root.attachNewNode(makeChunkGeomNode(mesh, chunkState))
+        chunkNode.setPos(*chunkOrigin(key))
+
+
+def timeFrames(base, frames):
+    if base.win is None or frames <= 0:
+        return None
+    # Aquece antes de medir (upload de texturas e vértices)
+    for _ in range(10):
+        base.graphicsEngine.renderFrame()
+    start = time.perf_counter()
+    for _ in range(frames):
+        base.graphicsEngine.renderFrame()
+    return (time.perf_counter() - start) * 1000.0 / frames
+
+
+def report(name, buildMs, stats, frameMs):
+    line = f"{name:<10} build {buildMs:8.1f} ms   geoms {stats['geoms']:6d}   " \
+           f"vertices {stats['vertices']:7d}   triangles {stats['triangles']:7d}   nodes {stats['nodes']:6d}"
+    if frameMs is not None:
+        line += f"   frame {frameMs:6.2f} ms"
+    print(line)
+
+
+def main():
+    base = ShowBase()
+    base.disableMouse()
+    if base.camera is None:
+        # window-type none: sem janela o ShowBase não cria câmera (e não há
+        # tempo de frame para medir)
+        base.camera = base.render.attachNewNode('camera')
+    base.camera.setPos(0, -60, 30)
+    base.camera.lookAt(0, 0, 0)
+
+    mainLight = base.render.attachNewNode(DirectionalLight('main light'))
+    mainLight.setHpr(30, -60, 0)
+    base.render.setLight(mainLight)
+    ambientLight = AmbientLight('ambient light')
+    ambientLight.setColor((0.3, 0.3, 0.3, 1))
+    base.render.setLight(base.render.attachNewNode(ambientLight))
+
+    models = {blockId: base.loader.loadModel(blockType.model) for blockId, blockType in BLOCK_TYPES.items()}
+
+    world = World()
+    generateDefaultTerrain(world)
+    print(f"terrain: {world.blockCount()} blocks in {len(world.chunks)} chunks")
+
+    root = base.render.attachNewNode('instanced')
+    start = time.perf_counter()
+    buildInstanced(world, root, models)
+    buildMs = (time.perf_counter() - start) * 1000.0
+    report('instanced', buildMs, analyze(root), timeFrames(base, args.frames))
+    root.removeNode()
+
+    chunkState = makeChunkState(models)
+    for name, greedy in (('merged', False), ('greedy', True)):
+        root = base.render.attachNewNode(name)
+        start = time.perf_counter()
+        buildMerged(world, root, chunkState, greedy)
+        buildMs = (time.perf_counter() - start) * 1000.0
+        report(name, buildMs, analyze(root), timeFrames(base, args.frames))
+        root.removeNode()
+
+    base.destroy()
+
+
+if __name__ == '__main__':
+    main()
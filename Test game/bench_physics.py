@@ -0,0 +1,164 @@
+import time
+from math import sin, cos, pi
+
+from world import World, SAND, DIRT, STONE, generateDefaultTerrain, blockToWorld
+from physics import PlayerPhysics, GRAVITY, JUMP_SPEED, SPRINT_JUMP_SPEED, SPAWN_POS, FALL_LIMIT
+
+try:
+    from panda3d.core import NodePath, CollisionTraverser, CollisionNode, CollisionBox, CollisionRay
+    from panda3d.core import CollisionHandlerQueue, CollisionHandlerPusher, BitMask32
+except ImportError:  # sem Panda3D não compara com a física antiga
+    NodePath = None
+
+# Roda a física do jogador sem janela com uma sequência fixa de teclas, no
+# terreno padrão e num terreno bem maior. O custo por passo e a trajetória
+# têm que ser os mesmos nos dois: a física só olha as células em volta.
+# No terreno padrão a trajetória também é comparada com a do antigo
+# Minecraft.update() (CollisionTraverser, pusher e raios de chão).
+#
+#   python bench_physics.py
+
+DT = 1 / 60
+TOLERANCE = 1e-3  # o Panda guarda as posições em float32
+
+SCRIPT = (
+    # (frames, teclas, heading)
+    (120, {}, 0),
+    (60, {'forward': True}, 0),
+    (30, {'forward': True, 'sprint': True}, 45),
+    (20, {'forward': True, 'sprint': True, 'up': True}, 45),
+    (60, {'left': True, 'crouch': True}, 90),
+    (60, {'backward': True, 'up': True}, 0),
+    (60, {'right': True}, 270),
+)
+
+
+def generateLargeTerrain(world, size):
+    half = size // 2
+    for z in range(8):
+        blockId = SAND if z == 0 else DIRT if z <= 3 else STONE
+        for y in range(size):
+            for x in range(size):
+                world.setBlock(x - half, y - half, -z, blockId)
+
+
+def runScript(world):
+    player = PlayerPhysics()
+    trajectory = []
+    steps = 0
+    start = time.perf_counter()
+    for frames, keyMap, heading in SCRIPT:
+        for _ in range(frames):
+            player.step(world, keyMap, heading, DT)
+            trajectory.append((round(player.pos[0], 6), round(player.pos[1], 6), round(player.pos[2], 6)))
+            steps += 1
+    elapsed = time.perf_counter() - start
+    return trajectory, elapsed * 1e6 / steps
+
+
+def runBaseline(world):
+    # Mesmo loop do antigo update(): um CollisionBox por bloco, o pusher na
+    # caixa do jogador e os cinco raios de chão, lidos no frame seguinte
+    render = NodePath('render')
+    for x, y, z, _ in world.iterBlocks():
+        blockNode = CollisionNode('block-collision-node')
+        blockNode.addSolid(CollisionBox((-1, -1, -1), (1, 1, 1)))
+        blockNode.setFromCollideMask(BitMask32(0x0))
+        blockNode.setIntoCollideMask(BitMask32(0x1))
+        render.attachNewNode(blockNode).setPos(*blockToWorld(x, y, z))
+
+    playerNode = render.attachNewNode('player')
+    playerNode.setPos(*SPAWN_POS)
+    traverser = CollisionTraverser()
+    pusher = CollisionHandlerPusher()
+    groundQueue = CollisionHandlerQueue()
+
+    playerCNode = CollisionNode('player')
+    playerCNode.addSolid(CollisionBox((-0.6, -0.6, -0.9), (0.6, 0.6, 2)))
+    playerCNode.setFromCollideMask(BitMask32(0x1))
+    playerCNode.setIntoCollideMask(BitMask32(0x0))
+    playerCollider = playerNode.attachNewNode(playerCNode)
+    pusher.addCollider(playerCollider, playerNode)
+    traverser.addCollider(playerCollider, pusher)
+
+    groundCNode = CollisionNode('ground_ray_cnode')
+    for xOffset, yOffset in ((0, 0), (-0.5, -0.5), (-0.5, 0.5), (0.5, -0.5), (0.5, 0.5)):
+        ray = CollisionRay()
+        ray.setOrigin(xOffset, yOffset, -0.9)
+        ray.setDirection(0, 0, -1)
+        groundCNode.addSolid(ray)
+    groundCNode.setFromCollideMask(BitMask32(0x1))
+    groundCNode.setIntoCollideMask(BitMask32(0x0))
+    traverser.addCollider(playerNode.attachNewNode(groundCNode), groundQueue)
+
+    speeds = PlayerPhysics()
+    zVelocity = 0
+    trajectory = []
+    for frames, keyMap, heading in SCRIPT:
+        playerNode.setH(heading)
+        headingSin = sin(heading * pi / 180.0)
+        headingCos = cos(heading * pi / 180.0)
+        for _ in range(frames):
+            onGround = any(groundQueue.getEntry(i).getSurfacePoint(playerNode).getZ() > -1.2
+                           for i in range(groundQueue.getNumEntries()))
+            if not onGround:
+                zVelocity += GRAVITY * DT
+            elif zVelocity < 0:
+                zVelocity = max(0, zVelocity + GRAVITY * DT * 2)
+            else:
+                zVelocity = 0
+            if playerNode.getZ() < FALL_LIMIT:
+                playerNode.setPos(*SPAWN_POS)
+                zVelocity = 0
+            if keyMap.get('up', False) and onGround:
+                zVelocity = SPRINT_JUMP_SPEED if keyMap.get('sprint', False) and keyMap.get('forward', False) else JUMP_SPEED
+
+            speed = DT * speeds.moveSpeed(keyMap)
+            xMovement = 0
+            yMovement = 0
+            if keyMap.get('forward', False):
+                xMovement -= speed * headingSin
+                yMovement += speed * headingCos
+            if keyMap.get('backward', False):
+                xMovement += speed * headingSin
+                yMovement -= speed * headingCos
+            if keyMap.get('left', False):
+                xMovement -= speed * headingCos
+                yMovement -= speed * headingSin
+            if keyMap.get('right', False):
+                xMovement += speed * headingCos
+                yMovement += speed * headingSin
+
+            traverser.traverse(render)
+            playerNode.setPos(playerNode.getX() + xMovement, playerNode.getY() + yMovement,
+                              playerNode.getZ() + zVelocity * DT)
+            trajectory.append(tuple(playerNode.getPos()))
+    return trajectory
+
+
+def main():
+    small = World()
+    generateDefaultTerrain(small)
+    large = World()
+    generateLargeTerrain(large, 256)
+
+    results = []
+    for name, world in (('default', small), ('256x256', large)):
+        trajectory, stepUs = runScript(world)
+        results.append(trajectory)
+        x, y, z = trajectory[-1]
+        print(f"{name:<8} blocks {world.blockCount():8d}   step {stepUs:6.1f} us   final ({x:.3f}, {y:.3f}, {z:.3f})")
+
+    assert results[0] == results[1], 'trajectory depends on world size'
+    print('trajectories match')
+
+    if NodePath is None:
+        return
+    baseline = runBaseline(small)
+    deviation = max(abs(old - new) for oldPos, newPos in zip(baseline, results[0]) for old, new in zip(oldPos, newPos))
+    assert len(baseline) == len(results[0]) and deviation < TOLERANCE, f'differs from the old update() by {deviation:.6f}'
+    print(f'matches the old CollisionTraverser update() (max deviation {deviation:.6f})')
+
+
+if __name__ == '__main__':
+    main()
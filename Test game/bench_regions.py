@@ -0,0 +1,67 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from world import World, CHUNK_VOLUME
+from terrain import TerrainGenerator
+from regions import WorldSave
+
+# Carregar colunas salvas em arquivos de região contra gerar de novo.
+#
+#   python bench_regions.py [--size 32] [--seed 1234] [--amplitude 6]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--size', type=int, default=32, help='lado da área, em colunas de chunks')
+parser.add_argument('--seed', type=int, default=1234)
+parser.add_argument('--amplitude', type=int, default=6)
+args = parser.parse_args()
+
+
+def main():
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    columns = [(cx, cy) for cx in range(-args.size // 2, args.size // 2) for cy in range(-args.size // 2, args.size // 2)]
+    directory = tempfile.mkdtemp(prefix='regions-')
+    try:
+        world = World()
+        start = time.perf_counter()
+        for cx, cy in columns:
+            for chunk in generator.generateColumn(cx, cy):
+                world.addChunk(chunk)
+        generateSeconds = time.perf_counter() - start
+
+        save = WorldSave(directory, background=False)
+        start = time.perf_counter()
+        for cx, cy in columns:
+            save.saveColumn(world, cx, cy)
+        save.close()
+        saveSeconds = time.perf_counter() - start
+        fileBytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+        save = WorldSave(directory, background=False)
+        loaded = World()
+        start = time.perf_counter()
+        for cx, cy in columns:
+            for chunk in save.loadColumn(cx, cy):
+                loaded.addChunk(chunk)
+        loadSeconds = time.perf_counter() - start
+        save.close()
+
+        assert loaded.chunks.keys() == world.chunks.keys()
+        assert all(loaded.chunks[key].toBytes() == chunk.toBytes() for key, chunk in world.chunks.items())
+
+        chunks = len(world.chunks)
+        rawBytes = chunks * CHUNK_VOLUME
+        print(f"{len(columns)} columns, {chunks} chunks, numpy {'on' if generator.useNumpy else 'off'}")
+        print(f"generate {generateSeconds * 1000:8.1f} ms  {chunks / generateSeconds:9.0f} chunks/s")
+        print(f"save     {saveSeconds * 1000:8.1f} ms  {chunks / saveSeconds:9.0f} chunks/s")
+        print(f"load     {loadSeconds * 1000:8.1f} ms  {chunks / loadSeconds:9.0f} chunks/s  "
+              f"({generateSeconds / loadSeconds:.1f}x faster than generating)")
+        print(f"on disk  {fileBytes / 1e6:8.2f} MB  (raw {rawBytes / 1e6:.2f} MB)")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
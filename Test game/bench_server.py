@@ -0,0 +1,230 @@
+import sys
+import json
+import math
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import subprocess
+
+from world import AIR, STONE, blockToWorld, worldToBlock
+from terrain import TerrainGenerator, terrainBlock
+from raycast import raycastBlock
+from physics import WALK_SPEED, REMOVE_REACH, PLACE_REACH, eyePosition, lookDirection, placementBlocked
+from netprotocol import (
+    HELLO, MOVE, EDIT, STATS, WELCOME, COLUMN, UNLOAD, BLOCKS, STATS_REPLY, EDIT_REMOVE, EDIT_PLACE, FRAME_HEADER,
+    MOVE_BODY, EDIT_BODY, COLUMN_KEY, frame, readFrame, packHello, unpackWelcome, unpackBlocks,
+)
+
+# Teste de carga do servidor: sobe o server.py em outro processo e conecta
+# bots pelo loopback em degraus (ex. 1, 10, 25, 50). Cada bot anda em volta
+# de um ponto próprio, manda a posição a cada tick do servidor e de vez em
+# quando tira ou põe um bloco olhando para o chão, com o mesmo raio da câmera
+# do jogo contra o que ele sabe do mundo (terreno gerado + deltas recebidos).
+# Por degrau mostra o tempo de tick do servidor e a banda.
+#
+#   python bench_server.py [--bots 1,10,25,50] [--seconds 5] [--radius 4]
+
+BOT_SPREAD = 400  # unidades do render entre os pontos dos bots
+BOT_CIRCLE = 80  # raio da volta de cada bot
+EDIT_INTERVAL = 1.0  # segundos entre as edições de um bot
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bots', default='1,10,25,50', help='quantidades de bots, em degraus')
+    parser.add_argument('--seconds', type=float, default=5.0, help='medição por degrau')
+    parser.add_argument('--warmup', type=float, default=2.0, help='espera depois de conectar os bots')
+    parser.add_argument('--port', type=int, default=25590)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--amplitude', type=int, default=6)
+    parser.add_argument('--radius', type=int, default=4)
+    parser.add_argument('--tick-rate', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+    args.bots = [int(count) for count in args.bots.split(',')]
+    return args
+
+
+class BotWorld:
+    # O que o bot sabe do mundo: o terreno gerado com a semente do servidor
+    # e os deltas que chegaram. Só getBlock, o que o raycastBlock usa.
+    def __init__(self, generator):
+        self.generator = generator
+        self.heights = {}
+        self.edited = {}
+        self.columns = set()  # recebidas do servidor: só edita dentro delas
+
+    def height(self, x, y):
+        height = self.heights.get((x, y))
+        if height is None:
+            height = self.heights[(x, y)] = self.generator.heightAt(x, y)
+        return height
+
+    def getBlock(self, x, y, z):
+        blockId = self.edited.get((x, y, z))
+        if blockId is None:
+            return terrainBlock(self.height(x, y) - z)
+        return blockId
+
+
+class Bot:
+    def __init__(self, index, args, generator):
+        self.index = index
+        self.args = args
+        self.world = BotWorld(generator)
+        rng = random.Random(index)
+        self.center = (rng.uniform(-BOT_SPREAD, BOT_SPREAD), rng.uniform(-BOT_SPREAD, BOT_SPREAD))
+        self.angle = rng.uniform(0, 2 * math.pi)
+        self.nextEdit = time.perf_counter() + rng.uniform(0, EDIT_INTERVAL)
+        self.bytesIn = 0
+        self.edits = 0
+
+    def position(self):
+        # Em pé no chão (os pés 0.9 abaixo da posição), olhando para onde anda
+        x = self.center[0] + BOT_CIRCLE * math.cos(self.angle)
+        y = self.center[1] + BOT_CIRCLE * math.sin(self.angle)
+        bx, by, _ = worldToBlock(x, y, 0)
+        ground = blockToWorld(bx, by, self.world.height(bx, by))[2] + 1
+        heading = math.degrees(self.angle)  # tangente da volta, no sentido do heading do Panda
+        return (x, y, ground + 0.9), heading
+
+    async def run(self, stop):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.args.port)
+        writer.write(frame(HELLO, packHello(f'bot{self.index}')))
+        kind, body = await readFrame(reader)
+        tickRate = unpackWelcome(body)['tickRate'] if kind == WELCOME else self.args.tick_rate
+        receiving = asyncio.create_task(self.receive(reader))
+        step = WALK_SPEED / BOT_CIRCLE / tickRate  # radianos por tick andando
+        try:
+            while not stop.is_set():
+                self.angle += step
+                pos, heading = self.position()
+                writer.write(frame(MOVE, MOVE_BODY.pack(*pos, heading, -60.0)))
+                if time.perf_counter() >= self.nextEdit:
+                    self.nextEdit += EDIT_INTERVAL
+                    self.edit(writer, pos, heading)
+                await asyncio.sleep(1.0 / tickRate)
+        finally:
+            receiving.cancel()
+            writer.close()
+
+    def edit(self, writer, pos, heading):
+        # Alterna entre tirar e pôr, como um jogador clicando no chão à frente
+        pitch = -60.0
+        place = self.edits % 2 == 1
+        reach = PLACE_REACH if place else REMOVE_REACH
+        eye = eyePosition(pos, heading)
+        hit = raycastBlock(self.world, eye, lookDirection(heading, pitch), reach)
+        if hit is None:
+            return
+        block, normal, distance = hit
+        if (block[0] >> 4, block[1] >> 4) not in self.world.columns:
+            return
+        if place:
+            if normal == (0, 0, 0):
+                return
+            block = (block[0] + normal[0], block[1] + normal[1], block[2] + normal[2])
+            if placementBlocked(pos, blockToWorld(*block)):
+                return
+        blockId = STONE if place else AIR
+        writer.write(frame(EDIT, EDIT_BODY.pack(
+            EDIT_PLACE if place else EDIT_REMOVE, *pos, heading, pitch, *block, blockId)))
+        self.world.edited[block] = blockId
+        self.edits += 1
+
+    async def receive(self, reader):
+        try:
+            while True:
+                kind, body = await readFrame(reader)
+                self.bytesIn += FRAME_HEADER.size + len(body)
+                if kind == COLUMN:
+                    self.world.columns.add(COLUMN_KEY.unpack_from(body))
+                elif kind == UNLOAD:
+                    self.world.columns.discard(COLUMN_KEY.unpack(body))
+                elif kind == BLOCKS:
+                    for x, y, z, blockId in unpackBlocks(body):
+                        self.world.edited[(x, y, z)] = blockId
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+
+async def serverStats(port, reset):
+    # Conexão que nunca manda MOVE: não conta como jogador
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(frame(HELLO, packHello('monitor')))
+    writer.write(frame(STATS, b'reset' if reset else b''))
+    try:
+        while True:
+            kind, body = await readFrame(reader)
+            if kind == STATS_REPLY:
+                return json.loads(body)
+    finally:
+        writer.close()
+
+
+def waitForPort(port, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+async def runSteps(args):
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    stop = asyncio.Event()
+    bots = []
+    tasks = []
+    print(f"tick budget {1000 / args.tick_rate:.1f} ms, radius {args.radius}, "
+          f"{args.seconds:.0f} s per step after {args.warmup:.0f} s warmup")
+    try:
+        for count in args.bots:
+            while len(bots) < count:
+                bot = Bot(len(bots), args, generator)
+                bots.append(bot)
+                tasks.append(asyncio.create_task(bot.run(stop)))
+            await asyncio.sleep(args.warmup)
+
+            await serverStats(args.port, reset=True)
+            received = sum(bot.bytesIn for bot in bots)
+            start = time.perf_counter()
+            await asyncio.sleep(args.seconds)
+            stats = await serverStats(args.port, reset=False)
+            received = (sum(bot.bytesIn for bot in bots) - received) / (time.perf_counter() - start)
+
+            tick = stats['tickMs']
+            out = stats['bytesOutPerSecond']
+            print(f"bots {count:4d}   tick p50 {tick['p50']:6.2f} ms   p99 {tick['p99']:6.2f} ms   "
+                  f"max {tick['max']:6.2f} ms   overruns {stats['overruns']:3d}   "
+                  f"out {out / 1024:8.1f} KB/s ({out / 1024 / count:6.1f}/bot)   "
+                  f"in {stats['bytesInPerSecond'] / 1024:6.1f} KB/s   bots received {received / 1024:8.1f} KB/s   "
+                  f"columns {stats['loadedColumns']:5d}   edits {stats['edits']:4d} ({stats['rejected']} rejected)")
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    args = parseArgs()
+    server = subprocess.Popen([
+        sys.executable, 'server.py', '--port', str(args.port), '--seed', str(args.seed),
+        '--amplitude', str(args.amplitude), '--radius', str(args.radius), '--tick-rate', str(args.tick_rate),
+        '--processes', str(args.processes), '--status-interval', '0',
+    ], stdout=subprocess.DEVNULL)
+    try:
+        waitForPort(args.port)
+        asyncio.run(runSteps(args))
+    finally:
+        # SIGINT em vez de terminate: o servidor fecha os processos de geração
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
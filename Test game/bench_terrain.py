@@ -0,0 +1,75 @@
+import time
+import argparse
+
+from world import World, SAND, DIRT, STONE, CHUNK_SIZE
+from terrain import TerrainGenerator, np
+
+# Chunks gerados por segundo: o laço antigo de generateTerrain (um setBlock
+# por bloco) contra o TerrainGenerator, com e sem numpy.
+#
+#   python bench_terrain.py [--columns 64] [--seed 1234] [--amplitude 6]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--columns', type=int, default=64)
+parser.add_argument('--seed', type=int, default=1234)
+parser.add_argument('--amplitude', type=int, default=6)
+args = parser.parse_args()
+
+
+def loopColumn(world, cx, cy):
+    # Mesmo laço de generateTerrain, restrito a uma coluna de chunks
+    for z in range(8):
+        for y in range(CHUNK_SIZE):
+            for x in range(CHUNK_SIZE):
+                if z == 0:
+                    blockId = SAND
+                elif z <= 3:
+                    blockId = DIRT
+                else:
+                    blockId = STONE
+                world.setBlock(cx * CHUNK_SIZE + x, cy * CHUNK_SIZE + y, -z, blockId)
+
+
+def columns(count):
+    side = max(1, int(count ** 0.5))
+    return [(cx, cy) for cx in range(side) for cy in range(side)]
+
+
+def runLoop(columnList):
+    world = World()
+    start = time.perf_counter()
+    for cx, cy in columnList:
+        loopColumn(world, cx, cy)
+    return len(world.chunks), time.perf_counter() - start
+
+
+def runGenerator(generator, columnList):
+    world = World()
+    start = time.perf_counter()
+    for cx, cy in columnList:
+        for chunk in generator.generateColumn(cx, cy):
+            world.addChunk(chunk)
+    return len(world.chunks), time.perf_counter() - start
+
+
+def report(name, chunks, seconds):
+    print(f"{name:<22} {chunks:6d} chunks  {seconds * 1000:8.1f} ms  {chunks / seconds:9.0f} chunks/s")
+
+
+def main():
+    columnList = columns(args.columns)
+    report('loop (generateTerrain)', *runLoop(columnList))
+
+    for name, amplitude in (('flat', 0), ('noise', args.amplitude)):
+        generator = TerrainGenerator(seed=args.seed, amplitude=amplitude)
+        if np is not None:
+            report(f'numpy {name}', *runGenerator(generator, columnList))
+        generator.useNumpy = False
+        report(f'python {name}', *runGenerator(generator, columnList))
+
+    if np is None:
+        print('numpy not installed: only the pure Python generator was measured')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+from world import DIRT, SAND, STONE
+
+# Registro dos tipos de bloco. Cada tipo tem um modelo .glb (textura em cruz,
+# uma célula por face) e ocupa 6 camadas seguidas na textura array dos
+# chunks, uma por face, na ordem em que foi registrado. A camada sai só do
+# registro, então a malha pode ser feita em outra thread ou processo sem
+# acesso às texturas. light é a luz que o bloco emite (0-15, ver lighting.py).
+
+FACES_PER_BLOCK = 6
+
+
+class BlockType:
+    def __init__(self, blockId, name, model, firstLayer, light=0):
+        self.blockId = blockId
+        self.name = name
+        self.model = model
+        self.firstLayer = firstLayer
+        self.light = light
+
+
+BLOCK_TYPES = {}  # blockId -> BlockType
+BLOCK_IDS = {}  # nome -> blockId
+# FACE_LAYERS[blockId][face] -> camada da textura array
+FACE_LAYERS = []
+# LIGHT_EMISSION[blockId] -> luz emitida, para bytes.translate
+LIGHT_EMISSION = bytearray(256)
+
+
+def registerBlock(blockId, name, model, light=0):
+    blockType = BlockType(blockId, name, model, len(BLOCK_TYPES) * FACES_PER_BLOCK, light)
+    BLOCK_TYPES[blockId] = blockType
+    BLOCK_IDS[name] = blockId
+    while len(FACE_LAYERS) <= blockId:
+        FACE_LAYERS.append(None)
+    FACE_LAYERS[blockId] = tuple(blockType.firstLayer + face for face in range(FACES_PER_BLOCK))
+    LIGHT_EMISSION[blockId] = light
+    return blockType
+
+
+def layerCount():
+    return len(BLOCK_TYPES) * FACES_PER_BLOCK
+
+
+registerBlock(DIRT, 'dirt', 'dirt-block.glb')
+registerBlock(SAND, 'sand', 'sand-block.glb')
+registerBlock(STONE, 'stone', 'stone-block.glb')
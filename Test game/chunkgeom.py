@@ -0,0 +1,165 @@
+from panda3d.core import Geom, GeomNode, GeomTriangles, GeomVertexData, GeomVertexFormat, GeomVertexArrayFormat, GeomEnums
+from panda3d.core import InternalName, PNMImage, Texture, SamplerState, RenderState, TextureAttrib, ShaderAttrib, Shader
+from panda3d.core import OmniBoundingVolume
+
+from meshing import FACE_POS_X, FACE_NEG_X, FACE_POS_Y, FACE_NEG_Y, FACE_POS_Z, FACE_NEG_Z
+from blocks import BLOCK_TYPES, layerCount
+
+# Os .glb dos blocos usam uma textura em cruz (3 colunas x 4 linhas), uma
+# célula por face. Posição (coluna, linha) de cada face, linha 0 em cima.
+FACE_CELLS = {
+    FACE_POS_X: (1, 1),
+    FACE_NEG_X: (1, 3),
+    FACE_POS_Y: (1, 2),
+    FACE_NEG_Y: (1, 0),
+    FACE_POS_Z: (2, 1),
+    FACE_NEG_Z: (0, 1),
+}
+
+# Todas as faces de todos os blocos numa textura array; a camada vem no
+# terceiro componente da coordenada de textura. Com repeat em cada camada o
+# greedy meshing continua repetindo a textura por bloco, o que um atlas
+# comum não faz. O fixed-function não lê texturas array, então os chunks usam
+# este shader. A luz já vem calculada em cada vértice (meshing.py e
+# lighting.py): o shader só multiplica, sem luzes do Panda3D.
+VERTEX_SHADER = """
+#version 130
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+
+in vec4 p3d_Vertex;
+in vec3 p3d_MultiTexCoord0;
+in float light;
+
+out vec3 texcoord;
+out float brightness;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+    texcoord = p3d_MultiTexCoord0;
+    brightness = light;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 130
+
+uniform sampler2DArray p3d_Texture0;
+
+in vec3 texcoord;
+in float brightness;
+
+out vec4 p3d_FragColor;
+
+void main() {
+    vec4 color = texture(p3d_Texture0, texcoord);
+    p3d_FragColor = vec4(color.rgb * brightness, color.a);
+}
+"""
+
+
+def makeVertexFormat():
+    columns = GeomVertexArrayFormat()
+    columns.addColumn(InternalName.getVertex(), 3, Geom.NT_float32, Geom.C_point)
+    columns.addColumn(InternalName.getNormal(), 3, Geom.NT_float32, Geom.C_normal)
+    columns.addColumn(InternalName.getTexcoord(), 3, Geom.NT_float32, Geom.C_texcoord)
+    columns.addColumn(InternalName.make('light'), 1, Geom.NT_float32, Geom.C_other)
+    vertexFormat = GeomVertexFormat()
+    vertexFormat.addArray(columns)
+    return GeomVertexFormat.registerFormat(vertexFormat)
+
+
+CHUNK_FORMAT = makeVertexFormat()
+
+
+def cutFace(source, face):
+    cellX = source.getXSize() // 3
+    cellY = source.getYSize() // 4
+    column, row = FACE_CELLS[face]
+    image = PNMImage(cellX, cellY, 4)
+    image.fill(1, 1, 1)
+    image.alphaFill(1)
+    image.copySubImage(source, 0, 0, column * cellX, row * cellY, cellX, cellY)
+    return image
+
+
+def makeBlockTextures(blockModels):
+    # blockModels: {blockId: modelo} -> textura array com 6 camadas por bloco
+    texture = None
+    for blockId, blockType in BLOCK_TYPES.items():
+        source = PNMImage()
+        blockModels[blockId].findTexture('*').store(source)
+        for face in FACE_CELLS:
+            image = cutFace(source, face)
+            if texture is None:
+                texture = Texture('block-faces')
+                texture.setup2dTextureArray(image.getXSize(), image.getYSize(), layerCount(),
+                                            Texture.T_unsigned_byte, Texture.F_rgba)
+            if (image.getXSize(), image.getYSize()) != (texture.getXSize(), texture.getYSize()):
+                raise ValueError(f'{blockType.model}: all block textures must be the same size')
+            texture.load(image, blockType.firstLayer + face, 0)
+
+    texture.setWrapU(SamplerState.WM_repeat)
+    texture.setWrapV(SamplerState.WM_repeat)
+    texture.setMagfilter(SamplerState.FT_nearest)
+    texture.setMinfilter(SamplerState.FT_nearest_mipmap_nearest)
+    return texture
+
+
+def makeChunkState(blockModels):
+    # Um RenderState para todos os chunks: textura array + shader
+    shader = Shader.make(Shader.SL_GLSL, VERTEX_SHADER, FRAGMENT_SHADER)
+    return RenderState.make(
+        TextureAttrib.make(makeBlockTextures(blockModels)),
+        ShaderAttrib.make(shader),
+    )
+
+
+def makeGeom(vertices, indices):
+    vertexData = GeomVertexData('chunk', CHUNK_FORMAT, Geom.UHStatic)
+    vertexData.modifyArrayHandle(0).copyDataFrom(vertices)
+
+    triangles = GeomTriangles(Geom.UHStatic)
+    triangles.setIndexType(GeomEnums.NT_uint32)
+    triangles.modifyVertices().modifyHandle().copyDataFrom(indices)
+
+    geom = Geom(vertexData)
+    geom.addPrimitive(triangles)
+    return geom
+
+
+def makeChunkGeomNode(mesh, chunkState):
+    return makeGeomNode(mesh.key, mesh.vertices, mesh.indices, chunkState)
+
+
+def makeGeomNode(key, vertices, indices, chunkState):
+    # Um GeomNode com um Geom só por chunk: uma chamada de desenho.
+    # Vértices e índices podem vir como array ou bytes (processos de chunkjobs).
+    geomNode = GeomNode(f'chunk-{key[0]}-{key[1]}-{key[2]}')
+    geomNode.addGeom(makeGeom(vertices, indices), chunkState)
+    return geomNode
+
+
+class EntityGeom:
+    # Um Geom para todas as entidades (entities.py), reescrito a cada frame
+    # com os arrays prontos: uma chamada de desenho, com a mesma textura e
+    # shader dos chunks. Sem bounds (as entidades mudam de lugar todo frame).
+    def __init__(self, chunkState):
+        self.vertexData = GeomVertexData('entities', CHUNK_FORMAT, Geom.UHStream)
+        self.triangles = GeomTriangles(Geom.UHStream)
+        self.triangles.setIndexType(GeomEnums.NT_uint32)
+        geom = Geom(self.vertexData)
+        geom.addPrimitive(self.triangles)
+        geom.setBounds(OmniBoundingVolume())
+        self.node = GeomNode('entities')
+        self.node.addGeom(geom, chunkState)
+        self.node.setBounds(OmniBoundingVolume())
+        self.node.setFinal(True)
+        self.indexCount = 0
+
+    def update(self, vertices, indices):
+        self.vertexData.modifyArrayHandle(0).copyDataFrom(vertices)
+        # Os índices só mudam com a quantidade de entidades
+        if len(indices) != self.indexCount:
+            self.indexCount = len(indices)
+            self.triangles.modifyVertices().modifyHandle().copyDataFrom(indices)
@@ -0,0 +1,46 @@
+from world import World, Chunk
+from meshing import buildChunkMesh
+from regions import openWorldSave
+from lighting import LightMap
+
+# Trabalhos de chunk para rodar em outros processos. Este módulo não importa
+# o Panda3D nem o minecraft.py, então os processos filhos sobem rápido. Tudo
+# que entra e sai são bytes (arrays de blocos, vértices e índices), nunca um
+# objeto Python por bloco.
+
+
+def generateColumnBuffers(generator, cx, cy):
+    # -> [(chave do chunk, bytes dos blocos, quantidade de blocos)]
+    return [(chunk.key, chunk.toBytes(), chunk.count) for chunk in generator.generateColumn(cx, cy)]
+
+
+def loadColumnBuffers(saveDirectory, generator, cx, cy):
+    # Lê a coluna salva (mmap do arquivo de região) ou gera se nunca foi salva
+    if saveDirectory:
+        buffers = openWorldSave(saveDirectory).loadColumnBuffers(cx, cy)
+        if buffers is not None:
+            return buffers
+    return generateColumnBuffers(generator, cx, cy)
+
+
+def chunksFromBuffers(buffers):
+    return [Chunk.fromBytes(key, data, count) for key, data, count in buffers]
+
+
+def meshColumnBuffers(keys, neighbourhood, greedy, lod=0, light=None, ao=False):
+    # neighbourhood: [(chave, bytes, quantidade)] da coluna e das vizinhas,
+    # para esconder as faces da borda. light: luz das mesmas colunas, de
+    # LightMap.columnBuffers (None sem luz).
+    # -> [(chave, (bytes dos vértices, bytes dos índices) ou None, stats)]
+    world = World()
+    for chunk in chunksFromBuffers(neighbourhood):
+        world.addChunk(chunk)
+    if light is not None:
+        light = LightMap.fromBuffers(world, light)
+
+    results = []
+    for key in keys:
+        mesh = buildChunkMesh(world, key, greedy, lod, light, ao)
+        buffers = None if mesh.isEmpty() else (mesh.vertices.tobytes(), mesh.indices.tobytes())
+        results.append((key, buffers, (mesh.faceCount, mesh.vertexCount, mesh.triangleCount)))
+    return results
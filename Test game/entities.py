@@ -0,0 +1,461 @@
+from math import pi
+
+from world import AIR, BLOCK_SIZE, CHUNK_SIZE, blockToWorld
+from blocks import FACE_LAYERS
+from lighting import LIGHT_LEVELS, FULL_SKY
+from meshing import FACE_CORNERS, FACE_NORMALS, FACE_UVS, FACE_SHADES, LIGHT_CURVE, FLOATS_PER_VERTEX
+from physics import GRAVITY, FALL_LIMIT
+
+try:
+    import numpy as np
+except ImportError:  # sem numpy não há entidades (o jogo roda sem elas)
+    np = None
+
+ENTITIES_AVAILABLE = np is not None
+
+# Entidades (itens no chão e mobs simples) guardadas como arrays de
+# componentes, um elemento por entidade, em vez de um NodePath com
+# colisores do Panda3D para cada uma. Um tick move todas de uma vez com
+# numpy: gravidade, andar dos mobs e colisão com a grade de blocos eixo por
+# eixo, como physics.moveBox.
+#
+# As caixas das entidades são menores que um bloco em todos os eixos, então
+# os cantos da face que avança caem em todas as células que ela pode tocar:
+# a colisão só lê os blocos nesses cantos, juntados por chunk.
+#
+# Um hash espacial (células de HASH_CELL unidades, chaves ordenadas) responde
+# as buscas por proximidade: coleta de itens pelo jogador e itens iguais
+# parados na mesma célula, que viram uma pilha só.
+
+ITEM = 0
+MOB = 1
+
+# Metade da caixa de cada tipo de entidade, nas unidades do render
+HALF_EXTENTS = (
+    (0.25, 0.25, 0.25),  # item: um bloco em miniatura
+    (0.45, 0.45, 0.9),  # mob: pouco mais baixo que um bloco
+)
+
+TERMINAL_SPEED = 40.0  # a 60 ticks/s não passa de um bloco por tick
+ITEM_DRAG = 8.0  # atrito no chão, por segundo
+ITEM_LIFETIME = 300.0  # itens somem depois de 5 minutos, como no Minecraft
+PICKUP_DELAY = 0.5  # o item que acabou de cair ainda não pode ser pego
+PICKUP_RADIUS = 2.5
+MERGE_INTERVAL = 0.5  # segundos entre as junções de pilhas
+
+MOB_SPEED = 3.0
+MOB_JUMP_SPEED = 10.0  # sobe um bloco (2 unidades) com folga
+MOB_IDLE_CHANCE = 0.3  # chance de ficar parado em vez de andar
+MOB_WANDER_TIME = (1.0, 4.0)  # segundos até escolher outra direção
+
+HASH_CELL = 4.0
+MAX_CACHED_CHUNKS = 4096
+DENSE_CHUNKS = 1 << 16  # caixa de chunks máxima para gather sem ordenar
+EPSILON = 1e-4
+REST_SPEED = 0.05  # abaixo disso o item no chão para
+
+# Chaves de células (chunks ou hash) num int64: 21 bits por eixo
+KEY_BITS = 21
+KEY_MASK = (1 << KEY_BITS) - 1
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+
+# Componentes: nome -> (dtype, forma por entidade)
+COMPONENTS = {
+    'ids': ('i8', ()),
+    'kind': ('u1', ()),
+    'blockId': ('u1', ()),  # tipo do item, ou textura do mob
+    'stack': ('u4', ()),  # itens na pilha
+    'pos': ('f8', (3,)),  # centro da caixa
+    'previous': ('f8', (3,)),  # centro no tick anterior, para interpolar
+    'vel': ('f8', (3,)),
+    'age': ('f8', ()),
+    'onGround': ('?', ()),
+    'wander': ('f8', ()),  # segundos até o mob mudar de direção
+    'redraw': ('?', ()),  # vértices desatualizados (andou desde o último desenho)
+}
+
+
+def packKeys(x, y, z):
+    return ((x + KEY_OFFSET) & KEY_MASK) | (((y + KEY_OFFSET) & KEY_MASK) << KEY_BITS) | \
+        (((z + KEY_OFFSET) & KEY_MASK) << (2 * KEY_BITS))
+
+
+def cubeTemplate():
+    # 24 vértices (4 por face) de um cubo de 0 a 1, na ordem de FACE_CORNERS,
+    # e os 36 índices dos triângulos
+    corners, faces, uvs = [], [], []
+    for face, faceCorners in enumerate(FACE_CORNERS):
+        corners.extend(faceCorners)
+        faces.extend([face] * 4)
+        uvs.extend(FACE_UVS)
+    indices = []
+    for face in range(len(FACE_CORNERS)):
+        base = face * 4
+        indices.extend((base, base + 1, base + 2, base, base + 2, base + 3))
+    return corners, faces, uvs, indices
+
+
+class SpatialHash:
+    # Entidades ordenadas pela chave da célula do hash; uma busca só olha as
+    # faixas das células que a esfera toca (searchsorted)
+    def __init__(self, positions, cellSize=HASH_CELL):
+        self.cellSize = cellSize
+        self.positions = positions
+        self.cells = np.floor(positions / cellSize).astype(np.int64)
+        keys = packKeys(self.cells[:, 0], self.cells[:, 1], self.cells[:, 2])
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def query(self, point, radius):
+        # -> índices das entidades com o centro a até radius de point
+        low = np.floor((np.asarray(point) - radius) / self.cellSize).astype(np.int64)
+        high = np.floor((np.asarray(point) + radius) / self.cellSize).astype(np.int64)
+        xs, ys, zs = np.meshgrid(*(np.arange(low[axis], high[axis] + 1) for axis in range(3)), indexing='ij')
+        wanted = packKeys(xs.ravel(), ys.ravel(), zs.ravel())
+        starts = np.searchsorted(self.keys, wanted, 'left')
+        ends = np.searchsorted(self.keys, wanted, 'right')
+        found = [self.order[start:end] for start, end in zip(starts, ends) if end > start]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(found)
+        offsets = self.positions[candidates] - point
+        return candidates[np.einsum('ij,ij->i', offsets, offsets) <= radius * radius]
+
+
+class Entities:
+    def __init__(self, world, light=None, capacity=256, seed=0):
+        if np is None:
+            raise RuntimeError('entities need numpy')
+        self.world = world
+        self.light = light
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.capacity = 0
+        self.nextId = 1
+        self.grow(capacity)
+        self.blockCache = {}  # chave do chunk -> (Chunk, blocos em numpy)
+        self.hash = None  # SpatialHash, refeito na primeira busca depois de mudar
+        self.vertices = None  # (capacidade, 24, FLOATS_PER_VERTEX), ver buildVertices
+        self.verticesStale = True  # refaz todos (entidades mudaram de lugar nos arrays)
+        self.mergeTimer = 0.0
+
+        self.halfExtents = np.array(HALF_EXTENTS)
+        corners, faces, uvs, indices = cubeTemplate()
+        self.cubeCorners = np.array(corners, dtype=np.float64)
+        self.cubeFaces = np.array(faces)
+        self.cubeNormals = np.array([FACE_NORMALS[face] for face in faces], dtype=np.float32)
+        self.cubeUvs = np.array(uvs, dtype=np.float32)
+        self.cubeShades = np.array([FACE_SHADES[face] for face in faces], dtype=np.float32)
+        self.cubeIndices = np.array(indices, dtype=np.uint32)
+        self.faceLayers = np.zeros((256, len(FACE_NORMALS)), dtype=np.float32)
+        for blockId, layers in enumerate(FACE_LAYERS):
+            if layers is not None:
+                self.faceLayers[blockId] = layers
+        self.lightLevels = np.frombuffer(LIGHT_LEVELS, dtype=np.uint8)
+        self.lightCurve = np.array(LIGHT_CURVE, dtype=np.float32)
+
+    def __len__(self):
+        return self.count
+
+    def grow(self, capacity):
+        # Dobra os arrays de todos os componentes, mantendo as entidades vivas
+        for name, (dtype, shape) in COMPONENTS.items():
+            array = np.zeros((capacity,) + shape, dtype=dtype)
+            if self.count:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def spawn(self, kind, positions, velocities, blockIds, stacks=1):
+        # positions, velocities: (n, 3); blockIds: n ou um só. -> ids novos
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        added = len(positions)
+        if self.count + added > self.capacity:
+            capacity = self.capacity
+            while capacity < self.count + added:
+                capacity *= 2
+            self.grow(capacity)
+        new = slice(self.count, self.count + added)
+        ids = np.arange(self.nextId, self.nextId + added)
+        self.ids[new] = ids
+        self.kind[new] = kind
+        self.blockId[new] = blockIds
+        self.stack[new] = stacks
+        self.pos[new] = positions
+        self.previous[new] = positions
+        self.vel[new] = np.asarray(velocities, dtype=np.float64).reshape(-1, 3)
+        self.age[new] = 0.0
+        self.onGround[new] = False
+        self.wander[new] = 0.0
+        self.redraw[new] = False
+        self.nextId += added
+        self.count += added
+        self.hash = None
+        self.verticesStale = True
+        return ids
+
+    def dropItem(self, x, y, z, blockId):
+        # Item de um bloco quebrado (x, y, z em blocos), pulando para um lado
+        center = blockToWorld(x, y, z)
+        angle = self.rng.uniform(0, 2 * pi)
+        velocity = (np.cos(angle) * 1.5, np.sin(angle) * 1.5, 6.0)
+        return self.spawn(ITEM, center, velocity, blockId)[0]
+
+    def remove(self, indices):
+        # Remove pelos índices atuais e compacta os arrays (a ordem das
+        # entidades que ficam é mantida)
+        if len(indices) == 0:
+            return
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        kept = int(keep.sum())
+        for name in COMPONENTS:
+            array = getattr(self, name)
+            array[:kept] = array[:self.count][keep]
+        self.count = kept
+        self.hash = None
+        self.verticesStale = True
+
+    def blockChanged(self, x, y, z):
+        self.blockCache.pop((x >> 4, y >> 4, z >> 4), None)
+        self.verticesStale = True  # a luz em volta pode ter mudado
+        # Acorda quem estava parado encostado no bloco
+        if self.count:
+            woken = self.nearby(blockToWorld(x, y, z), BLOCK_SIZE * 1.5)
+            self.onGround[woken] = False
+
+    def chunkBlocks(self, key):
+        # Blocos do chunk num array numpy, refeito quando o chunk muda (edição
+        # avisada em blockChanged ou outro Chunk no mundo depois do streaming)
+        chunk = self.world.chunks.get(key)
+        if chunk is None:
+            return AIR
+        cached = self.blockCache.get(key)
+        if cached is not None and cached[0] is chunk:
+            return cached[1]
+        if len(self.blockCache) >= MAX_CACHED_CHUNKS:
+            self.blockCache.clear()
+        blocks = np.frombuffer(chunk.toBytes(), dtype=np.uint8)
+        self.blockCache[key] = (chunk, blocks)
+        return blocks
+
+    def chunkLight(self, key):
+        cells = self.light.chunks.get(key)
+        if cells is not None:
+            return np.frombuffer(cells, dtype=np.uint8)
+        # Mesma regra de LightMap.get fora dos chunks com luz
+        span = self.light.columns.get(key[:2])
+        return FULL_SKY if span is None or key[2] > span[1] else 0
+
+    def gather(self, x, y, z, cellsFor):
+        # Um byte por célula (x, y, z em blocos), lendo cada chunk uma vez.
+        # cellsFor(chave) -> array de 4096 bytes ou um valor para o chunk todo.
+        if len(x) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        cx, cy, cz = x >> 4, y >> 4, z >> 4
+        low = (int(cx.min()), int(cy.min()), int(cz.min()))
+        shape = (int(cx.max()) - low[0] + 1, int(cy.max()) - low[1] + 1, int(cz.max()) - low[2] + 1)
+        if shape[0] * shape[1] * shape[2] <= DENSE_CHUNKS:
+            # Caixa de chunks pequena (o normal, com as entidades paradas fora
+            # das colunas carregadas): índice direto, sem ordenar
+            flat = ((cx - low[0]) * shape[1] + (cy - low[1])) * shape[2] + (cz - low[2])
+            used = np.flatnonzero(np.bincount(flat, minlength=shape[0] * shape[1] * shape[2]))
+            rows = np.zeros(shape[0] * shape[1] * shape[2], dtype=np.int64)
+            rows[used] = np.arange(len(used))
+            inverse = rows[flat]
+            keys = [(low[0] + index // (shape[1] * shape[2]), low[1] + index // shape[2] % shape[1], low[2] + index % shape[2])
+                    for index in used.tolist()]
+        else:
+            packed, first, inverse = np.unique(packKeys(cx, cy, cz), return_index=True, return_inverse=True)
+            inverse = inverse.ravel()
+            keys = [(int(cx[index]), int(cy[index]), int(cz[index])) for index in first.tolist()]
+        table = np.empty((len(keys), CHUNK_SIZE ** 3), dtype=np.uint8)
+        for row, key in enumerate(keys):
+            table[row] = cellsFor(key)
+        return table[inverse, (x & 15) | ((y & 15) << 4) | ((z & 15) << 8)]
+
+    def solidAt(self, x, y, z):
+        return self.gather(x, y, z, self.chunkBlocks) != AIR
+
+    def anySolid(self, corners):
+        # corners: [(x, y, z)] de arrays de células; True onde algum é sólido
+        count = len(corners[0][0])
+        x = np.concatenate([corner[0] for corner in corners])
+        y = np.concatenate([corner[1] for corner in corners])
+        z = np.concatenate([corner[2] for corner in corners])
+        return self.solidAt(x, y, z).reshape(len(corners), count).any(axis=0)
+
+    def step(self, dt, loadedColumns=None):
+        # Um tick fixo. loadedColumns: colunas de chunks com dados; quem está
+        # fora delas fica parado em vez de cair no vazio.
+        n = self.count
+        if n == 0:
+            return
+        pos, vel = self.pos[:n], self.vel[:n]
+        self.previous[:n] = pos
+        self.age[:n] += dt
+        kind = self.kind[:n]
+        half = self.halfExtents[kind]
+        mobs = kind == MOB
+        items = kind == ITEM
+        self.wanderMobs(mobs, dt)
+        # Parados no chão (itens sem velocidade, mobs sem andar) não se movem
+        # até blockChanged acordar: não leem blocos a cada tick
+        moving = np.where(self.onGround[:n] & (vel[:, 0] == 0) & (vel[:, 1] == 0), 0.0, dt)
+        if loadedColumns is not None:
+            awake = np.flatnonzero(moving)
+            columns = np.floor(pos[awake, :2] / (BLOCK_SIZE * CHUNK_SIZE)).astype(np.int64)
+            loaded = np.array(list(loadedColumns), dtype=np.int64).reshape(-1, 2)
+            inside = np.isin(packKeys(columns[:, 0], columns[:, 1], 0), packKeys(loaded[:, 0], loaded[:, 1], 0))
+            moving[awake[~inside]] = 0.0
+
+        sliding = items & self.onGround[:n]
+        vel[sliding, :2] *= np.exp(-ITEM_DRAG * dt)
+        stopped = sliding & (np.abs(vel[:, 0]) < REST_SPEED) & (np.abs(vel[:, 1]) < REST_SPEED)
+        vel[stopped, :2] = 0.0
+        vel[:, 2] = np.maximum(vel[:, 2] + GRAVITY * moving, -TERMINAL_SPEED)
+
+        # z primeiro, depois x e y, como physics.moveBox
+        blockedZ = self.moveAxis(pos, vel[:, 2] * moving, half, 2)
+        self.onGround[:n] = np.where(moving > 0, blockedZ & (vel[:, 2] < 0), self.onGround[:n])
+        self.redraw[:n] |= moving > 0
+        vel[blockedZ, 2] = 0.0
+        blocked = self.moveAxis(pos, vel[:, 0] * moving, half, 0)
+        blocked |= self.moveAxis(pos, vel[:, 1] * moving, half, 1)
+        vel[blocked & items, :2] = 0.0
+        # Mob no chão que bateu numa parede pula o degrau
+        vel[blocked & mobs & self.onGround[:n], 2] = MOB_JUMP_SPEED
+        self.hash = None
+
+        gone = (items & (self.age[:n] > ITEM_LIFETIME)) | (pos[:, 2] < FALL_LIMIT)
+        if gone.any():
+            self.remove(np.flatnonzero(gone))
+        self.mergeTimer += dt
+        if self.mergeTimer >= MERGE_INTERVAL:
+            self.mergeTimer = 0.0
+            self.mergeItems()
+
+    def wanderMobs(self, mobs, dt):
+        # Cada mob anda numa direção ao acaso (ou fica parado) por alguns
+        # segundos e depois escolhe outra
+        wander = self.wander[:self.count]
+        wander[mobs] -= dt
+        renew = np.flatnonzero(mobs & (wander <= 0))
+        if len(renew) == 0:
+            return
+        heading = self.rng.uniform(0, 2 * pi, len(renew))
+        speed = np.where(self.rng.random(len(renew)) < MOB_IDLE_CHANCE, 0.0, MOB_SPEED)
+        self.vel[renew, 0] = -np.sin(heading) * speed
+        self.vel[renew, 1] = np.cos(heading) * speed
+        wander[renew] = self.rng.uniform(*MOB_WANDER_TIME, len(renew))
+
+    def moveAxis(self, pos, delta, half, axis):
+        # Move no eixo e para encostado na célula sólida onde a face da
+        # frente chegaria. Altera pos; -> quem foi bloqueado.
+        blocked = np.zeros(len(pos), dtype=bool)
+        moving = np.flatnonzero(delta)
+        if len(moving) == 0:
+            return blocked
+        center, extent, delta = pos[moving], half[moving], delta[moving]
+        forward = delta > 0
+        target = center[:, axis] + delta
+        offset = BLOCK_SIZE // 2 if axis == 2 else 0  # grade de z deslocada, ver physics.AXIS_OFFSET
+        cell = np.floor((target + np.where(forward, extent[:, axis], -extent[:, axis]) + offset) / BLOCK_SIZE)
+        cell = cell.astype(np.int64)
+
+        # Células dos dois lados da caixa nos outros eixos (um pouco para
+        # dentro, para não contar o que só encosta)
+        sides = []
+        for other in range(3):
+            if other == axis:
+                sides.append((cell,))
+                continue
+            otherOffset = BLOCK_SIZE // 2 if other == 2 else 0
+            low = center[:, other] - extent[:, other] + EPSILON + otherOffset
+            high = center[:, other] + extent[:, other] - EPSILON + otherOffset
+            sides.append((np.floor(low / BLOCK_SIZE).astype(np.int64), np.floor(high / BLOCK_SIZE).astype(np.int64)))
+        corners = [(x, y, z) for x in sides[0] for y in sides[1] for z in sides[2]]
+        hit = self.anySolid(corners)
+
+        start = cell * BLOCK_SIZE - offset
+        stop = np.where(forward, start - extent[:, axis], start + BLOCK_SIZE + extent[:, axis])
+        pos[moving, axis] = np.where(hit, stop, target)
+        blocked[moving] = hit
+        return blocked
+
+    def mergeItems(self):
+        # Itens iguais parados na mesma célula do hash viram uma pilha
+        n = self.count
+        candidates = np.flatnonzero((self.kind[:n] == ITEM) & self.onGround[:n] & (self.age[:n] >= PICKUP_DELAY))
+        if len(candidates) < 2:
+            return
+        cells = np.floor(self.pos[candidates] / HASH_CELL).astype(np.int64)
+        keys = packKeys(cells[:, 0], cells[:, 1], cells[:, 2])
+        order = np.lexsort((self.blockId[candidates], keys))
+        grouped = candidates[order]
+        keys = keys[order]
+        blockIds = self.blockId[grouped]
+        first = np.ones(len(grouped), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (blockIds[1:] != blockIds[:-1])
+        if first.all():
+            return
+        starts = np.flatnonzero(first)
+        self.stack[grouped[starts]] = np.add.reduceat(self.stack[grouped], starts)
+        self.remove(grouped[~first])
+
+    def nearby(self, point, radius, kind=None):
+        # -> índices das entidades a até radius de point
+        if self.hash is None:
+            self.hash = SpatialHash(self.pos[:self.count])
+        found = self.hash.query(np.asarray(point, dtype=np.float64), radius)
+        if kind is not None:
+            found = found[self.kind[found] == kind]
+        return found
+
+    def collect(self, point, radius=PICKUP_RADIUS):
+        # Pega os itens perto de point. -> {blockId: quantidade}
+        found = self.nearby(point, radius, ITEM)
+        found = found[self.age[found] >= PICKUP_DELAY]
+        if len(found) == 0:
+            return {}
+        counts = np.bincount(self.blockId[found], weights=self.stack[found])
+        self.remove(found)
+        return {blockId: int(count) for blockId, count in enumerate(counts) if count}
+
+    def brightness(self, centers):
+        # Luz de cada entidade: o nível da célula onde está o centro
+        if self.light is None:
+            return np.ones(len(centers), dtype=np.float32)
+        cells = np.floor((centers + (0, 0, BLOCK_SIZE // 2)) / BLOCK_SIZE).astype(np.int64)
+        stored = self.gather(cells[:, 0], cells[:, 1], cells[:, 2], self.chunkLight)
+        return self.lightCurve[self.lightLevels[stored]]
+
+    def buildVertices(self, alpha=1.0):
+        # Um cubo por entidade no formato dos vértices dos chunks (meshing.py),
+        # interpolado entre os dois últimos ticks. Os arrays ficam de um frame
+        # para o outro: só as entidades que andaram são reescritas, a não ser
+        # que entidades tenham entrado ou saído. -> (vértices, índices)
+        n = self.count
+        cubeVertices = len(self.cubeCorners)
+        if self.vertices is None or len(self.vertices) < n:
+            self.vertices = np.empty((self.capacity, cubeVertices, FLOATS_PER_VERTEX), dtype=np.float32)
+            self.indices = (self.cubeIndices[None, :] +
+                            (np.arange(self.capacity, dtype=np.uint32) * cubeVertices)[:, None]).reshape(-1)
+            self.verticesStale = True
+        if self.verticesStale:
+            self.verticesStale = False
+            rows = slice(0, n)
+            vertices = self.vertices[:n]
+            vertices[:, :, 3:6] = self.cubeNormals
+            vertices[:, :, 6:8] = self.cubeUvs
+            vertices[:, :, 8] = self.faceLayers[self.blockId[:n]][:, self.cubeFaces]
+            self.offsets = ((self.cubeCorners[None] * 2 - 1) * self.halfExtents[self.kind[:n]][:, None, :]).astype(np.float32)
+        else:
+            rows = np.flatnonzero(self.redraw[:n])
+        previous, pos = self.previous[rows], self.pos[rows]
+        centers = previous + (pos - previous) * alpha
+        self.vertices[rows, :, 0:3] = centers.astype(np.float32)[:, None, :] + self.offsets[rows]
+        self.vertices[rows, :, 9] = self.brightness(centers)[:, None] * self.cubeShades
+        # Continua marcada até o desenho chegar na posição do último tick
+        self.redraw[rows] = (previous != pos).any(axis=1)
+        return self.vertices[:n].reshape(-1), self.indices[:n * len(self.cubeIndices)]
@@ -0,0 +1,189 @@
+from collections import deque
+from fractions import Fraction
+from time import perf_counter
+
+from panda3d.core import Shader, Texture
+
+# Ajusta a qualidade para segurar o FPS escolhido no menu. A cada janela de
+# um segundo de frames compara o percentil 90 do tempo de frame (relógio de
+# parede) com o tempo alvo:
+#
+# - acima de OVER_BUDGET do alvo em DEGRADE_WINDOWS janelas seguidas: desce
+#   um degrau de qualidade;
+# - dentro do alvo por probeWindows janelas: tenta subir um degrau. Com o FPS
+#   limitado não dá para ver a folga (o limite dorme o resto do frame), então
+#   subir é uma tentativa; se ela falhar logo em seguida, a próxima espera o
+#   dobro. Isso é a histerese que impede a qualidade de ficar subindo e
+#   descendo.
+#
+# Cada degrau piora uma coisa, das que menos aparecem para as que mais
+# aparecem. Os valores partem das configurações do jogador (base).
+
+STEPS = ['lod', 'budget', 'radius', 'lod', 'scale', 'radius', 'scale', 'budget', 'radius', 'scale', 'scale']
+
+MIN_RADIUS = 2
+MIN_LOD_DISTANCE = 1
+MIN_BUDGET_MS = 1.0
+SCALE_STEP = 0.125
+MIN_SCALE = 0.5
+
+OVER_BUDGET = 1.2  # p90 acima de 120% do tempo alvo
+DEGRADE_WINDOWS = 2
+PROBE_WINDOWS = 5
+MAX_PROBE_WINDOWS = 80
+COOLDOWN_WINDOWS = 2  # espera depois de mudar, até a mudança fazer efeito
+
+
+# Estica a textura da cena na tela. A posição vem do pixel da tela vezes a
+# escala, então o espaço extra da textura (arredondada para potência de 2)
+# não aparece.
+UPSCALE_VERTEX_SHADER = '''
+#version 130
+uniform mat4 p3d_ModelViewProjectionMatrix;
+in vec4 p3d_Vertex;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+}
+'''
+
+UPSCALE_FRAGMENT_SHADER = '''
+#version 130
+uniform sampler2D tex;
+uniform float renderScale;
+out vec4 color;
+
+void main() {
+    color = texture(tex, gl_FragCoord.xy * renderScale / vec2(textureSize(tex, 0)));
+}
+'''
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def settingsFor(base, level):
+    settings = dict(base)
+    for step in STEPS[:level]:
+        if step == 'lod':
+            # Chunks simplificados começam uma coluna mais perto. Sem LOD (0)
+            # conta a partir do raio: vira radius - 1, no mínimo MIN_LOD_DISTANCE
+            current = settings['lodDistance'] or settings['radius']
+            settings['lodDistance'] = max(MIN_LOD_DISTANCE, current - 1)
+        elif step == 'budget':
+            settings['budgetMs'] = max(MIN_BUDGET_MS, settings['budgetMs'] / 2)
+        elif step == 'radius':
+            settings['radius'] = max(MIN_RADIUS, settings['radius'] - 1)
+        elif step == 'scale':
+            settings['renderScale'] = max(MIN_SCALE, settings['renderScale'] - SCALE_STEP)
+    return settings
+
+
+class RenderScale:
+    # Desenha a cena num buffer menor que a janela e estica na tela (o HUD
+    # continua na resolução da janela). Em escala 1 desenha direto.
+    def __init__(self, base):
+        self.base = base
+        self.manager = None
+        self.quad = None
+        self.scale = 1.0
+
+    def set(self, scale):
+        if scale == self.scale or self.base.win is None:
+            return
+        self.scale = scale
+        if scale >= 1.0:
+            if self.manager is not None:
+                self.manager.cleanup()
+                self.manager = self.quad = None
+            return
+
+        if self.manager is None:
+            from direct.filter.FilterManager import FilterManager
+            self.manager = FilterManager(self.base.win, self.base.cam)
+            texture = Texture()
+            texture.setMagfilter(Texture.FT_linear)
+            self.quad = self.manager.renderSceneInto(colortex=texture)
+            self.quad.setShader(Shader.make(Shader.SL_GLSL, UPSCALE_VERTEX_SHADER, UPSCALE_FRAGMENT_SHADER))
+            self.quad.setShaderInput('tex', texture)
+        fraction = Fraction(scale).limit_denominator(8)
+        # O FilterManager guarda (mul, div, align) de cada buffer
+        self.manager.sizes[0] = (fraction.numerator, fraction.denominator, 1)
+        self.manager.resizeBuffers()
+        self.quad.setShaderInput('renderScale', float(fraction))
+
+
+class QualityGovernor:
+    def __init__(self, base, apply, targetFps=60, enabled=True):
+        self.base = base
+        self.apply = apply  # recebe o dicionário de settingsFor
+        self.enabled = enabled
+        self.level = 0
+        self.maxLevel = len(STEPS)
+        self.frameTimes = deque()
+        self.lastFrame = None
+        self.overWindows = 0
+        self.goodWindows = 0
+        self.cooldown = 0
+        self.probeWindows = PROBE_WINDOWS
+        self.lastChange = None  # 'up' ou 'down'
+        self.windowsSinceChange = 0
+        self.setTarget(targetFps)
+
+    def setTarget(self, fps):
+        self.targetMs = 1000.0 / fps
+        self.windowSize = max(10, int(fps))
+        self.frameTimes.clear()
+
+    def setBase(self, **values):
+        self.base.update(values)
+        self.apply(self.settings())
+
+    def settings(self):
+        return settingsFor(self.base, self.level)
+
+    def setLevel(self, level):
+        direction = 'down' if level > self.level else 'up'
+        self.level = level
+        self.lastChange = direction
+        self.windowsSinceChange = 0
+        self.cooldown = COOLDOWN_WINDOWS
+        self.overWindows = self.goodWindows = 0
+        self.apply(self.settings())
+
+    def update(self, task):
+        now = perf_counter()
+        if self.lastFrame is not None and self.enabled:
+            self.frameTimes.append((now - self.lastFrame) * 1000)
+            if len(self.frameTimes) >= self.windowSize:
+                self.evaluate(percentile(self.frameTimes, 0.9))
+                self.frameTimes.clear()
+        self.lastFrame = now
+        return task.cont
+
+    def evaluate(self, p90):
+        self.windowsSinceChange += 1
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+
+        if p90 > self.targetMs * OVER_BUDGET:
+            self.goodWindows = 0
+            self.overWindows += 1
+            if self.overWindows >= DEGRADE_WINDOWS and self.level < self.maxLevel:
+                if self.lastChange == 'up' and self.windowsSinceChange <= self.probeWindows:
+                    # A tentativa de subir não se sustentou: espera mais da próxima vez
+                    self.probeWindows = min(MAX_PROBE_WINDOWS, self.probeWindows * 2)
+                self.setLevel(self.level + 1)
+            return
+
+        self.overWindows = 0
+        self.goodWindows += 1
+        if self.lastChange == 'up' and self.windowsSinceChange > self.probeWindows:
+            # Subiu e aguentou: volta à espera normal
+            self.probeWindows = PROBE_WINDOWS
+            self.lastChange = None
+        if self.goodWindows >= self.probeWindows and self.level > 0:
+            self.setLevel(self.level - 1)
@@ -0,0 +1,64 @@
+import gzip
+import json
+from time import perf_counter
+
+# Gravação e replay da entrada do jogador. O arquivo é JSON por linha,
+# comprimido com gzip: a primeira linha é o cabeçalho (semente, taxa da
+# simulação, posição e olhar iniciais) e cada linha seguinte é um evento
+#
+#   [tick, ms desde o início, tipo, argumentos...]
+#
+# Tipos: 'key' (ação do keyMap, valor), 'look' (graus de heading, graus de
+# pitch), 'select' (tipo de bloco), 'place', 'remove', e 'end' no fim.
+#
+# O replay usa só o tick: os eventos de um tick são aplicados antes do tick
+# rodar, na mesma ordem da gravação. Como a física anda em ticks fixos, a
+# sessão se repete igual em qualquer FPS e sem janela. O ms fica no arquivo
+# só como referência.
+
+FORMAT_VERSION = 1
+
+
+class InputRecorder:
+    def __init__(self, path, header):
+        self.path = path
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.start = perf_counter()
+        self.events = 0
+        self.write(dict(header, version=FORMAT_VERSION))
+
+    def write(self, line):
+        self.file.write(json.dumps(line, separators=(',', ':')) + '\n')
+
+    def record(self, tick, kind, *args):
+        self.write([tick, round((perf_counter() - self.start) * 1000, 1), kind, *args])
+        self.events += 1
+
+    def close(self, tick):
+        if self.file is not None:
+            self.record(tick, 'end')
+            self.file.close()
+            self.file = None
+
+
+class InputReplay:
+    def __init__(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            lines = [json.loads(line) for line in file]
+        self.header = lines[0]
+        if self.header.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{path}: unsupported input log version {self.header.get("version")}')
+        self.events = lines[1:]
+        self.endTick = self.events[-1][0] if self.events else 0
+        self.next = 0
+
+    def eventsFor(self, tick):
+        # Eventos gravados até este tick que ainda não foram aplicados
+        events = []
+        while self.next < len(self.events) and self.events[self.next][0] <= tick:
+            events.append(self.events[self.next])
+            self.next += 1
+        return events
+
+    def finished(self, tick):
+        return tick >= self.endTick and self.next >= len(self.events)
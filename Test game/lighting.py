@@ -0,0 +1,317 @@
+from collections import deque
+
+from world import AIR, CHUNK_SIZE, CHUNK_VOLUME, localIndex
+from blocks import LIGHT_EMISSION
+
+# Luz por bloco, calculada uma vez e gravada nos vértices das malhas
+# (meshing.py), em vez de luz por pixel no render. Dois canais de 0 a 15 num
+# byte por bloco (céu << 4 | bloco):
+#
+# - céu: 15 no ar com céu aberto em cima; desce sem perder nada e, para os
+#   lados ou para cima, perde 1 por bloco;
+# - bloco: a luz que os blocos emitem (BlockType.light), perde 1 por bloco.
+#
+# Cada coluna guarda luz do chunk mais baixo ao mais alto que tinha quando foi
+# iluminada; acima disso é céu aberto e abaixo é escuro. Coluna ainda sem luz
+# conta como céu aberto. Uma coluna nova é iluminada de uma vez: o céu desce
+# camada por camada com inteiros grandes (uma célula por byte) e a busca em
+# largura só parte das células que têm um vizinho mais escuro. Uma edição
+# refaz só a região afetada: a luz que passava pelo bloco é apagada e
+# preenchida de novo a partir da borda do que foi apagado.
+
+MAX_LIGHT = 15
+SKY_SHIFT = 4
+BLOCK_SHIFT = 0
+FULL_SKY = MAX_LIGHT << SKY_SHIFT
+
+# LIGHT_LEVELS[valor guardado] -> nível visível, o maior dos dois canais
+LIGHT_LEVELS = bytes(max(value >> SKY_SHIFT, value & MAX_LIGHT) for value in range(256))
+
+NEIGHBOURS = ((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1))
+
+LAYER = CHUNK_SIZE * CHUNK_SIZE
+AIR_TABLE = bytes([1] + [0] * 255)
+FULL_SKY_CHUNK = bytes([FULL_SKY]) * CHUNK_VOLUME
+DARK_CHUNK = bytes(CHUNK_VOLUME)
+
+
+def layerMask(test):
+    # Um byte por célula de uma camada (índice x | y << 4), 1 onde test vale
+    return int.from_bytes(bytes(1 if test(index & 15, index >> 4) else 0 for index in range(LAYER)), 'little')
+
+
+ALL_OPEN = layerMask(lambda x, y: True)
+NOT_MIN_X = layerMask(lambda x, y: x > 0)
+NOT_MAX_X = layerMask(lambda x, y: x < 15)
+NOT_MIN_Y = layerMask(lambda x, y: y > 0)
+NOT_MAX_Y = layerMask(lambda x, y: y < 15)
+STEP_Y = CHUNK_SIZE * 8
+
+
+def borderPairs(dx, dy):
+    # Células da borda da coluna na direção (dx, dy) e as da coluna vizinha
+    # que encostam nelas: [(índice local aqui, índice local lá)]
+    pairs = []
+    for z in range(CHUNK_SIZE):
+        for y in range(CHUNK_SIZE):
+            for x in range(CHUNK_SIZE):
+                if (dx and x == (15 if dx > 0 else 0)) or (dy and y == (15 if dy > 0 else 0)):
+                    pairs.append((localIndex(x, y, z), localIndex(x - 15 * dx, y - 15 * dy, z)))
+    return pairs
+
+
+BORDERS = [(dx, dy, borderPairs(dx, dy)) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+
+
+def layerCells(mask, baseX, baseY, z):
+    # Posições das células marcadas (byte 1) numa máscara de camada
+    while mask:
+        low = mask & -mask
+        index = (low.bit_length() - 1) >> 3
+        yield (baseX + (index & 15), baseY + (index >> 4), z)
+        mask ^= low
+
+
+class LightMap:
+    def __init__(self, world):
+        self.world = world
+        self.chunks = {}  # chunk -> bytearray, um byte por bloco (índice x | y << 4 | z << 8)
+        self.columns = {}  # coluna -> (cz mais baixo, cz mais alto), ou None se não tem blocos
+        self.changed = set()  # chunks cuja malha lê luz que mudou
+
+    @classmethod
+    def fromBuffers(cls, world, buffers):
+        # buffers: [(coluna, faixa, [(chave, bytes)])] de columnBuffers, em outro processo
+        light = cls(world)
+        for column, span, chunks in buffers:
+            light.columns[column] = span
+            light.chunks.update(chunks)
+        return light
+
+    def columnBuffers(self, cx, cy):
+        span = self.columns[(cx, cy)]
+        return (cx, cy), span, [(key, bytes(self.chunks[key])) for key in self.columnKeys(cx, cy)]
+
+    def columnKeys(self, cx, cy):
+        span = self.columns.get((cx, cy))
+        return [] if span is None else [(cx, cy, cz) for cz in range(span[0], span[1] + 1)]
+
+    def get(self, x, y, z):
+        light = self.chunks.get((x >> 4, y >> 4, z >> 4))
+        if light is not None:
+            return light[(x & 15) | ((y & 15) << 4) | ((z & 15) << 8)]
+        span = self.columns.get((x >> 4, y >> 4))
+        if span is None or z >> 4 > span[1]:
+            return FULL_SKY
+        return 0
+
+    def levelsAround(self, key):
+        # -> level(x, y, z): nível visível em coordenadas locais do chunk, que
+        # podem sair dele em um bloco (faces da borda olham para o vizinho)
+        cells = self.chunks.get(key)
+        baseX, baseY, baseZ = key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, key[2] * CHUNK_SIZE
+        get = self.get
+
+        def level(x, y, z):
+            if cells is not None and 0 <= x < CHUNK_SIZE and 0 <= y < CHUNK_SIZE and 0 <= z < CHUNK_SIZE:
+                return LIGHT_LEVELS[cells[x | (y << 4) | (z << 8)]]
+            return LIGHT_LEVELS[get(baseX + x, baseY + y, baseZ + z)]
+        return level
+
+    def touch(self, key, x, y, z):
+        # A célula é lida pela malha do chunk dela e do vizinho, se está na borda
+        changed = self.changed
+        changed.add(key)
+        cx, cy, cz = key
+        lx, ly, lz = x & 15, y & 15, z & 15
+        if lx == 0:
+            changed.add((cx - 1, cy, cz))
+        elif lx == 15:
+            changed.add((cx + 1, cy, cz))
+        if ly == 0:
+            changed.add((cx, cy - 1, cz))
+        elif ly == 15:
+            changed.add((cx, cy + 1, cz))
+        if lz == 0:
+            changed.add((cx, cy, cz - 1))
+        elif lz == 15:
+            changed.add((cx, cy, cz + 1))
+
+    def lightColumn(self, cx, cy):
+        # -> chunks de outras colunas cuja luz mudou (a luz desta passou para lá)
+        self.changed = set()
+        heights = self.world.columns.get((cx, cy))
+        if not heights:
+            self.columns[(cx, cy)] = None
+            return self.changed
+        bottom, top = min(heights), max(heights)
+        self.columns[(cx, cy)] = (bottom, top)
+        baseX, baseY = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+        queue = deque()
+
+        opened = ALL_OPEN  # ar com céu aberto em cima
+        for cz in range(top, bottom - 1, -1):
+            chunk = self.world.chunks.get((cx, cy, cz))
+            blocks = chunk.toBytes() if chunk is not None else DARK_CHUNK
+            air = blocks.translate(AIR_TABLE)
+            light = bytearray(CHUNK_VOLUME)
+            baseZ = cz * CHUNK_SIZE
+            for z in range(CHUNK_SIZE - 1, -1, -1):
+                start = z * LAYER
+                layerAir = int.from_bytes(air[start:start + LAYER], 'little')
+                opened &= layerAir
+                light[start:start + LAYER] = (opened * FULL_SKY).to_bytes(LAYER, 'little')
+                # Céu ao lado de ar sem céu: a luz entra de lado. Na vertical
+                # não acontece, o céu sempre desce até um bloco.
+                dark = layerAir & ~opened
+                if dark:
+                    edge = opened & (
+                        (dark & NOT_MAX_X) << 8 | (dark & NOT_MIN_X) >> 8
+                        | (dark & NOT_MAX_Y) << STEP_Y | (dark & NOT_MIN_Y) >> STEP_Y
+                    )
+                    queue.extend(layerCells(edge, baseX, baseY, baseZ + z))
+
+            emission = blocks.translate(LIGHT_EMISSION)
+            if emission.count(0) < CHUNK_VOLUME:
+                for index, value in enumerate(emission):
+                    if value:
+                        light[index] |= value
+                        queue.append((baseX + (index & 15), baseY + ((index >> 4) & 15), baseZ + (index >> 8)))
+            self.chunks[(cx, cy, cz)] = light
+
+        # Bordas com colunas que já têm luz: onde os dois lados diferem, a
+        # luz pode passar de um para o outro
+        for dx, dy, pairs in BORDERS:
+            if (cx + dx, cy + dy) not in self.columns:
+                continue
+            for cz in range(bottom, top + 1):
+                ours = self.chunks[(cx, cy, cz)]
+                theirs = self.chunks.get((cx + dx, cy + dy, cz))
+                if theirs is None:
+                    outside = self.get((cx + dx) * CHUNK_SIZE, (cy + dy) * CHUNK_SIZE, cz * CHUNK_SIZE)
+                    theirs = FULL_SKY_CHUNK if outside == FULL_SKY else DARK_CHUNK
+                baseZ = cz * CHUNK_SIZE
+                for ourIndex, theirIndex in pairs:
+                    if ours[ourIndex] != theirs[theirIndex]:
+                        x = baseX + (ourIndex & 15)
+                        y = baseY + ((ourIndex >> 4) & 15)
+                        z = baseZ + (ourIndex >> 8)
+                        queue.append((x, y, z))
+                        queue.append((x + dx, y + dy, z))
+
+        self.spread(queue)
+        return {key for key in self.changed if key[:2] != (cx, cy)}
+
+    def removeColumn(self, cx, cy):
+        for key in self.columnKeys(cx, cy):
+            del self.chunks[key]
+        self.columns.pop((cx, cy), None)
+
+    def ensureChunk(self, cx, cy, cz):
+        # Bloco colocado fora da faixa com luz: estende a faixa da coluna
+        if (cx, cy, cz) in self.chunks:
+            return
+        span = self.columns[(cx, cy)]
+        if span is None:
+            new, fill, span = [cz], FULL_SKY_CHUNK, (cz, cz)
+        elif cz > span[1]:
+            new, fill, span = range(span[1] + 1, cz + 1), FULL_SKY_CHUNK, (span[0], cz)
+        else:
+            new, fill, span = range(cz, span[0]), DARK_CHUNK, (cz, span[1])
+        for z in new:
+            self.chunks[(cx, cy, z)] = bytearray(fill)
+        self.columns[(cx, cy)] = span
+
+    def blockChanged(self, x, y, z, old):
+        # O bloco em x, y, z era old e já mudou no mundo.
+        # -> chunks cuja malha precisa ser refeita por causa da luz
+        self.changed = set()
+        if (x >> 4, y >> 4) not in self.columns:
+            return self.changed
+        self.ensureChunk(x >> 4, y >> 4, z >> 4)
+        new = self.world.getBlock(x, y, z)
+
+        relight = deque()
+        if new != AIR:
+            self.darken(x, y, z, SKY_SHIFT, relight)
+            self.darken(x, y, z, BLOCK_SHIFT, relight)
+        elif LIGHT_EMISSION[old]:
+            self.darken(x, y, z, BLOCK_SHIFT, relight)
+        if LIGHT_EMISSION[new]:
+            key = (x >> 4, y >> 4, z >> 4)
+            self.chunks[key][localIndex(x, y, z)] |= LIGHT_EMISSION[new]
+            self.touch(key, x, y, z)
+            relight.append((x, y, z))
+        if new == AIR:
+            # Virou ar: recebe a luz dos vizinhos
+            relight.extend((x + dx, y + dy, z + dz) for dx, dy, dz in NEIGHBOURS)
+        self.spread(relight)
+        return self.changed
+
+    def darken(self, x, y, z, shift, relight):
+        # Apaga, num canal, a luz que dependia da célula x, y, z. Vizinhos com
+        # luz de outra fonte vão para relight, de onde o spread preenche de novo.
+        chunks = self.chunks
+        keep = 0xFF & ~(MAX_LIGHT << shift)
+        key = (x >> 4, y >> 4, z >> 4)
+        index = localIndex(x, y, z)
+        level = (chunks[key][index] >> shift) & MAX_LIGHT
+        chunks[key][index] &= keep
+        self.touch(key, x, y, z)
+
+        queue = deque([(x, y, z, level)])
+        while queue:
+            x, y, z, level = queue.popleft()
+            for dx, dy, dz in NEIGHBOURS:
+                nx, ny, nz = x + dx, y + dy, z + dz
+                key = (nx >> 4, ny >> 4, nz >> 4)
+                light = chunks.get(key)
+                if light is None:
+                    # Fora da faixa guardada: acima dela é céu aberto, que é fonte
+                    if (self.get(nx, ny, nz) >> shift) & MAX_LIGHT:
+                        relight.append((nx, ny, nz))
+                    continue
+                index = (nx & 15) | ((ny & 15) << 4) | ((nz & 15) << 8)
+                current = (light[index] >> shift) & MAX_LIGHT
+                if current == 0:
+                    continue
+                if current < level or (shift == SKY_SHIFT and dz < 0 and level == MAX_LIGHT):
+                    light[index] &= keep
+                    self.touch(key, nx, ny, nz)
+                    queue.append((nx, ny, nz, current))
+                    emission = LIGHT_EMISSION[self.world.getBlock(nx, ny, nz)] if shift == BLOCK_SHIFT else 0
+                    if emission:
+                        light[index] |= emission
+                        relight.append((nx, ny, nz))
+                else:
+                    relight.append((nx, ny, nz))
+
+    def spread(self, queue):
+        # Passa a luz das posições da fila para os vizinhos de ar, até parar de subir
+        chunks = self.chunks
+        getBlock = self.world.getBlock
+        get = self.get
+        while queue:
+            x, y, z = queue.popleft()
+            value = get(x, y, z)
+            sky = value >> SKY_SHIFT
+            block = value & MAX_LIGHT
+            if sky <= 1 and block <= 1:
+                continue
+            for dx, dy, dz in NEIGHBOURS:
+                nx, ny, nz = x + dx, y + dy, z + dz
+                key = (nx >> 4, ny >> 4, nz >> 4)
+                light = chunks.get(key)
+                if light is None or getBlock(nx, ny, nz) != AIR:
+                    continue
+                index = (nx & 15) | ((ny & 15) << 4) | ((nz & 15) << 8)
+                current = light[index]
+                newSky = sky if dz < 0 and sky == MAX_LIGHT else sky - 1
+                updated = (max(current >> SKY_SHIFT, newSky) << SKY_SHIFT) | max(current & MAX_LIGHT, block - 1)
+                if updated != current:
+                    light[index] = updated
+                    self.touch(key, nx, ny, nz)
+                    queue.append((nx, ny, nz))
+
+    def memoryBytes(self):
+        return sum(len(light) for light in self.chunks.values())
@@ -0,0 +1,410 @@
+from array import array
+
+from world import AIR, BLOCK_SIZE, CHUNK_SIZE, CHUNK_VOLUME
+from blocks import FACE_LAYERS
+from lighting import MAX_LIGHT
+
+# Geração da malha de um chunk sem depender do Panda3D: só listas de vértices
+# (x, y, z, nx, ny, nz, u, v, camada, luz) e índices. A camada escolhe a
+# textura do tipo de bloco e da face na textura array, então o chunk inteiro é
+# um Geom só. Só entram as faces que encostam em ar.
+#
+# A luz do vértice já vem pronta: o nível de luz do bloco de ar na frente da
+# face (LightMap) vezes um sombreamento fixo por direção da face, no lugar da
+# luz direcional. Sem LightMap, tudo tem luz cheia.
+#
+# Com oclusão ambiente (ao), cada canto da face escurece conforme os blocos em
+# volta dele no plano na frente da face: os dois ao lado e o da diagonal. Vai
+# junto na luz do vértice, então não custa nada no render.
+
+FACE_POS_X = 0
+FACE_NEG_X = 1
+FACE_POS_Y = 2
+FACE_NEG_Y = 3
+FACE_POS_Z = 4
+FACE_NEG_Z = 5
+
+FACE_NORMALS = (
+    (1, 0, 0),
+    (-1, 0, 0),
+    (0, 1, 0),
+    (0, -1, 0),
+    (0, 0, 1),
+    (0, 0, -1),
+)
+
+# Cantos de cada face (em blocos, a partir do canto mínimo do bloco), em ordem
+# anti-horária vista de fora, para o backface culling do Panda3D.
+FACE_CORNERS = (
+    ((1, 0, 0), (1, 1, 0), (1, 1, 1), (1, 0, 1)),
+    ((0, 1, 0), (0, 0, 0), (0, 0, 1), (0, 1, 1)),
+    ((1, 1, 0), (0, 1, 0), (0, 1, 1), (1, 1, 1)),
+    ((0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1)),
+    ((0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)),
+    ((0, 1, 0), (1, 1, 0), (1, 0, 0), (0, 0, 0)),
+)
+FACE_UVS = ((0, 0), (1, 0), (1, 1), (0, 1))
+
+# Eixo do normal e eixos (u, v) da textura de cada face
+FACE_AXES = (
+    (0, 1, 2),
+    (0, 1, 2),
+    (1, 0, 2),
+    (1, 0, 2),
+    (2, 0, 1),
+    (2, 0, 1),
+)
+
+# Topo claro, laterais um pouco mais escuras, embaixo mais escuro
+FACE_SHADES = (0.6, 0.6, 0.8, 0.8, 1.0, 0.5)
+# Brilho de cada nível de luz: cai 20% por nível, sem chegar a preto
+MIN_BRIGHTNESS = 0.05
+LIGHT_CURVE = tuple(MIN_BRIGHTNESS + (1 - MIN_BRIGHTNESS) * 0.8 ** (MAX_LIGHT - level) for level in range(MAX_LIGHT + 1))
+
+# Oclusão de um canto: 3 = nada em volta, 0 = canto fechado
+NO_OCCLUSION = (3, 3, 3, 3)
+AO_CURVE = (0.5, 0.7, 0.85, 1.0)
+# Oclusão dos 4 cantos num inteiro (2 bits por canto), para o greedy comparar
+AO_UNPACK = tuple(tuple((packed >> (corner * 2)) & 3 for corner in range(4)) for packed in range(256))
+UNIFORM_AO = {0x00, 0x55, 0xAA, 0xFF}
+
+FLOATS_PER_VERTEX = 10
+
+
+class ChunkMesh:
+    def __init__(self, key):
+        self.key = key
+        self.vertices = array('f')
+        self.indices = array('I')
+        self.vertexCount = 0
+        self.triangleCount = 0
+        self.faceCount = 0  # faces visíveis antes de juntar (greedy); no LOD, faces de célula
+
+    def isEmpty(self):
+        return not self.indices
+
+    def addQuad(self, blockId, face, x, y, z, size=(1, 1, 1), light=MAX_LIGHT, ao=NO_OCCLUSION, scale=1):
+        # size é o tamanho em blocos do retângulo; a textura repete por bloco.
+        # light é o nível de luz (0-15) na frente da face, ao a oclusão de
+        # cada canto, na ordem de FACE_CORNERS. scale é o lado da célula do
+        # LOD em blocos, para contar as faces da malha e não as dos blocos.
+        vertices = self.vertices
+        first = self.vertexCount
+        layer = FACE_LAYERS[blockId][face]
+        brightness = FACE_SHADES[face] * LIGHT_CURVE[light]
+        nx, ny, nz = FACE_NORMALS[face]
+        sx, sy, sz = size
+        uSize = size[FACE_AXES[face][1]]
+        vSize = size[FACE_AXES[face][2]]
+        for (cx, cy, cz), (u, v), occlusion in zip(FACE_CORNERS[face], FACE_UVS, ao):
+            vertices.extend((
+                (x + cx * sx) * BLOCK_SIZE, (y + cy * sy) * BLOCK_SIZE, (z + cz * sz) * BLOCK_SIZE,
+                nx, ny, nz,
+                u * uSize, v * vSize, layer,
+                brightness * AO_CURVE[occlusion],
+            ))
+        if ao[0] + ao[2] > ao[1] + ao[3]:
+            # Divide pela outra diagonal, para o escuro não formar uma faixa
+            # diferente conforme o lado (a interpolação é por triângulo)
+            self.indices.extend((first + 1, first + 2, first + 3, first + 1, first + 3, first))
+        else:
+            self.indices.extend((first, first + 1, first + 2, first, first + 2, first + 3))
+        self.vertexCount += 4
+        self.triangleCount += 2
+        self.faceCount += (uSize // scale) * (vSize // scale)
+
+
+def chunkOrigin(key):
+    # Canto mínimo do chunk em coordenadas do render
+    cx, cy, cz = key
+    return (
+        cx * CHUNK_SIZE * BLOCK_SIZE,
+        cy * CHUNK_SIZE * BLOCK_SIZE,
+        cz * CHUNK_SIZE * BLOCK_SIZE - BLOCK_SIZE // 2,
+    )
+
+
+def cornerOffsets(face):
+    # Para cada canto da face: posições (a partir do bloco) dos dois blocos ao
+    # lado e do bloco da diagonal, no plano na frente da face
+    normal = FACE_NORMALS[face]
+    axis, uAxis, vAxis = FACE_AXES[face]
+    corners = []
+    for corner in FACE_CORNERS[face]:
+        side1 = list(normal)
+        side1[uAxis] = corner[uAxis] * 2 - 1
+        side2 = list(normal)
+        side2[vAxis] = corner[vAxis] * 2 - 1
+        diagonal = list(side1)
+        diagonal[vAxis] = side2[vAxis]
+        corners.append((tuple(side1), tuple(side2), tuple(diagonal)))
+    return tuple(corners)
+
+
+AO_OFFSETS = tuple(cornerOffsets(face) for face in range(len(FACE_NORMALS)))
+
+
+def fullLight(x, y, z):
+    return MAX_LIGHT
+
+
+def noOcclusion(face, x, y, z):
+    return NO_OCCLUSION
+
+
+def occlusionAround(blocks, getBlock, key):
+    # -> ao(face, x, y, z): oclusão dos cantos da face do bloco x, y, z
+    # (locais). Os blocos em volta podem estar nos chunks vizinhos.
+    baseX, baseY, baseZ = key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, key[2] * CHUNK_SIZE
+
+    def solid(x, y, z):
+        if 0 <= x < CHUNK_SIZE and 0 <= y < CHUNK_SIZE and 0 <= z < CHUNK_SIZE:
+            return blocks[x | (y << 4) | (z << 8)] != AIR
+        return getBlock(baseX + x, baseY + y, baseZ + z) != AIR
+
+    def ao(face, x, y, z):
+        corners = []
+        for (ax, ay, az), (bx, by, bz), (cx, cy, cz) in AO_OFFSETS[face]:
+            side1 = solid(x + ax, y + ay, z + az)
+            side2 = solid(x + bx, y + by, z + bz)
+            if side1 and side2:
+                corners.append(0)
+            else:
+                corners.append(3 - side1 - side2 - solid(x + cx, y + cy, z + cz))
+        return corners
+    return ao
+
+
+def buildChunkMesh(world, key, greedy=False, lod=0, light=None, ao=False):
+    # lod > 0: malha simplificada com células de 2 ** lod blocos (chunks longe),
+    # sempre com luz cheia e sem oclusão: de longe só a superfície aparece
+    if lod > 0:
+        return buildChunkMeshLod(world, key, 1 << lod)
+    levelAt = fullLight if light is None else light.levelsAround(key)
+    if greedy:
+        return buildChunkMeshGreedy(world, key, levelAt, ao)
+
+    mesh = ChunkMesh(key)
+    chunk = world.getChunk(*key)
+    if chunk is None:
+        return mesh
+
+    blocks = chunk.toBytes()
+    getBlock = world.getBlock
+    aoAt = occlusionAround(blocks, getBlock, key) if ao else noOcclusion
+    baseX, baseY, baseZ = key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, key[2] * CHUNK_SIZE
+    last = CHUNK_SIZE - 1
+
+    for index in range(CHUNK_VOLUME):
+        blockId = blocks[index]
+        if blockId == AIR:
+            continue
+        x = index & 15
+        y = (index >> 4) & 15
+        z = index >> 8
+
+        # Vizinhos dentro do chunk vêm direto do array, os da borda vêm do mundo
+        if (blocks[index + 1] if x < last else getBlock(baseX + 16, baseY + y, baseZ + z)) == AIR:
+            mesh.addQuad(blockId, FACE_POS_X, x, y, z, light=levelAt(x + 1, y, z), ao=aoAt(FACE_POS_X, x, y, z))
+        if (blocks[index - 1] if x > 0 else getBlock(baseX - 1, baseY + y, baseZ + z)) == AIR:
+            mesh.addQuad(blockId, FACE_NEG_X, x, y, z, light=levelAt(x - 1, y, z), ao=aoAt(FACE_NEG_X, x, y, z))
+        if (blocks[index + 16] if y < last else getBlock(baseX + x, baseY + 16, baseZ + z)) == AIR:
+            mesh.addQuad(blockId, FACE_POS_Y, x, y, z, light=levelAt(x, y + 1, z), ao=aoAt(FACE_POS_Y, x, y, z))
+        if (blocks[index - 16] if y > 0 else getBlock(baseX + x, baseY - 1, baseZ + z)) == AIR:
+            mesh.addQuad(blockId, FACE_NEG_Y, x, y, z, light=levelAt(x, y - 1, z), ao=aoAt(FACE_NEG_Y, x, y, z))
+        if (blocks[index + 256] if z < last else getBlock(baseX + x, baseY + y, baseZ + 16)) == AIR:
+            mesh.addQuad(blockId, FACE_POS_Z, x, y, z, light=levelAt(x, y, z + 1), ao=aoAt(FACE_POS_Z, x, y, z))
+        if (blocks[index - 256] if z > 0 else getBlock(baseX + x, baseY + y, baseZ - 1)) == AIR:
+            mesh.addQuad(blockId, FACE_NEG_Z, x, y, z, light=levelAt(x, y, z - 1), ao=aoAt(FACE_NEG_Z, x, y, z))
+
+    return mesh
+
+
+def buildChunkMeshGreedy(world, key, levelAt=fullLight, ao=False):
+    # Junta faces vizinhas, coplanares, do mesmo tipo de bloco e com a mesma
+    # luz em retângulos maiores, fatia por fatia ao longo do normal de cada face.
+    # Com oclusão, só faces com os 4 cantos iguais se juntam (um retângulo
+    # maior esticaria o degradê de um canto).
+    mesh = ChunkMesh(key)
+    chunk = world.getChunk(*key)
+    if chunk is None:
+        return mesh
+
+    blocks = chunk.toBytes()
+    getBlock = world.getBlock
+    aoAt = occlusionAround(blocks, getBlock, key) if ao else noOcclusion
+    base = (key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, key[2] * CHUNK_SIZE)
+    strides = (1, 16, 256)
+
+    for face, (nx, ny, nz) in enumerate(FACE_NORMALS):
+        axis, uAxis, vAxis = FACE_AXES[face]
+        step = (nx, ny, nz)[axis]
+        pos = [0, 0, 0]
+
+        for layer in range(CHUNK_SIZE):
+            pos[axis] = layer
+            neighbour = layer + step
+            inside = 0 <= neighbour < CHUNK_SIZE
+            offset = strides[axis] * step
+
+            # Máscara 16x16 com tipo de bloco | luz << 8 | oclusão << 12 das
+            # faces visíveis nesta fatia
+            mask = [0] * (CHUNK_SIZE * CHUNK_SIZE)
+            found = False
+            for v in range(CHUNK_SIZE):
+                pos[vAxis] = v
+                for u in range(CHUNK_SIZE):
+                    pos[uAxis] = u
+                    index = pos[0] | (pos[1] << 4) | (pos[2] << 8)
+                    blockId = blocks[index]
+                    if blockId == AIR:
+                        continue
+                    if inside:
+                        other = blocks[index + offset]
+                    else:
+                        other = getBlock(base[0] + pos[0] + nx, base[1] + pos[1] + ny, base[2] + pos[2] + nz)
+                    if other == AIR:
+                        a0, a1, a2, a3 = aoAt(face, pos[0], pos[1], pos[2])
+                        mask[u + v * CHUNK_SIZE] = (
+                            blockId | levelAt(pos[0] + nx, pos[1] + ny, pos[2] + nz) << 8
+                            | (a0 | a1 << 2 | a2 << 4 | a3 << 6) << 12
+                        )
+                        found = True
+            if not found:
+                continue
+
+            for v in range(CHUNK_SIZE):
+                u = 0
+                while u < CHUNK_SIZE:
+                    value = mask[u + v * CHUNK_SIZE]
+                    if value == AIR:
+                        u += 1
+                        continue
+
+                    width = height = 1
+                    if value >> 12 in UNIFORM_AO:
+                        while u + width < CHUNK_SIZE and mask[u + width + v * CHUNK_SIZE] == value:
+                            width += 1
+                        while v + height < CHUNK_SIZE:
+                            row = (v + height) * CHUNK_SIZE
+                            if any(mask[row + i] != value for i in range(u, u + width)):
+                                break
+                            height += 1
+
+                    for dv in range(height):
+                        row = (v + dv) * CHUNK_SIZE
+                        for i in range(u, u + width):
+                            mask[row + i] = AIR
+
+                    pos[uAxis] = u
+                    pos[vAxis] = v
+                    size = [1, 1, 1]
+                    size[uAxis] = width
+                    size[vAxis] = height
+                    mesh.addQuad(value & 0xFF, face, pos[0], pos[1], pos[2], size, (value >> 8) & MAX_LIGHT,
+                                 AO_UNPACK[value >> 12])
+                    u += width
+
+    return mesh
+
+
+def coarseGrid(world, key, scale):
+    # Reduz o chunk (e uma célula de borda em volta) para células de
+    # scale x scale x scale blocos. A célula é sólida se pelo menos metade dos
+    # blocos for sólida, com o tipo de bloco mais comum entre eles.
+    cells = CHUNK_SIZE // scale
+    side = cells + 2
+    half = scale * scale * scale // 2
+    base = (key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, key[2] * CHUNK_SIZE)
+    chunk = world.getChunk(*key)
+    blocks = chunk.toBytes()
+    getBlock = world.getBlock
+    offsets = [(dx, dy, dz) for dz in range(scale) for dy in range(scale) for dx in range(scale)]
+
+    grid = [AIR] * (side * side * side)
+    index = 0
+    for gz in range(-1, cells + 1):
+        for gy in range(-1, cells + 1):
+            for gx in range(-1, cells + 1):
+                x, y, z = gx * scale, gy * scale, gz * scale
+                counts = {}
+                if 0 <= gx < cells and 0 <= gy < cells and 0 <= gz < cells:
+                    for dx, dy, dz in offsets:
+                        blockId = blocks[(x + dx) | ((y + dy) << 4) | ((z + dz) << 8)]
+                        if blockId != AIR:
+                            counts[blockId] = counts.get(blockId, 0) + 1
+                else:
+                    for dx, dy, dz in offsets:
+                        blockId = getBlock(base[0] + x + dx, base[1] + y + dy, base[2] + z + dz)
+                        if blockId != AIR:
+                            counts[blockId] = counts.get(blockId, 0) + 1
+                if sum(counts.values()) >= half:
+                    grid[index] = max(counts, key=counts.get)
+                index += 1
+    return grid
+
+
+def buildChunkMeshLod(world, key, scale):
+    # Mesmo greedy meshing de buildChunkMeshGreedy, sobre a grade reduzida
+    mesh = ChunkMesh(key)
+    if world.getChunk(*key) is None:
+        return mesh
+
+    grid = coarseGrid(world, key, scale)
+    cells = CHUNK_SIZE // scale
+    side = cells + 2
+    strides = (1, side, side * side)
+
+    for face, normal in enumerate(FACE_NORMALS):
+        axis, uAxis, vAxis = FACE_AXES[face]
+        offset = strides[axis] * normal[axis]
+        pos = [0, 0, 0]
+
+        for layer in range(cells):
+            pos[axis] = layer
+            mask = [0] * (cells * cells)
+            found = False
+            for v in range(cells):
+                pos[vAxis] = v
+                for u in range(cells):
+                    pos[uAxis] = u
+                    index = (pos[0] + 1) + (pos[1] + 1) * side + (pos[2] + 1) * side * side
+                    blockId = grid[index]
+                    if blockId != AIR and grid[index + offset] == AIR:
+                        mask[u + v * cells] = blockId
+                        found = True
+            if not found:
+                continue
+
+            for v in range(cells):
+                u = 0
+                while u < cells:
+                    blockId = mask[u + v * cells]
+                    if blockId == AIR:
+                        u += 1
+                        continue
+
+                    width = 1
+                    while u + width < cells and mask[u + width + v * cells] == blockId:
+                        width += 1
+                    height = 1
+                    while v + height < cells:
+                        row = (v + height) * cells
+                        if any(mask[row + i] != blockId for i in range(u, u + width)):
+                            break
+                        height += 1
+
+                    for dv in range(height):
+                        row = (v + dv) * cells
+                        for i in range(u, u + width):
+                            mask[row + i] = AIR
+
+                    pos[uAxis] = u
+                    pos[vAxis] = v
+                    size = [scale, scale, scale]
+                    size[uAxis] = width * scale
+                    size[vAxis] = height * scale
+                    mesh.addQuad(blockId, face, pos[0] * scale, pos[1] * scale, pos[2] * scale, size, scale=scale)
+                    u += width
+
+    return mesh
@@ -1,5 +1,4 @@
-import sys
-from math import pi, sin, cos
+from time import perf_counter
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
 from direct.gui.OnscreenImage import OnscreenImage
@@ -8,19 +7,69 @@ from panda3d.core import loadPrcFile
 from panda3d.core import DirectionalLight, AmbientLight
 from panda3d.core import TransparencyAttrib
 from panda3d.core import WindowProperties
-from panda3d.core import ClockObject
-from panda3d.core import CollisionTraverser, CollisionNode
-from panda3d.core import CollisionBox, CollisionRay, CollisionHandlerQueue, CollisionHandlerPusher, BitMask32
+from panda3d.core import Point3, Vec3
+from panda3d.core import ClockObject, ConfigVariableBool, ConfigVariableDouble, ConfigVariableInt, ConfigVariableString
+from world import World, AIR, DIRT, blockToWorld, worldToBlock
+from blocks import BLOCK_TYPES, BLOCK_IDS
+from raycast import raycastBlock
+from physics import FixedTimestep, PlayerPhysics, SPAWN_POS, EYE_OFFSET, REMOVE_REACH, PLACE_REACH, placementBlocked
+from chunkgeom import makeChunkState, EntityGeom
+from entities import Entities, MOB, ENTITIES_AVAILABLE
+from remesh import DirtyChunks
+from lighting import LightMap
+from streaming import ChunkStreamer
+from multiplayer import Multiplayer
+from netprotocol import EDIT_REMOVE, EDIT_PLACE
+from visibility import ChunkCulling
+from inputlog import InputRecorder, InputReplay
+from governor import QualityGovernor, RenderScale
+from terrain import TerrainGenerator
+from regions import WorldSave
+from audio import AudioManager
+from assets import modelPath, isFresh, requestModel, modelResult, writeModel
+from startup import StartupTimer
+from profiler import FrameProfiler, ProfilerOverlay
 
 loadPrcFile('settings.prc')
 globalClock = ClockObject.getGlobalClock()
 
-def degToRad(degrees):
-    return degrees * (pi / 180.0)
+greedyMeshing = ConfigVariableBool('greedy-meshing', False)
+meshRebuildBudget = ConfigVariableDouble('mesh-rebuild-budget-ms', 4.0)
+chunkViewRadius = ConfigVariableInt('chunk-view-radius', 4)
+chunkLodDistance = ConfigVariableInt('chunk-lod-distance', 0)
+chunkCulling = ConfigVariableBool('chunk-culling', True)
+voxelLighting = ConfigVariableBool('voxel-lighting', True)
+ambientOcclusion = ConfigVariableBool('ambient-occlusion', True)
+simulationRate = ConfigVariableDouble('simulation-rate', 60.0)
+inputRecordFile = ConfigVariableString('input-record-file', '')
+inputReplayFile = ConfigVariableString('input-replay-file', '')
+qualityGovernor = ConfigVariableBool('quality-governor', True)
+chunkWorkerThreads = ConfigVariableInt('chunk-worker-threads', 2)
+chunkWorkerProcesses = ConfigVariableInt('chunk-worker-processes', 0)
+terrainSeed = ConfigVariableInt('terrain-seed', 0)
+terrainAmplitude = ConfigVariableInt('terrain-amplitude', 0)
+worldSaveDir = ConfigVariableString('world-save-dir', '')
+serverAddress = ConfigVariableString('server-address', '')
+playerName = ConfigVariableString('player-name', 'player')
+autosaveInterval = ConfigVariableDouble('autosave-interval', 30.0)
+entityMobs = ConfigVariableInt('entity-mobs', 0)
+soundVoices = ConfigVariableInt('sound-voices', 4)
+soundMaxVoices = ConfigVariableInt('sound-max-voices', 8)
+assetCacheDir = ConfigVariableString('asset-cache-dir', '')
+profilerTraceFrames = ConfigVariableInt('profiler-trace-frames', 600)
+profilerTraceFile = ConfigVariableString('profiler-trace-file', 'trace.json')
+profilerPStats = ConfigVariableBool('profiler-pstats', False)
+
+SKYBOX_MODEL = 'skybox/skybox.egg'
+MOUSE_LOOK_SCALE = 1 / 60.0  # graus por pixel por ponto de sensibilidade
+MOB_SPAWN_RADIUS = 40  # mobs nascem até esta distância do jogador
 
 class Minecraft(ShowBase):
     def __init__(self):
-        ShowBase.__init__(self)
+        self.startup = StartupTimer()
+        with self.startup.phase('showbase'):
+            ShowBase.__init__(self)
+        self.profiler = FrameProfiler(self.taskMgr, profilerTraceFrames.getValue(), profilerPStats.getValue())
 
         # Performance optimizations
         self.render.setAntialias(0)  # Disable antialiasing for better performance
@@ -28,7 +77,13 @@ class Minecraft(ShowBase):
         
         self.heldBlockNode = None
 
-        self.play_music("theme.ogg")
+        with self.startup.phase('sounds'):
+            self.audio = AudioManager(self.loader, self.taskMgr, soundVoices.getValue(), soundMaxVoices.getValue())
+            self.audio.preload("create_block.ogg", "remove_block.ogg")
+            self.play_music("theme.ogg")
+
+        # Modelos carregam em threads do Loader enquanto o terreno é gerado
+        self.requestModels()
 
         self.selectedBlockType = 'sand'
         self.fov = 80
@@ -36,104 +91,175 @@ class Minecraft(ShowBase):
         self.sprinting = False
         self.ctrl_held = False
 
-        self.loadModels()
-        self.setupLights()
-        self.generateTerrain()
-
-        self.playerNode = self.render.attachNewNode('player')
+        # Replay de uma sessão gravada: a entrada vem do arquivo, não do teclado
+        self.replay = InputReplay(inputReplayFile.getValue()) if inputReplayFile.getValue() else None
+        self.inputRecorder = None
 
-        self.cTrav_player = CollisionTraverser()
-        self.pusher = CollisionHandlerPusher()
-        self.ground_queue = CollisionHandlerQueue()
+        self.world = World()
+        self.light = LightMap(self.world) if voxelLighting.getValue() else None
+        self.dirtyChunks = DirtyChunks(meshRebuildBudget.getValue(), corners=ambientOcclusion.getValue())
 
-        self.setupCamera()
-        self.setupSkybox()
-        self.captureMouse()
-        self.setupControls()
-        self.create_settings_menu()
-
-        self.z_velocity = 0
-        self.on_ground = False
+        self.setupLights()
 
+        self.worldSave = None
+        self.multiplayer = None
+        seed, amplitude = terrainSeed.getValue(), terrainAmplitude.getValue()
+        freshWorld = True
+        if self.replay is not None:
+            # O replay sempre parte do terreno gerado, sem mundo salvo
+            seed, amplitude = self.replay.header['seed'], self.replay.header['amplitude']
+        elif serverAddress.getValue():
+            # O mundo é do servidor: as colunas vêm dele, sem save local
+            self.multiplayer = Multiplayer(self, serverAddress.getValue(), playerName.getValue())
+            seed, amplitude = self.multiplayer.seed, self.multiplayer.amplitude
+            freshWorld = False
+        elif worldSaveDir.getValue():
+            # Mundo salvo usa sempre a semente com que foi criado
+            self.worldSave = WorldSave(worldSaveDir.getValue())
+            meta = self.worldSave.readMeta()
+            if meta is None:
+                self.worldSave.writeMeta({'seed': seed, 'amplitude': amplitude})
+            else:
+                seed, amplitude = meta['seed'], meta['amplitude']
+                freshWorld = False
+        self.terrainGenerator = TerrainGenerator(seed=seed, amplitude=amplitude)
+        # Itens no chão e mobs, só no cliente (não vão para o servidor)
+        self.entities = Entities(self.world, self.light, seed=seed) if ENTITIES_AVAILABLE else None
+        self.inventory = {}  # blockId -> itens pegos do chão
+        self.streamer = ChunkStreamer(
+            self.world,
+            self.render,
+            None,  # chunkState, quando os modelos chegarem
+            self.terrainGenerator if self.multiplayer is None else None,
+            radius=chunkViewRadius.getValue(),
+            workers=chunkWorkerThreads.getValue(),
+            greedy=greedyMeshing.getValue(),
+            budgetMs=meshRebuildBudget.getValue(),
+            processes=chunkWorkerProcesses.getValue(),
+            lodDistance=chunkLodDistance.getValue(),
+            save=self.worldSave,
+            light=self.light,
+            ambientOcclusion=ambientOcclusion.getValue(),
+        )
+        self.culling = ChunkCulling(self.world, self.streamer) if chunkCulling.getValue() else None
+
+        # Qualidade automática para segurar o FPS escolhido no menu
+        self.renderScale = RenderScale(self)
+        self.governor = QualityGovernor({
+            'radius': chunkViewRadius.getValue(),
+            'lodDistance': chunkLodDistance.getValue(),
+            'budgetMs': meshRebuildBudget.getValue(),
+            'renderScale': 1.0,
+        }, self.applyQuality, enabled=qualityGovernor.getValue())
+        with self.startup.phase('terrain data'):
+            if self.multiplayer is not None:
+                self.multiplayer.waitForColumns(SPAWN_POS[0], SPAWN_POS[1])
+            else:
+                self.streamer.loadDataSynchronously(SPAWN_POS[0], SPAWN_POS[1])
+        with self.startup.phase('block models (wait)'):
+            self.loadModels()
+        with self.startup.phase('terrain meshes'):
+            self.generateTerrain()
+
+        with self.startup.phase('player and controls'):
+            self.playerNode = self.render.attachNewNode('player')
+            self.player = PlayerPhysics(self.findSpawn())
+            rate = self.replay.header['simulationRate'] if self.replay is not None else simulationRate.getValue()
+            self.simulation = FixedTimestep(rate)
+            self.simulationTick = 0
+
+            self.setupCamera()
+            self.setupEntities()
+            self.profilerOverlay = ProfilerOverlay(self.profiler, self.aspect2d, self.render, self.taskMgr)
+            self.captureMouse()
+            self.setupControls()
+        if self.replay is not None:
+            self.startReplay()
+        elif inputRecordFile.getValue():
+            self.startRecording(inputRecordFile.getValue(), freshWorld)
+        # Menu de configurações só é montado depois do primeiro frame
+        self.settings_menu = None
+        self.skyboxLoaded = False
+
+        self.taskMgr.add(self.afterFirstFrame, 'startup-first-frame', sort=60)
         self.taskMgr.add(self.update, 'update')
+        self.taskMgr.add(self.rebuildDirtyChunks, 'rebuild-dirty-chunks', sort=1)
+        self.taskMgr.add(self.streamChunks, 'stream-chunks', sort=2)
+        if self.multiplayer is not None:
+            self.taskMgr.add(self.multiplayer.update, 'network')
+        if self.culling is not None:
+            self.taskMgr.add(self.cullChunks, 'cull-chunks', sort=3)
+        self.taskMgr.add(self.governor.update, 'quality-governor')
+        if self.worldSave is not None:
+            self.taskMgr.doMethodLater(autosaveInterval.getValue(), self.autosave, 'autosave')
+        # Toda saída (botão Sair, fechar a janela) passa por userExit
+        self.exitFunc = self.shutdownGame
 
     def update(self, task):
         dt = globalClock.getDt()
 
         # Update FPS display
-        fps = globalClock.getAverageFrameRate()
-        self.fps_text['text'] = f"FPS: {fps:.0f}"
-
-        # ground check from previous frame
-        self.on_ground = False
-        if self.ground_queue.getNumEntries() > 0:
-            self.ground_queue.sortEntries()
-            # Check if any ray hit the ground within acceptable distance
-            for i in range(self.ground_queue.getNumEntries()):
-                ground_hit = self.ground_queue.getEntry(i)
-                hit_dist = ground_hit.getSurfacePoint(self.playerNode).getZ()
-                if hit_dist > -1.2:  # Slightly more tolerance
-                    self.on_ground = True
-                    break
-
-        # gravity
-        gravity = -20.0
-        if not self.on_ground:
-            self.z_velocity += gravity * dt
-        else:
-            # Smooth landing - gradually reduce velocity instead of instant stop
-            if self.z_velocity < 0:
-                self.z_velocity = max(0, self.z_velocity + gravity * dt * 2)
-            else:
-                self.z_velocity = 0
+        with self.profiler.section('hud'):
+            fps = globalClock.getAverageFrameRate()
+            self.fps_text['text'] = f"FPS: {fps:.0f}"
+            if self.dirtyChunks.latencies:
+                # Tempo entre a edição de um bloco e a malha nova no render
+                self.fps_text['text'] += f"  Remesh: {self.dirtyChunks.averageLatencyMs():.1f} ms"
+            if self.culling is not None:
+                self.fps_text['text'] += f"  Chunks: {self.culling.stats['drawn']}/{self.culling.stats['chunks']}"
+            if self.governor.level > 0:
+                self.fps_text['text'] += f"  Quality: -{self.governor.level}"
+            if self.inventory:
+                self.fps_text['text'] += f"  Items: {sum(self.inventory.values())}"
+
+        # Física contra a grade de blocos (gravidade, pulo, colisão) em ticks
+        # fixos, independente do FPS; o playerNode é interpolado entre os dois
+        # últimos ticks. Espera o chão carregar antes de deixar o jogador cair.
+        with self.profiler.section('physics'):
+            ticks = self.simulation.advance(dt)
+            if self.streamer.isLoaded(self.player.pos[0], self.player.pos[1]):
+                for _ in range(ticks):
+                    if self.replay is not None:
+                        self.applyReplay()
+                    self.player.step(self.world, self.keyMap, self.playerNode.getH(), self.simulation.dt)
+                    self.simulationTick += 1
+            self.playerNode.setPos(*self.player.interpolate(self.simulation.alpha()))
+
+        if self.entities is not None:
+            with self.profiler.section('entities'):
+                self.updateEntities(ticks)
+
+        with self.profiler.section('input'):
+            self.updateMouseLook()
 
-        # Verifica se caiu da plataforma
-        if self.playerNode.getZ() < -50:
-            self.playerNode.setPos(0, 0, 10)  # Volta para a área de nascimento
-            self.z_velocity = 0
+        return task.cont
 
-        # jumping
-        if self.keyMap['up'] and self.on_ground:
-            if self.keyMap.get('sprint', False) and self.keyMap.get('forward', False):
-                self.z_velocity = 16  # pulo mais forte correndo
-            else:
-                self.z_velocity = 12  # pulo normal
-
-        playerMoveSpeed = 10
-        if self.keyMap.get('sprint', False) and self.keyMap.get('forward', False) and not self.keyMap.get('crouch', False):
-            playerMoveSpeed = 18
-        elif self.keyMap.get('crouch', False):
-            playerMoveSpeed = 5  # velocidade reduzida agachado
-
-        x_movement = 0
-        y_movement = 0
-
-        player_heading = self.playerNode.getH()
-
-        if self.keyMap['forward']:
-            x_movement -= dt * playerMoveSpeed * sin(degToRad(player_heading))
-            y_movement += dt * playerMoveSpeed * cos(degToRad(player_heading))
-        if self.keyMap['backward']:
-            x_movement += dt * playerMoveSpeed * sin(degToRad(player_heading))
-            y_movement -= dt * playerMoveSpeed * cos(degToRad(player_heading))
-        if self.keyMap['left']:
-            x_movement -= dt * playerMoveSpeed * cos(degToRad(player_heading))
-            y_movement -= dt * playerMoveSpeed * sin(degToRad(player_heading))
-        if self.keyMap['right']:
-            x_movement += dt * playerMoveSpeed * cos(degToRad(player_heading))
-            y_movement += dt * playerMoveSpeed * sin(degToRad(player_heading))
-
-        # run collisions first
-        self.cTrav_player.traverse(self.render)
-
-        # update position
-        self.playerNode.setPos(
-            self.playerNode.getX() + x_movement,
-            self.playerNode.getY() + y_movement,
-            self.playerNode.getZ() + self.z_velocity * dt,
-            )
-
-        if self.cameraSwingActivated:
+    def setupEntities(self):
+        if self.entities is None:
+            return
+        self.entityGeom = EntityGeom(self.chunkState)
+        self.render.attachNewNode(self.entityGeom.node)
+        # Mobs espalhados em volta do ponto de nascimento, um pouco acima do chão
+        rng = self.entities.rng
+        positions = []
+        for _ in range(entityMobs.getValue()):
+            x = self.player.pos[0] + rng.uniform(-MOB_SPAWN_RADIUS, MOB_SPAWN_RADIUS)
+            y = self.player.pos[1] + rng.uniform(-MOB_SPAWN_RADIUS, MOB_SPAWN_RADIUS)
+            blockX, blockY, _ = worldToBlock(x, y, 0)
+            positions.append((x, y, blockToWorld(blockX, blockY, self.terrainGenerator.heightAt(blockX, blockY))[2] + 3))
+        if positions:
+            self.entities.spawn(MOB, positions, (0, 0, 0), DIRT)
+
+    def updateEntities(self, ticks):
+        # Mesmos ticks fixos da física do jogador; o desenho é interpolado
+        for _ in range(ticks):
+            self.entities.step(self.simulation.dt, self.streamer.loadedColumns)
+        for blockId, count in self.entities.collect(self.player.pos).items():
+            self.inventory[blockId] = self.inventory.get(blockId, 0) + count
+        self.entityGeom.update(*self.entities.buildVertices(self.simulation.alpha()))
+
+    def updateMouseLook(self):
+        if self.cameraSwingActivated and self.replay is None:
             md = self.win.getPointer(0)
             mouseX = md.getX()
             mouseY = md.getY()
@@ -145,17 +271,26 @@ class Minecraft(ShowBase):
             mouseChangeX = mouseX - window_center_x
             mouseChangeY = mouseY - window_center_y
 
-            # Aplicar rotação apenas se houve movimento significativo
+            # Aplicar rotação apenas se houve movimento significativo.
+            # Graus por pixel, sem dt: o mesmo movimento do mouse gira o mesmo
+            # tanto com qualquer FPS (igual ao antigo a 60 FPS).
             if abs(mouseChangeX) > 1 or abs(mouseChangeY) > 1:
-                self.playerNode.setH(self.playerNode.getH() - mouseChangeX * dt * self.mouse_sensitivity)
-                self.camera.setP(min(90, max(-90, self.camera.getP() - mouseChangeY * dt * self.mouse_sensitivity)))
+                degreesPerPixel = self.mouse_sensitivity * MOUSE_LOOK_SCALE
+                heading, pitch = self.playerNode.getH(), self.camera.getP()
+                self.playerNode.setH(heading - mouseChangeX * degreesPerPixel)
+                self.camera.setP(min(90, max(-90, pitch - mouseChangeY * degreesPerPixel)))
+                # Grava o que foi aplicado (já arredondado pelo Panda), para o
+                # replay chegar exatamente no mesmo ângulo
+                self.recordInput('look', self.playerNode.getH() - heading, self.camera.getP() - pitch)
 
                 # Recentrar o cursor automaticamente
                 self.win.movePointer(0, window_center_x, window_center_y)
 
-        return task.cont
-
     def updateKeyMap(self, key, value):
+        if self.replay is not None:
+            return
+        if self.keyMap.get(key) != value:
+            self.recordInput('key', key, value)
         self.keyMap[key] = value
 
     # def updateKeyMap(self, key, value):
@@ -163,9 +298,75 @@ class Minecraft(ShowBase):
     # print(f"Tecla: {key}, Valor: {value}, keyMap: {self.keyMap}")
 
     def SelectedBlockType(self, type):
+        if self.replay is not None:
+            return
+        self.recordInput('select', type)
+        self.selectBlockType(type)
+
+    def selectBlockType(self, type):
         self.selectedBlockType = type
         self.updateHeldBlock()
 
+    def recordInput(self, kind, *args):
+        if self.inputRecorder is not None:
+            self.inputRecorder.record(self.simulationTick, kind, *args)
+
+    def startRecording(self, path, freshWorld):
+        self.inputRecorder = InputRecorder(path, {
+            'seed': self.terrainGenerator.seed,
+            'amplitude': self.terrainGenerator.amplitude,
+            'simulationRate': 1.0 / self.simulation.dt,
+            'spawn': self.player.pos,
+            'heading': self.playerNode.getH(),
+            'pitch': self.camera.getP(),
+            'selectedBlockType': self.selectedBlockType,
+            # Mundo salvo com edições: o replay (terreno gerado) pode divergir
+            'freshWorld': freshWorld,
+        })
+        print(f"Recording input to {path}")
+
+    def stopRecording(self):
+        if self.inputRecorder is not None:
+            self.inputRecorder.close(self.simulationTick)
+            print(f"Recorded {self.inputRecorder.events} input events to {self.inputRecorder.path}")
+            self.inputRecorder = None
+
+    def startReplay(self):
+        header = self.replay.header
+        if not header.get('freshWorld', True):
+            print("Warning: session was recorded on an edited world save; replay uses generated terrain")
+        self.player = PlayerPhysics(header['spawn'])
+        self.playerNode.setPos(*self.player.pos)
+        self.playerNode.setH(header['heading'])
+        self.camera.setP(header['pitch'])
+        self.selectBlockType(header['selectedBlockType'])
+
+    def applyReplay(self):
+        # Eventos gravados antes deste tick, na ordem em que aconteceram
+        for tick, ms, kind, *args in self.replay.eventsFor(self.simulationTick):
+            if kind == 'key':
+                self.keyMap[args[0]] = args[1]
+            elif kind == 'look':
+                self.playerNode.setH(self.playerNode.getH() + args[0])
+                self.camera.setP(self.camera.getP() + args[1])
+            elif kind == 'select':
+                self.selectBlockType(args[0])
+            elif kind == 'place':
+                self.placeBlock()
+            elif kind == 'remove':
+                self.removeBlock()
+        if self.replay.finished(self.simulationTick):
+            self.replayFinished()
+
+    def replayFinished(self):
+        # Devolve o controle ao jogador e grava o trace dos últimos frames
+        self.replay = None
+        for key in self.keyMap:
+            self.keyMap[key] = False
+        print(f"Replay finished at tick {self.simulationTick}, player at {self.player.pos}")
+        self.exportTrace()
+        self.messenger.send('replay-finished')
+
     def captureMouse(self):
         self.cameraSwingActivated = True
 
@@ -188,92 +389,144 @@ class Minecraft(ShowBase):
 
     def leftClick(self):
         self.captureMouse()
-        self.removeBlock()
+        if self.replay is None:
+            self.recordInput('remove')
+            self.removeBlock()
+
+    def rightClick(self):
+        if self.replay is None:
+            self.recordInput('place')
+            self.placeBlock()
+
+    def requestModels(self):
+        cacheDir = assetCacheDir.getValue()
+        sources = [blockType.model for blockType in BLOCK_TYPES.values()] + [SKYBOX_MODEL]
+        self.assetCache = 'warm' if cacheDir and all(isFresh(cacheDir, source) for source in sources) else 'cold'
+
+        self.modelRequests = {blockId: requestModel(cacheDir, blockType.model) for blockId, blockType in BLOCK_TYPES.items()}
+        self.skyboxRequested = perf_counter()
+        self.loader.loadModel(modelPath(cacheDir, SKYBOX_MODEL), callback=self.setupSkybox)
 
     def loadModels(self):
-        self.dirtBlock = self.loader.loadModel('dirt-block.glb')
-        self.stoneBlock = self.loader.loadModel('minecraft-stone-block.glb')
-        self.sandBlock = self.loader.loadModel('sand-block.glb')
+        cacheDir = assetCacheDir.getValue()
+        self.blockModels = {blockId: modelResult(request) for blockId, request in self.modelRequests.items()}
+        if cacheDir:
+            # Partida fria: guarda o .bam para a próxima
+            for blockId, blockType in BLOCK_TYPES.items():
+                if not isFresh(cacheDir, blockType.model):
+                    writeModel(cacheDir, blockType.model, self.blockModels[blockId])
+
+        # Textura array e shader usados por todos os chunks
+        self.chunkState = makeChunkState(self.blockModels)
+        self.streamer.chunkState = self.chunkState
+
+    def getRayHitBlock(self, reach):
+        # Raio da câmera contra os dados dos blocos, só quando há clique.
+        # Retorna (bloco atingido, normal da face) ou None; normal (0, 0, 0)
+        # quando o olho está dentro do bloco.
+        with self.profiler.section('picking'):
+            origin = self.eyePosition()
+            direction = self.render.getRelativeVector(self.camera, Vec3(0, 1, 0))
+            hit = raycastBlock(self.world, origin, direction, reach)
+        if hit is None:
+            return None
+        block, normal, distance = hit
+        return block, normal
+
+    def getBlockDistance(self, block):
+        blockPos = Point3(*blockToWorld(*block))
+        return (blockPos - self.eyePosition()).length()
+
+    def eyePosition(self):
+        # Olho na posição do último tick (não a interpolada do playerNode),
+        # para a mira não depender do FPS
+        return Point3(*self.player.pos) + self.render.getRelativeVector(self.playerNode, self.camera.getPos())
 
     def removeBlock(self):
-        if self.rayQueue.getNumEntries() > 0:
-            self.rayQueue.sortEntries()
-            rayHit = self.rayQueue.getEntry(0)
+        hit = self.getRayHitBlock(REMOVE_REACH)
+        if hit is None:
+            return
+        block, normal = hit
+
+        if self.getBlockDistance(block) < REMOVE_REACH:
+            old = self.world.setBlock(*block, AIR)
+            self.blockChanged(*block, old)
+            if self.entities is not None:
+                self.entities.dropItem(*block, old)
+            if self.multiplayer is not None:
+                self.multiplayer.sendEdit(EDIT_REMOVE, block, AIR)
+            self.play_sound("remove_block.ogg")
 
-            hitNodePath = rayHit.getIntoNodePath()
-            hitObject = hitNodePath.getPythonTag('owner')
-            distanceFromPlayer = hitObject.getDistance(self.camera)
+    def createNewBlock(self, x, y, z, type):
+        # x, y, z são coordenadas de bloco no mundo (self.world)
+        return self.world.setBlock(x, y, z, BLOCK_IDS[type])
+
+    def blockChanged(self, x, y, z, old):
+        self.dirtyChunks.markBlock(x, y, z)
+        self.streamer.noteEdit(x, y, z)
+        if self.light is not None:
+            # Só a região cuja luz mudou, e os chunks que leem essa luz
+            with self.profiler.section('lighting'):
+                relit = self.light.blockChanged(x, y, z, old)
+            for key in relit:
+                self.dirtyChunks.markChunk(key)
+            self.streamer.noteRelit(relit)
+        if self.culling is not None:
+            self.culling.invalidate(x, y, z)
+        if self.entities is not None:
+            self.entities.blockChanged(x, y, z)
+        if self.worldSave is not None:
+            self.worldSave.markDirty(x >> 4, y >> 4)
+
+    def autosave(self, task):
+        # Só as colunas editadas desde o último save, escritas em outra thread
+        self.worldSave.saveDirty(self.world)
+        return task.again
+
+    def exportTrace(self):
+        frames = self.profiler.exportTrace(profilerTraceFile.getValue())
+        print(f"Trace of the last {frames} frames written to {profilerTraceFile.getValue()}")
+
+    def rebuildDirtyChunks(self, task):
+        with self.profiler.section('remesh'):
+            self.dirtyChunks.process(self.streamer.rebuildChunk)
+        return task.cont
 
-            if distanceFromPlayer < 12:
-                hitNodePath.clearPythonTag('owner')
-                hitObject.removeNode()
-                self.play_sound("remove_block.ogg")
+    def streamChunks(self, task):
+        with self.profiler.section('streaming'):
+            self.streamer.update(self.playerNode.getX(), self.playerNode.getY())
+        return task.cont
 
-    def createNewBlock(self, x, y, z, type):
-        newBlockNode = self.render.attachNewNode('new-block-placeholder')
-        newBlockNode.setPos(x, y, z)
-
-        # Performance optimization: Enable backface culling
-        newBlockNode.setRenderModeWireframe()
-        newBlockNode.clearRenderMode()
-        newBlockNode.setTwoSided(False)
-
-        if type == 'dirt':
-            self.dirtBlock.instanceTo(newBlockNode)
-            newBlockNode.setScale(1.0)  # Ajuste de escala para igualar aos outros blocos
-        elif type == 'sand':
-            self.sandBlock.instanceTo(newBlockNode)
-        elif type == 'stone':
-            self.stoneBlock.instanceTo(newBlockNode)
-
-
-        blockSolid = CollisionBox((-1, -1, -1), (1, 1, 1))
-        blockNode = CollisionNode('block-collision-node')
-        blockNode.addSolid(blockSolid)
-        blockNode.setFromCollideMask(BitMask32(0x0))
-        blockNode.setIntoCollideMask(BitMask32(0x1))
-        collider = newBlockNode.attachNewNode(blockNode)
-        collider.setPythonTag('owner', newBlockNode)
+    def applyQuality(self, settings):
+        self.streamer.radius = settings['radius']
+        self.streamer.setLodDistance(settings['lodDistance'])
+        self.streamer.budget = self.dirtyChunks.budget = settings['budgetMs'] / 1000.0
+        self.renderScale.set(settings['renderScale'])
+
+    def cullChunks(self, task):
+        with self.profiler.section('culling'):
+            self.culling.update(self.camera, self.camLens, self.render)
+        return task.cont
 
     def placeBlock(self):
-        if self.rayQueue.getNumEntries() > 0:
-            self.rayQueue.sortEntries()
-            rayHit = self.rayQueue.getEntry(0)
-            hitNodePath = rayHit.getIntoNodePath()
-            normal = rayHit.getSurfaceNormal(hitNodePath)
-            hitObject = hitNodePath.getPythonTag('owner')
-            distanceFromPlayer = hitObject.getDistance(self.camera)
-
-            if distanceFromPlayer < 14:
-                hitBlockPos = hitObject.getPos()
-                newBlockPos = hitBlockPos + normal * 2
-                
-                # Get player position
-                playerPos = self.playerNode.getPos()
-                
-                # Check if the new block would be placed under the player's feet
-                # Player occupies space from feet (playerPos.z - 0.9) to head (playerPos.z + 2)
-                playerFeetZ = playerPos.getZ() - 0.9
-                playerHeadZ = playerPos.getZ() + 2
-                
-                # Check if block is too close horizontally and vertically to player
-                horizontalDistance = ((newBlockPos.x - playerPos.x) ** 2 + (newBlockPos.y - playerPos.y) ** 2) ** 0.5
-                
-                # Only prevent placing blocks if:
-                # 1. Block would be inside player's body (too close horizontally and within body height)
-                # 2. Block would be placed too close under feet (less than 2 units below feet level)
-                canPlace = True
-                
-                # Prevent if block is inside player's body space
-                if horizontalDistance < 1.2 and playerFeetZ <= newBlockPos.z <= playerHeadZ:
-                    canPlace = False
-                
-                # Prevent if block is too close under feet (less than 2 units below)
-                if horizontalDistance < 1.5 and newBlockPos.z > playerFeetZ - 2 and newBlockPos.z < playerFeetZ:
-                    canPlace = False
-                
-                if canPlace:
-                    self.createNewBlock(newBlockPos.x, newBlockPos.y, newBlockPos.z, self.selectedBlockType)
+        hit = self.getRayHitBlock(PLACE_REACH)
+        if hit is not None:
+            block, normal = hit
+            if normal == (0, 0, 0):
+                return  # olho dentro do bloco: não há face onde pôr
+
+            if self.getBlockDistance(block) < PLACE_REACH:
+                newBlock = (block[0] + normal[0], block[1] + normal[1], block[2] + normal[2])
+                if self.world.getBlock(*newBlock) != AIR:
+                    return
+
+                # Não coloca dentro do corpo nem logo abaixo dos pés (posição
+                # do último tick, não a interpolada)
+                if not placementBlocked(self.player.pos, blockToWorld(*newBlock)):
+                    old = self.createNewBlock(*newBlock, self.selectedBlockType)
+                    self.blockChanged(*newBlock, old)
+                    if self.multiplayer is not None:
+                        self.multiplayer.sendEdit(EDIT_PLACE, newBlock, BLOCK_IDS[self.selectedBlockType])
                     self.play_sound("create_block.ogg")
 
     def setupControls(self):
@@ -289,7 +542,7 @@ class Minecraft(ShowBase):
 
         # self.accept('escape', self.releaseMouse)
         self.accept('mouse1', self.leftClick)
-        self.accept('mouse3', self.placeBlock)
+        self.accept('mouse3', self.rightClick)
         # self.accept('f1', self.captureMouse)  # NOVO: tecla para recapturar o mouse
 
         self.accept('w', self.updateKeyMap, ['forward', True])
@@ -338,17 +591,20 @@ class Minecraft(ShowBase):
         self.accept('shift', self.updateKeyMap, ['crouch', True])
         self.accept('shift-up', self.updateKeyMap, ['crouch', False])
 
-        self.accept('1', self.SelectedBlockType, ['dirt'])
-        self.accept('2', self.SelectedBlockType, ['sand'])
-        self.accept('3', self.SelectedBlockType, ['stone'])
+        for number, blockType in enumerate(BLOCK_TYPES.values(), 1):
+            self.accept(str(number), self.SelectedBlockType, [blockType.name])
 
         self.accept('escape', self.toggle_settings_menu)
 
+        # Perfil por subsistema: F3 mostra o gráfico, F4 grava o trace
+        self.accept('f3', self.profilerOverlay.toggle)
+        self.accept('f4', self.exportTrace)
+
     def setupCamera(self):
         self.disableMouse()
-        self.playerNode.setPos(0, 0, 10)
+        self.playerNode.setPos(*self.player.pos)
         self.camera.reparentTo(self.playerNode)
-        self.camera.setPos(0, -0.9, 1.7)  # Head height position (eye level)
+        self.camera.setPos(*EYE_OFFSET)  # Head height position (eye level)
         self.camLens.setFov(self.fov)
 
         crosshairs = OnscreenImage(
@@ -367,53 +623,26 @@ class Minecraft(ShowBase):
             frameColor=(0, 0, 0, 0)
         )
 
-        self.cTrav = CollisionTraverser()
-        ray = CollisionRay()
-        ray.setFromLens(self.camNode, (0, 0))
-        rayNode = CollisionNode('line-of-sight')
-        rayNode.addSolid(ray)
-        rayNode.setFromCollideMask(BitMask32(0x1))
-        rayNode.setIntoCollideMask(BitMask32(0x0))
-        rayNodePath = self.camera.attachNewNode(rayNode)
-        self.rayQueue = CollisionHandlerQueue()
-        self.cTrav.addCollider(rayNodePath, self.rayQueue)
-
-        # Player collision setup
-        player_cnode = CollisionNode('player')
-        player_cnode.addSolid(CollisionBox((-0.6, -0.6, -0.9), (0.6, 0.6, 2)))
-        player_cnode.setFromCollideMask(BitMask32(0x1))
-        player_cnode.setIntoCollideMask(BitMask32(0x0))
-        player_collider = self.playerNode.attachNewNode(player_cnode)
-        self.pusher.addCollider(player_collider, self.playerNode)
-        self.cTrav_player.addCollider(player_collider, self.pusher)
-
-        # Ground check rays - multiple rays for better edge detection
-        ground_cnode = CollisionNode('ground_ray_cnode')
-        
-        # Center ray
-        center_ray = CollisionRay()
-        center_ray.setOrigin(0, 0, -0.9)
-        center_ray.setDirection(0, 0, -1)
-        ground_cnode.addSolid(center_ray)
-        
-        # Corner rays for edge detection
-        corner_offset = 0.5
-        for x_offset in [-corner_offset, corner_offset]:
-            for y_offset in [-corner_offset, corner_offset]:
-                corner_ray = CollisionRay()
-                corner_ray.setOrigin(x_offset, y_offset, -0.9)
-                corner_ray.setDirection(0, 0, -1)
-                ground_cnode.addSolid(corner_ray)
-        
-        ground_cnode.setFromCollideMask(BitMask32(0x1))
-        ground_cnode.setIntoCollideMask(BitMask32(0x0))
-        ground_collider = self.playerNode.attachNewNode(ground_cnode)
-        self.cTrav_player.addCollider(ground_collider, self.ground_queue)
-
     def create_settings_menu(self):
         self.settings_menu = self.aspect2d.attachNewNode("settings_menu")
         self.settings_menu.hide()
 
+        # Distância do LOD (em colunas de chunks; 0 desliga)
+        self.lod_label = DirectLabel(
+            parent=self.settings_menu,
+            text="Distância do LOD",
+            pos=(-0.64, 0, 0.65),
+            scale=0.07
+        )
+        self.lod_slider = DirectSlider(
+            parent=self.settings_menu,
+            range=(0, 16),
+            value=chunkLodDistance.getValue(),
+            pageSize=1,
+            command=self.set_lod_distance,
+            pos=(0.1, 0, 0.6)
+        )
+
         # FOV
         self.fov_label = DirectLabel(
             parent=self.settings_menu,
@@ -483,6 +712,10 @@ class Minecraft(ShowBase):
         self.camLens.setFov(self.fov)
         self.updateHeldBlockPosition()
 
+    def set_lod_distance(self):
+        distance = int(round(self.lod_slider['value']))
+        self.governor.setBase(lodDistance=distance)
+
     def set_mouse_sensitivity(self):
         self.mouse_sensitivity = self.sensitivity_slider['value']
 
@@ -490,11 +723,14 @@ class Minecraft(ShowBase):
         fps = self.fps_slider['value']
         ClockObject.getGlobalClock().setMode(ClockObject.MLimited)
         ClockObject.getGlobalClock().setFrameRate(fps)
+        self.governor.setTarget(fps)
 
     def toggle_settings_menu(self):
         window_center_x = int(self.win.getProperties().getXSize() / 2)
         window_center_y = int(self.win.getProperties().getYSize() / 2)
         self.win.movePointer(0, window_center_x, window_center_y)
+        if self.settings_menu is None:
+            self.create_settings_menu()
         if self.settings_menu.isHidden():
             self.settings_menu.show()
             self.releaseMouse()
@@ -502,59 +738,78 @@ class Minecraft(ShowBase):
             self.settings_menu.hide()
             self.captureMouse()
 
-    def quit_game(self):
-        sys.exit()
+    def shutdownGame(self):
+        self.stopRecording()
+        self.streamer.shutdown()
+        if self.multiplayer is not None:
+            self.multiplayer.close()
+        if self.worldSave is not None:
+            self.worldSave.saveDirty(self.world)
+            self.worldSave.close()
 
-    def setupSkybox(self):
-        skybox = self.loader.loadModel('skybox/skybox.egg')
+    def quit_game(self):
+        self.userExit()
+
+    def afterFirstFrame(self, task):
+        # Roda depois do render do primeiro frame (sort 60 > igLoop)
+        self.startup.markFirstFrame()
+        with self.startup.phase('settings menu'):
+            if self.settings_menu is None:
+                self.create_settings_menu()
+        self.reportStartup()
+        return task.done
+
+    def reportStartup(self):
+        if self.startup.firstFrame is not None and self.skyboxLoaded:
+            self.startup.report(self.assetCache)
+
+    def setupSkybox(self, skybox):
+        self.startup.record('skybox (async)', perf_counter() - self.skyboxRequested)
+        cacheDir = assetCacheDir.getValue()
+        if cacheDir and not isFresh(cacheDir, SKYBOX_MODEL):
+            writeModel(cacheDir, SKYBOX_MODEL, skybox)
         skybox.setScale(500)
         skybox.setBin('background', 1)
         skybox.setDepthWrite(0)
         skybox.setLightOff()
         skybox.reparentTo(self.render)
+        self.skyboxLoaded = True
+        self.reportStartup()
+
+    def findSpawn(self):
+        # 9 unidades acima do chão, como o (0, 0, 10) original no terreno plano
+        x, y = SPAWN_POS[0], SPAWN_POS[1]
+        blockX, blockY, blockZ = worldToBlock(x, y, 0)
+        ground = blockToWorld(blockX, blockY, self.terrainGenerator.heightAt(blockX, blockY))[2] + 1
+        return (x, y, ground + 9)
 
     def generateTerrain(self):
-        # Generate optimized 25x25x25 terrain with proper layering
-        # Only generate surface and near-surface blocks for better performance
-        for z in range(8):  # Reduced depth for better performance
-            for y in range(25):
-                for x in range(25):
-                    # Calculate block type based on depth
-                    if z == 0:
-                        block_type = 'sand'   # Top layer is sand
-                    elif z <= 3:
-                        block_type = 'dirt'   # Next 3 layers are dirt
-                    else:
-                        block_type = 'stone'  # Everything below is stone
-                    
-                    self.createNewBlock(
-                        x * 2 - 25,  # Center the terrain
-                        y * 2 - 25,  # Center the terrain
-                        -z * 2,      # Build downward
-                        block_type
-                    )
+        # Só o entorno do ponto de nascimento antes do primeiro frame; o resto
+        # vem do ChunkStreamer em segundo plano
+        self.streamer.meshSynchronously(SPAWN_POS[0], SPAWN_POS[1])
+
+        faces, vertices, triangles = self.streamer.meshTotals()
+        mode = 'greedy' if greedyMeshing.getValue() else 'culled'
+        print(f"Terrain mesh ({mode}): vertices {faces * 4} -> {vertices}, triangles {faces * 2} -> {triangles}")
 
     def setupLights(self):
+        # Os chunks têm a luz gravada nos vértices (lighting.py); as luzes do
+        # Panda3D ficam só para o bloco na mão
         mainLight = DirectionalLight('main light')
         mainLightNodePath = self.render.attachNewNode(mainLight)
         mainLightNodePath.setHpr(30, -60, 0)
-        self.render.setLight(mainLightNodePath)
 
         ambientLight = AmbientLight('ambient light')
         ambientLight.setColor((0.3, 0.3, 0.3, 1))
         ambientLightNodePath = self.render.attachNewNode(ambientLight)
-        self.render.setLight(ambientLightNodePath)
+        self.heldBlockLights = [mainLightNodePath, ambientLightNodePath]
 
     def play_music(self, file_name, loop=True, volume=0.3):
-        self.music = self.loader.loadMusic(file_name)
-        self.music.setLoop(loop)
-        self.music.setVolume(volume)
-        self.music.play()
+        self.audio.playMusic(file_name, loop, volume)
 
     def play_sound(self, file_name, volume=1.0):
-        sound = self.loader.loadSfx(file_name)
-        sound.setVolume(volume)
-        sound.play()
+        with self.profiler.section('audio'):
+            self.audio.playSound(file_name, volume)
 
     def updateHeldBlock(self):
         if self.heldBlockNode:
@@ -562,12 +817,9 @@ class Minecraft(ShowBase):
             self.heldBlockNode = None
         if self.selectedBlockType:
             self.heldBlockNode = self.render.attachNewNode('held-block')
-            if self.selectedBlockType == 'dirt':
-                self.dirtBlock.instanceTo(self.heldBlockNode)
-            elif self.selectedBlockType == 'sand':
-                self.sandBlock.instanceTo(self.heldBlockNode)
-            elif self.selectedBlockType == 'stone':
-                self.stoneBlock.instanceTo(self.heldBlockNode)
+            self.blockModels[BLOCK_IDS[self.selectedBlockType]].instanceTo(self.heldBlockNode)
+            for light in self.heldBlockLights:
+                self.heldBlockNode.setLight(light)
 
 
             # Ajuste a posição para "ficar na mão" do jogador
@@ -591,5 +843,6 @@ class Minecraft(ShowBase):
             self.heldBlockNode.setPos(0.7, adjusted_y, adjusted_z)
             self.heldBlockNode.setScale(0.3)
 
-game = Minecraft()
-game.run()
+if __name__ == '__main__':
+    game = Minecraft()
+    game.run()
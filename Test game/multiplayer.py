@@ -0,0 +1,140 @@
+from time import perf_counter, sleep
+
+from panda3d.core import ClockObject
+
+from world import STONE
+from netclient import NetworkClient
+from netprotocol import (
+    DEFAULT_PORT, MOVE, EDIT, COLUMN, UNLOAD, BLOCKS, PLAYERS, MOVE_BODY, EDIT_BODY, COLUMN_KEY,
+    unpackColumn, unpackBlocks, unpackPlayers,
+)
+
+# Lado do jogo no multiplayer. As colunas do mundo vêm do servidor (o
+# ChunkStreamer roda sem generator e só faz as malhas), a posição vai para o
+# servidor a cada tick dele, e as edições são aplicadas na hora (previsão) e
+# pedidas ao servidor, que repassa o resultado como delta para todos,
+# inclusive para quem pediu se o pedido foi recusado.
+#
+# Os outros jogadores aparecem como um bloco esticado do tamanho da caixa do
+# jogador.
+
+globalClock = ClockObject.getGlobalClock()
+
+AVATAR_SCALE = (0.6, 0.6, 1.45)  # modelo de bloco vai de -1 a 1
+AVATAR_OFFSET = 0.55  # centro da caixa do jogador (de -0.9 a 2.0) acima da posição
+
+
+def parseAddress(address):
+    host, _, port = address.rpartition(':')
+    if not host:
+        return address, DEFAULT_PORT
+    return host, int(port)
+
+
+class Multiplayer:
+    def __init__(self, game, address, name):
+        self.game = game
+        self.client = NetworkClient(*parseAddress(address), name)
+        welcome = self.client.welcome
+        self.playerId = welcome['playerId']
+        self.seed = welcome['seed']
+        self.amplitude = welcome['amplitude']
+        self.spawn = welcome['spawn']
+        self.sendInterval = 1.0 / welcome['tickRate']
+        self.lastSent = 0.0
+        self.avatars = {}  # id -> (NodePath, posição recebida)
+        self.disconnected = False
+
+    def waitForColumns(self, x, y, radius=1, timeout=10.0):
+        # Antes do primeiro frame (ainda sem jogador): espera as colunas em
+        # volta do ponto de nascimento, como ChunkStreamer.loadDataSynchronously
+        streamer = self.game.streamer
+        streamer.center = streamer.columnAt(x, y)
+        wanted = set(streamer.columnsAround(radius + 1))
+        self.client.send(MOVE, MOVE_BODY.pack(*self.spawn, 0.0, 0.0))
+        deadline = perf_counter() + timeout
+        while not wanted <= streamer.loadedColumns and perf_counter() < deadline:
+            # Outros jogadores só depois dos modelos dos blocos
+            self.handle([message for message in self.client.poll() if message[0] != PLAYERS])
+            if self.client.closed:
+                raise ConnectionError('server closed the connection')
+            sleep(0.005)
+
+    def update(self, task):
+        with self.game.profiler.section('network'):
+            now = perf_counter()
+            if now - self.lastSent >= self.sendInterval:
+                self.lastSent = now
+                self.sendMove()
+            self.handle(self.client.poll())
+            self.moveAvatars(globalClock.getDt())
+            if self.client.closed and not self.disconnected:
+                self.disconnected = True
+                print("Disconnected from server")
+        return task.cont
+
+    def sendMove(self):
+        game = self.game
+        pos = game.player.pos
+        self.client.send(MOVE, MOVE_BODY.pack(pos[0], pos[1], pos[2], game.playerNode.getH(), game.camera.getP()))
+
+    def sendEdit(self, kind, block, blockId):
+        # Chamado depois da edição local, com a mesma posição e olhar que ela usou
+        game = self.game
+        pos = game.player.pos
+        self.client.send(EDIT, EDIT_BODY.pack(
+            kind, pos[0], pos[1], pos[2], game.playerNode.getH(), game.camera.getP(), *block, blockId))
+        # Junto com a posição usada, sem esperar o próximo envio
+        self.sendMove()
+
+    def handle(self, messages):
+        game = self.game
+        for kind, body in messages:
+            if kind == COLUMN:
+                column, chunks = unpackColumn(body)
+                game.streamer.applyColumn(column, chunks)
+            elif kind == UNLOAD:
+                game.streamer.unloadColumn(COLUMN_KEY.unpack(body))
+            elif kind == BLOCKS:
+                for x, y, z, blockId in unpackBlocks(body):
+                    self.applyBlock(x, y, z, blockId)
+            elif kind == PLAYERS:
+                self.updateAvatars(unpackPlayers(body))
+
+    def applyBlock(self, x, y, z, blockId):
+        game = self.game
+        if (x >> 4, y >> 4) not in game.streamer.loadedColumns or game.world.getBlock(x, y, z) == blockId:
+            return
+        old = game.world.setBlock(x, y, z, blockId)
+        game.blockChanged(x, y, z, old)
+
+    def updateAvatars(self, players):
+        seen = set()
+        for playerId, x, y, z, heading in players:
+            seen.add(playerId)
+            avatar = self.avatars.get(playerId)
+            if avatar is None:
+                node = self.game.render.attachNewNode(f'player-{playerId}')
+                model = node.attachNewNode('body')
+                self.game.blockModels[STONE].instanceTo(model)
+                model.setScale(*AVATAR_SCALE)
+                model.setZ(AVATAR_OFFSET)
+                for light in self.game.heldBlockLights:
+                    node.setLight(light)
+                node.setPos(x, y, z)
+            else:
+                node = avatar[0]
+            node.setH(heading)
+            self.avatars[playerId] = (node, (x, y, z))
+        for playerId in [playerId for playerId in self.avatars if playerId not in seen]:
+            self.avatars.pop(playerId)[0].removeNode()
+
+    def moveAvatars(self, dt):
+        # Posições chegam na taxa do servidor: anda até elas em um tick dele
+        fraction = min(1.0, dt / self.sendInterval)
+        for node, (x, y, z) in self.avatars.values():
+            pos = node.getPos()
+            node.setPos(pos.x + (x - pos.x) * fraction, pos.y + (y - pos.y) * fraction, pos.z + (z - pos.z) * fraction)
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,72 @@
+import socket
+from time import perf_counter
+
+from netprotocol import HELLO, WELCOME, FrameReader, frame, packHello, unpackWelcome
+
+# Conexão do jogo com o servidor. O jogo não usa asyncio: o socket fica não
+# bloqueante e poll() é chamado uma vez por frame, enviando o que estiver na
+# fila e devolvendo os quadros que chegaram inteiros.
+
+RECEIVE_SIZE = 256 * 1024
+
+
+class NetworkClient:
+    def __init__(self, host, port, name, timeout=5.0):
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = FrameReader()
+        self.outgoing = bytearray()
+        self.received = []  # quadros que chegaram junto com o WELCOME
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.closed = False
+
+        self.socket.sendall(frame(HELLO, packHello(name)))
+        self.welcome = unpackWelcome(self.waitFor(WELCOME, timeout))
+        self.socket.setblocking(False)
+
+    def waitFor(self, kind, timeout):
+        # Bloqueia até o primeiro quadro do tipo; os outros ficam para o poll()
+        deadline = perf_counter() + timeout
+        while perf_counter() < deadline:
+            data = self.socket.recv(RECEIVE_SIZE)
+            if not data:
+                break
+            self.bytesIn += len(data)
+            self.received.extend(self.reader.feed(data))
+            for index, (received, body) in enumerate(self.received):
+                if received == kind:
+                    del self.received[index]
+                    return body
+        raise ConnectionError(f'no reply from server (waiting for message {kind})')
+
+    def send(self, kind, body=b''):
+        self.outgoing += frame(kind, body)
+
+    def poll(self):
+        # -> [(tipo, corpo)]. Conexão fechada: closed fica True.
+        messages, self.received = self.received, []
+        if self.closed:
+            return messages
+        try:
+            if self.outgoing:
+                sent = self.socket.send(self.outgoing)
+                self.bytesOut += sent
+                del self.outgoing[:sent]
+            while True:
+                data = self.socket.recv(RECEIVE_SIZE)
+                if not data:
+                    self.close()
+                    break
+                self.bytesIn += len(data)
+                messages.extend(self.reader.feed(data))
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self.close()
+        return messages
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.socket.close()
@@ -0,0 +1,134 @@
+import struct
+
+from regions import encodeColumn, decodeColumn
+
+# Protocolo do multiplayer, por TCP. Cada mensagem é um quadro
+#
+#   [tamanho do corpo (4 bytes), tipo (1 byte), corpo]
+#
+# Não importa o Panda3D: o servidor, o cliente do jogo e os bots do teste de
+# carga usam este módulo.
+#
+# Chunks vão uma vez por coluna, quando a coluna entra no raio de interesse
+# do jogador, no mesmo formato comprimido dos arquivos de região. Depois disso
+# a coluna só recebe deltas (bloco, tipo novo), juntados por tick.
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 25570
+
+FRAME_HEADER = struct.Struct('<IB')
+MAX_FRAME = 1 << 24
+
+# Cliente -> servidor
+HELLO = 1  # versão, nome
+MOVE = 2  # posição, heading, pitch
+EDIT = 3  # pedido de edição, validado pelo servidor
+STATS = 4  # pede as estatísticas do servidor (corpo b'reset' zera depois)
+
+# Servidor -> cliente
+WELCOME = 16  # id do jogador, terreno, ponto de nascimento, taxa, raio
+COLUMN = 17  # coluna de chunks
+UNLOAD = 18  # coluna saiu do raio de interesse
+BLOCKS = 19  # deltas de blocos
+PLAYERS = 20  # outros jogadores no raio de interesse
+STATS_REPLY = 21  # JSON
+
+EDIT_REMOVE = 0
+EDIT_PLACE = 1
+
+HELLO_BODY = struct.Struct('<H')
+WELCOME_BODY = struct.Struct('<HqifffHB')
+MOVE_BODY = struct.Struct('<dddff')
+# tipo, posição, heading, pitch, bloco pedido, tipo de bloco
+EDIT_BODY = struct.Struct('<BdddffiiiB')
+COLUMN_KEY = struct.Struct('<ii')
+COUNT = struct.Struct('<I')
+BLOCK_DELTA = struct.Struct('<iiiB')
+PLAYER_STATE = struct.Struct('<Hffff')
+
+
+def frame(kind, body=b''):
+    return FRAME_HEADER.pack(len(body), kind) + body
+
+
+async def readFrame(reader):
+    # asyncio: -> (tipo, corpo). IncompleteReadError quando a conexão fecha.
+    length, kind = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME:
+        raise ValueError(f'frame too large: {length} bytes')
+    return kind, await reader.readexactly(length) if length else b''
+
+
+class FrameReader:
+    # Para sockets não bloqueantes: junta os bytes recebidos e devolve os
+    # quadros completos
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            length, kind = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME:
+                raise ValueError(f'frame too large: {length} bytes')
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((kind, bytes(self.buffer[offset + FRAME_HEADER.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
+
+def packHello(name):
+    return HELLO_BODY.pack(PROTOCOL_VERSION) + name.encode('utf-8')
+
+
+def unpackHello(body):
+    (version,) = HELLO_BODY.unpack_from(body)
+    return version, body[HELLO_BODY.size:].decode('utf-8', 'replace')
+
+
+def packWelcome(playerId, seed, amplitude, spawn, tickRate, radius):
+    return WELCOME_BODY.pack(playerId, seed, amplitude, *spawn, tickRate, radius)
+
+
+def unpackWelcome(body):
+    playerId, seed, amplitude, x, y, z, tickRate, radius = WELCOME_BODY.unpack(body)
+    return {
+        'playerId': playerId, 'seed': seed, 'amplitude': amplitude,
+        'spawn': (x, y, z), 'tickRate': tickRate, 'radius': radius,
+    }
+
+
+def packColumn(cx, cy, chunks):
+    # chunks: [(cz, bytes dos blocos, quantidade)], como WorldSave.snapshotColumn
+    return COLUMN_KEY.pack(cx, cy) + encodeColumn(chunks)
+
+
+def unpackColumn(body):
+    # -> (coluna, [Chunk])
+    cx, cy = COLUMN_KEY.unpack_from(body)
+    return (cx, cy), decodeColumn(cx, cy, memoryview(body)[COLUMN_KEY.size:])
+
+
+def packBlocks(deltas):
+    # deltas: [(x, y, z, tipo de bloco)]
+    return COUNT.pack(len(deltas)) + b''.join(BLOCK_DELTA.pack(*delta) for delta in deltas)
+
+
+def unpackBlocks(body):
+    (count,) = COUNT.unpack_from(body)
+    return list(BLOCK_DELTA.iter_unpack(body[COUNT.size:COUNT.size + count * BLOCK_DELTA.size]))
+
+
+def packPlayers(players):
+    # players: [(id, x, y, z, heading)]
+    return COUNT.pack(len(players)) + b''.join(PLAYER_STATE.pack(*player) for player in players)
+
+
+def unpackPlayers(body):
+    (count,) = COUNT.unpack_from(body)
+    return list(PLAYER_STATE.iter_unpack(body[COUNT.size:COUNT.size + count * PLAYER_STATE.size]))
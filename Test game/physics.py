@@ -0,0 +1,237 @@
+from math import floor, ceil, sin, cos, pi
+
+from world import AIR, BLOCK_SIZE
+
+# Física do jogador contra a grade de blocos: a caixa do jogador só consulta
+# as células que ela toca, então o custo por frame não depende do tamanho do
+# mundo. Regras de movimento iguais às que ficavam em Minecraft.update().
+
+PLAYER_MIN = (-0.6, -0.6, -0.9)  # mesma caixa do antigo CollisionBox do jogador
+PLAYER_MAX = (0.6, 0.6, 2.0)
+GROUND_TOLERANCE = 0.3  # os raios de chão aceitavam até 0.3 abaixo dos pés
+
+GRAVITY = -20.0
+WALK_SPEED = 10
+SPRINT_SPEED = 18
+CROUCH_SPEED = 5  # velocidade reduzida agachado
+JUMP_SPEED = 12
+SPRINT_JUMP_SPEED = 16  # pulo mais forte correndo
+
+SPAWN_POS = (0, 0, 10)
+FALL_LIMIT = -50
+
+# Olho relativo ao jogador (a câmera, antes de girar com o heading) e alcance
+# das edições. O servidor valida as edições com as mesmas regras.
+EYE_OFFSET = (0, -0.9, 1.7)
+REMOVE_REACH = 12
+PLACE_REACH = 14
+
+EPSILON = 1e-4
+
+# Ticks de simulação que um frame pode rodar; o resto do atraso é descartado
+# (um frame muito longo fica em câmera lenta em vez de travar o jogo)
+MAX_TICKS_PER_FRAME = 5
+
+# Deslocamento da grade em cada eixo: os blocos vão de 2i a 2i + 2 em x e y,
+# e de 2k - 1 a 2k + 1 em z (ver world.blockToWorld)
+AXIS_OFFSET = (0, 0, BLOCK_SIZE // 2)
+
+
+def cellRange(lo, hi, axis):
+    # Células cujo intervalo cruza (lo, hi) no eixo dado
+    offset = AXIS_OFFSET[axis]
+    return range(floor((lo + offset) / BLOCK_SIZE), ceil((hi + offset) / BLOCK_SIZE))
+
+
+def cellStart(cell, axis):
+    return cell * BLOCK_SIZE - AXIS_OFFSET[axis]
+
+
+def boxBounds(pos):
+    return (
+        [pos[0] + PLAYER_MIN[0], pos[1] + PLAYER_MIN[1], pos[2] + PLAYER_MIN[2]],
+        [pos[0] + PLAYER_MAX[0], pos[1] + PLAYER_MAX[1], pos[2] + PLAYER_MAX[2]],
+    )
+
+
+def hasSolid(world, ranges):
+    getBlock = world.getBlock
+    for x in ranges[0]:
+        for y in ranges[1]:
+            for z in ranges[2]:
+                if getBlock(x, y, z) != AIR:
+                    return True
+    return False
+
+
+def sweepAxis(world, pos, axis, delta):
+    # Move a caixa no eixo e para na primeira célula sólida no caminho.
+    # Retorna o deslocamento permitido.
+    if delta == 0:
+        return 0
+    lo, hi = boxBounds(pos)
+    ranges = [cellRange(lo[i] + EPSILON, hi[i] - EPSILON, i) for i in range(3)]
+
+    if delta > 0:
+        cells = range(floor((hi[axis] + AXIS_OFFSET[axis]) / BLOCK_SIZE),
+                      floor((hi[axis] + delta + AXIS_OFFSET[axis]) / BLOCK_SIZE) + 1)
+    else:
+        cells = range(floor((lo[axis] + AXIS_OFFSET[axis]) / BLOCK_SIZE),
+                      floor((lo[axis] + delta + AXIS_OFFSET[axis]) / BLOCK_SIZE) - 1, -1)
+
+    for cell in cells:
+        start = cellStart(cell, axis)
+        end = start + BLOCK_SIZE
+        # Ignora células que a caixa já atravessa (não empurra para fora)
+        if delta > 0 and start < hi[axis] - EPSILON:
+            continue
+        if delta < 0 and end > lo[axis] + EPSILON:
+            continue
+        ranges[axis] = (cell,)
+        if hasSolid(world, ranges):
+            if delta > 0:
+                return max(0, start - hi[axis])
+            return min(0, end - lo[axis])
+    return delta
+
+
+def moveBox(world, pos, delta):
+    # Resolve um eixo de cada vez (z primeiro, depois x e y).
+    # Retorna a nova posição e quais eixos foram bloqueados.
+    pos = list(pos)
+    blocked = [False, False, False]
+    for axis in (2, 0, 1):
+        moved = sweepAxis(world, pos, axis, delta[axis])
+        blocked[axis] = moved != delta[axis]
+        pos[axis] += moved
+    return pos, blocked
+
+
+def isOnGround(world, pos):
+    lo, hi = boxBounds(pos)
+    feet = lo[2]
+    ranges = [
+        cellRange(lo[0] + EPSILON, hi[0] - EPSILON, 0),
+        cellRange(lo[1] + EPSILON, hi[1] - EPSILON, 1),
+        cellRange(feet - GROUND_TOLERANCE, feet + EPSILON, 2),
+    ]
+    for z in ranges[2]:
+        # Só conta o bloco se o topo dele está logo abaixo dos pés
+        top = cellStart(z, 2) + BLOCK_SIZE
+        if feet - GROUND_TOLERANCE <= top <= feet + EPSILON and hasSolid(world, (ranges[0], ranges[1], (z,))):
+            return True
+    return False
+
+
+def eyePosition(pos, heading):
+    # Mesmo que a câmera filha do playerNode girado pelo heading
+    headingSin = sin(heading * pi / 180.0)
+    headingCos = cos(heading * pi / 180.0)
+    ox, oy, oz = EYE_OFFSET
+    return (pos[0] + ox * headingCos - oy * headingSin, pos[1] + ox * headingSin + oy * headingCos, pos[2] + oz)
+
+
+def lookDirection(heading, pitch):
+    # Frente da câmera (0, 1, 0) com pitch e depois heading, em coordenadas do render
+    pitchCos = cos(pitch * pi / 180.0)
+    return (-sin(heading * pi / 180.0) * pitchCos, cos(heading * pi / 180.0) * pitchCos, sin(pitch * pi / 180.0))
+
+
+def placementBlocked(playerPos, blockPos):
+    # Bloco novo (centro em blockPos, no render) dentro do corpo do jogador ou
+    # logo abaixo dos pés. O jogador vai dos pés (z - 0.9) à cabeça (z + 2).
+    playerFeetZ = playerPos[2] - 0.9
+    playerHeadZ = playerPos[2] + 2
+    horizontalDistance = ((blockPos[0] - playerPos[0]) ** 2 + (blockPos[1] - playerPos[1]) ** 2) ** 0.5
+    if horizontalDistance < 1.2 and playerFeetZ <= blockPos[2] <= playerHeadZ:
+        return True
+    # Menos de 2 unidades abaixo dos pés
+    return horizontalDistance < 1.5 and playerFeetZ - 2 < blockPos[2] < playerFeetZ
+
+
+class FixedTimestep:
+    # Acumula o tempo dos frames e diz quantos ticks fixos rodar. A fração que
+    # sobra (alpha) serve para interpolar o que é desenhado entre dois ticks.
+    def __init__(self, rate, maxTicks=MAX_TICKS_PER_FRAME):
+        self.dt = 1.0 / rate
+        self.maxTicks = maxTicks
+        self.accumulator = 0.0
+
+    def advance(self, frameTime):
+        self.accumulator += frameTime
+        ticks = int(self.accumulator / self.dt)
+        if ticks > self.maxTicks:
+            ticks = self.maxTicks
+            self.accumulator = ticks * self.dt
+        self.accumulator -= ticks * self.dt
+        return ticks
+
+    def alpha(self):
+        return self.accumulator / self.dt
+
+
+class PlayerPhysics:
+    def __init__(self, pos=SPAWN_POS):
+        self.spawn = tuple(pos)
+        self.pos = list(pos)
+        self.previous = list(pos)  # posição no tick anterior, para interpolar
+        self.z_velocity = 0
+        self.on_ground = False
+
+    def moveSpeed(self, keyMap):
+        if keyMap.get('sprint', False) and keyMap.get('forward', False) and not keyMap.get('crouch', False):
+            return SPRINT_SPEED
+        elif keyMap.get('crouch', False):
+            return CROUCH_SPEED
+        return WALK_SPEED
+
+    def interpolate(self, alpha):
+        return [previous + (current - previous) * alpha for previous, current in zip(self.previous, self.pos)]
+
+    def step(self, world, keyMap, heading, dt):
+        self.previous = list(self.pos)
+        self.on_ground = isOnGround(world, self.pos)
+
+        # gravity. O antigo "smooth landing" (max(0, z_velocity + gravity *
+        # dt * 2) caindo no chão) sempre dava 0, já que a gravidade é negativa
+        if not self.on_ground:
+            self.z_velocity += GRAVITY * dt
+        else:
+            self.z_velocity = 0
+
+        # Verifica se caiu da plataforma
+        if self.pos[2] < FALL_LIMIT:
+            self.pos = list(self.spawn)  # Volta para a área de nascimento
+            self.previous = list(self.spawn)
+            self.z_velocity = 0
+
+        # jumping
+        if keyMap.get('up', False) and self.on_ground:
+            if keyMap.get('sprint', False) and keyMap.get('forward', False):
+                self.z_velocity = SPRINT_JUMP_SPEED
+            else:
+                self.z_velocity = JUMP_SPEED
+
+        speed = dt * self.moveSpeed(keyMap)
+        headingSin = sin(heading * pi / 180.0)
+        headingCos = cos(heading * pi / 180.0)
+        x_movement = 0
+        y_movement = 0
+
+        if keyMap.get('forward', False):
+            x_movement -= speed * headingSin
+            y_movement += speed * headingCos
+        if keyMap.get('backward', False):
+            x_movement += speed * headingSin
+            y_movement -= speed * headingCos
+        if keyMap.get('left', False):
+            x_movement -= speed * headingCos
+            y_movement -= speed * headingSin
+        if keyMap.get('right', False):
+            x_movement += speed * headingCos
+            y_movement += speed * headingSin
+
+        self.pos, blocked = moveBox(world, self.pos, (x_movement, y_movement, self.z_velocity * dt))
+        if blocked[2]:
+            self.z_velocity = 0  # bateu no chão ou no teto
+        return self.pos
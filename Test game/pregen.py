@@ -0,0 +1,103 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from world import World
+from terrain import TerrainGenerator
+from chunkjobs import generateColumnBuffers, chunksFromBuffers, meshColumnBuffers
+
+# Pré-gera uma região de N x N colunas de chunks sem abrir janela e mostra
+# como a geração e as malhas escalam com o número de processos.
+#
+#   python pregen.py --size 16 --workers 0,1,2,4,8
+#
+# 0 processos roda tudo no processo atual (referência).
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=16, help='lado da região, em colunas de chunks')
+    parser.add_argument('--workers', default=None, help='lista de quantidades de processos, ex. 0,1,2,4')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--amplitude', type=int, default=6)
+    parser.add_argument('--greedy', action='store_true')
+    args = parser.parse_args()
+    if args.workers is None:
+        cpus = os.cpu_count() or 1
+        counts = [0, 1]
+        while counts[-1] * 2 <= cpus:
+            counts.append(counts[-1] * 2)
+        args.workers = counts
+    else:
+        args.workers = [int(count) for count in args.workers.split(',')]
+    return args
+
+
+def neighbourhood(world, column):
+    cx, cy = column
+    buffers = []
+    for x in range(cx - 1, cx + 2):
+        for y in range(cy - 1, cy + 2):
+            for key in world.columnKeys(x, y):
+                chunk = world.chunks[key]
+                buffers.append((key, chunk.toBytes(), chunk.count))
+    return buffers
+
+
+def pregenerate(generator, columns, workers, greedy):
+    world = World()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+    if executor:
+        chunksize = max(1, len(columns) // (workers * 8))
+        run = lambda function, *iterables: executor.map(function, *iterables, chunksize=chunksize)
+    else:
+        run = map
+    try:
+        if executor:
+            # Sobe os processos antes de medir
+            list(executor.map(abs, range(workers)))
+
+        start = time.perf_counter()
+        chunkCount = 0
+        for buffers in run(generateColumnBuffers, [generator] * len(columns), *zip(*columns)):
+            for chunk in chunksFromBuffers(buffers):
+                world.addChunk(chunk)
+                chunkCount += 1
+        generateSeconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vertexBytes = 0
+        jobs = [(world.columnKeys(*column), neighbourhood(world, column), greedy) for column in columns]
+        for results in run(meshColumnBuffers, *zip(*jobs)):
+            for key, buffers, stats in results:
+                if buffers is not None:
+                    vertexBytes += len(buffers[0]) + len(buffers[1])
+        meshSeconds = time.perf_counter() - start
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return chunkCount, generateSeconds, meshSeconds, vertexBytes
+
+
+def main():
+    args = parseArgs()
+    generator = TerrainGenerator(seed=args.seed, amplitude=args.amplitude)
+    columns = [(cx, cy) for cx in range(args.size) for cy in range(args.size)]
+    print(f"region {args.size}x{args.size} columns, numpy {'on' if generator.useNumpy else 'off'}, "
+          f"greedy {'on' if args.greedy else 'off'}")
+
+    baseline = None
+    for workers in args.workers:
+        chunks, generateSeconds, meshSeconds, vertexBytes = pregenerate(generator, columns, workers, args.greedy)
+        total = generateSeconds + meshSeconds
+        if baseline is None:
+            baseline = total
+        print(f"workers {workers:2d}   chunks {chunks:6d}   generate {chunks / generateSeconds:8.0f} chunks/s   "
+              f"mesh {chunks / meshSeconds:7.0f} chunks/s   total {total:6.2f} s   "
+              f"speedup {baseline / total:5.2f}x   buffers {vertexBytes / 1e6:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
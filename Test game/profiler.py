@@ -0,0 +1,192 @@
+import json
+from collections import deque
+from time import perf_counter
+
+from direct.gui.OnscreenText import OnscreenText
+from panda3d.core import PStatClient, PStatCollector, LineSegs, SceneGraphAnalyzer, TextNode
+
+# Tempo de cada subsistema por frame. Cada seção também alimenta um
+# PStatCollector ("App:Minecraft:<seção>"), então com o pstats aberto aparece
+# junto com o Cull/Draw do próprio Panda. O render e o áudio do ShowBase são
+# medidos por tarefas logo antes e depois do igLoop (sort 50) e do audioLoop
+# (sort 60).
+#
+# Os últimos frames ficam num buffer circular que pode ser exportado no
+# formato de trace do Chrome (chrome://tracing ou ui.perfetto.dev).
+
+SECTIONS = ['input', 'physics', 'entities', 'picking', 'lighting', 'remesh', 'streaming', 'network', 'culling', 'audio', 'hud', 'render']
+
+
+class Section:
+    __slots__ = ('profiler', 'name', 'collector', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.collector = PStatCollector(f'App:Minecraft:{name}')
+        self.start = 0.0
+
+    def __enter__(self):
+        self.collector.start()
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, perf_counter())
+        self.collector.stop()
+
+    begin = __enter__
+
+    def end(self):
+        self.__exit__()
+
+
+class FrameProfiler:
+    def __init__(self, taskMgr, traceFrames=600, pstats=False):
+        self.origin = perf_counter()
+        self.sections = {name: Section(self, name) for name in SECTIONS}
+        self.frames = deque(maxlen=traceFrames)  # (início, fim, {seção: ms}, eventos)
+        self.frameStart = perf_counter()
+        self.times = dict.fromkeys(SECTIONS, 0.0)
+        self.events = []
+        if pstats:
+            PStatClient.connect()
+
+        render = self.sections['render']
+        audio = self.sections['audio']
+        for name, sort, function in (
+            ('profiler-frame-begin', -100, self.beginFrame),
+            ('profiler-render-begin', 49, render.begin),
+            ('profiler-render-end', 51, render.end),
+            ('profiler-audio-begin', 59, audio.begin),
+            ('profiler-audio-end', 61, audio.end),
+            ('profiler-frame-end', 200, self.endFrame),
+        ):
+            taskMgr.add(self.taskFor(function), name, sort=sort)
+
+    def taskFor(self, function):
+        def task(task):
+            function()
+            return task.cont
+        return task
+
+    def section(self, name):
+        return self.sections[name]
+
+    def add(self, name, start, end):
+        self.times[name] += (end - start) * 1000
+        self.events.append((name, start, end))
+
+    def beginFrame(self):
+        self.frameStart = perf_counter()
+        self.times = dict.fromkeys(SECTIONS, 0.0)
+        self.events = []
+
+    def endFrame(self):
+        self.frames.append((self.frameStart, perf_counter(), self.times, self.events))
+
+    def frameTimes(self, count):
+        frames = list(self.frames)[-count:]
+        return [(end - start) * 1000 for start, end, times, events in frames]
+
+    def summary(self, count):
+        # -> {seção: (média, máximo)} em ms nos últimos `count` frames
+        frames = list(self.frames)[-count:]
+        if not frames:
+            return {}
+        result = {}
+        for name in SECTIONS:
+            values = [times[name] for start, end, times, events in frames]
+            result[name] = (sum(values) / len(values), max(values))
+        return result
+
+    def exportTrace(self, path):
+        events = []
+        for start, end, times, frameEvents in self.frames:
+            events.append({
+                'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+            })
+            for name, sectionStart, sectionEnd in frameEvents:
+                events.append({
+                    'name': name, 'ph': 'X', 'pid': 0, 'tid': 1,
+                    'ts': (sectionStart - self.origin) * 1e6, 'dur': (sectionEnd - sectionStart) * 1e6,
+                })
+            events.append({
+                'name': 'frame ms', 'ph': 'C', 'pid': 0,
+                'ts': (start - self.origin) * 1e6, 'args': {'ms': (end - start) * 1000},
+            })
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return len(self.frames)
+
+
+class ProfilerOverlay:
+    # Gráfico do tempo de frame, tempo por seção e contagem de nós/geoms
+    GRAPH_FRAMES = 240
+    GRAPH_MS = 50.0
+
+    def __init__(self, profiler, parent, render, taskMgr):
+        self.profiler = profiler
+        self.render = render
+        self.taskMgr = taskMgr
+        self.root = parent.attachNewNode('profiler-overlay')
+        self.root.hide()
+        self.text = OnscreenText(
+            parent=self.root,
+            pos=(-1.3, 0.8),
+            scale=0.045,
+            fg=(1, 1, 1, 1),
+            shadow=(0, 0, 0, 1),
+            align=TextNode.ALeft,
+            mayChange=True,
+        )
+        self.graph = None
+        self.sceneCounts = ''
+
+    def toggle(self):
+        if self.root.isHidden():
+            self.root.show()
+            self.taskMgr.add(self.refresh, 'profiler-overlay')
+            self.taskMgr.doMethodLater(0.5, self.countScene, 'profiler-overlay-scene')
+        else:
+            self.root.hide()
+            self.taskMgr.remove('profiler-overlay')
+            self.taskMgr.remove('profiler-overlay-scene')
+
+    def countScene(self, task):
+        analyzer = SceneGraphAnalyzer()
+        analyzer.addNode(self.render.node())
+        self.sceneCounts = (f"nodes {analyzer.getNumNodes()}  geoms (draw calls) {analyzer.getNumGeoms()}  "
+                            f"vertices {analyzer.getNumVertices()}")
+        return task.again
+
+    def refresh(self, task):
+        if task.frame % 5:
+            return task.cont
+        lines = [self.sceneCounts, 'section          avg ms   max ms']
+        for name, (average, maximum) in self.profiler.summary(60).items():
+            lines.append(f"{name:<14} {average:8.2f} {maximum:8.2f}")
+        self.text.setText('\n'.join(lines))
+        self.drawGraph(self.profiler.frameTimes(self.GRAPH_FRAMES))
+        return task.cont
+
+    def drawGraph(self, frameTimes):
+        if self.graph is not None:
+            self.graph.removeNode()
+        left, bottom, width, height = -1.3, -0.9, 1.2, 0.4
+        lines = LineSegs('profiler-graph')
+        # Linhas de 60 e 30 FPS
+        for ms, color in ((1000 / 60, (0, 1, 0, 0.6)), (1000 / 30, (1, 1, 0, 0.6))):
+            lines.setColor(*color)
+            z = bottom + height * ms / self.GRAPH_MS
+            lines.moveTo(left, 0, z)
+            lines.drawTo(left + width, 0, z)
+        lines.setColor(1, 1, 1, 1)
+        for index, ms in enumerate(frameTimes):
+            x = left + width * index / self.GRAPH_FRAMES
+            z = bottom + height * min(ms, self.GRAPH_MS) / self.GRAPH_MS
+            if index == 0:
+                lines.moveTo(x, 0, z)
+            else:
+                lines.drawTo(x, 0, z)
+        self.graph = self.root.attachNewNode(lines.create())
@@ -0,0 +1,59 @@
+from math import floor, inf
+
+from world import AIR, BLOCK_SIZE
+
+
+def raycastBlock(world, origin, direction, maxDistance):
+    # Percorre a grade de blocos célula por célula (DDA de Amanatides-Woo)
+    # a partir de origin, em coordenadas do render. Retorna
+    # (bloco, normal da face atingida, distância) ou None. Se origin já está
+    # dentro de um bloco, retorna esse bloco com normal (0, 0, 0) e distância
+    # 0: não há face atingida. O custo depende só do alcance, não do tamanho
+    # do mundo.
+    length = (direction[0] ** 2 + direction[1] ** 2 + direction[2] ** 2) ** 0.5
+    if length == 0:
+        return None
+    dx, dy, dz = direction[0] / length, direction[1] / length, direction[2] / length
+
+    # Espaço de blocos: cada bloco é uma célula de tamanho 1
+    ox = origin[0] / BLOCK_SIZE
+    oy = origin[1] / BLOCK_SIZE
+    oz = (origin[2] + BLOCK_SIZE / 2) / BLOCK_SIZE
+    x, y, z = floor(ox), floor(oy), floor(oz)
+
+    stepX = 1 if dx > 0 else -1
+    stepY = 1 if dy > 0 else -1
+    stepZ = 1 if dz > 0 else -1
+    tDeltaX = abs(1 / dx) if dx else inf
+    tDeltaY = abs(1 / dy) if dy else inf
+    tDeltaZ = abs(1 / dz) if dz else inf
+    tMaxX = ((x + 1 - ox) if dx > 0 else (ox - x)) * tDeltaX if dx else inf
+    tMaxY = ((y + 1 - oy) if dy > 0 else (oy - y)) * tDeltaY if dy else inf
+    tMaxZ = ((z + 1 - oz) if dz > 0 else (oz - z)) * tDeltaZ if dz else inf
+
+    maxT = maxDistance / BLOCK_SIZE
+    getBlock = world.getBlock
+    if getBlock(x, y, z) != AIR:
+        return (x, y, z), (0, 0, 0), 0.0
+
+    while True:
+        if tMaxX < tMaxY and tMaxX < tMaxZ:
+            x += stepX
+            t = tMaxX
+            tMaxX += tDeltaX
+            normal = (-stepX, 0, 0)
+        elif tMaxY < tMaxZ:
+            y += stepY
+            t = tMaxY
+            tMaxY += tDeltaY
+            normal = (0, -stepY, 0)
+        else:
+            z += stepZ
+            t = tMaxZ
+            tMaxZ += tDeltaZ
+            normal = (0, 0, -stepZ)
+
+        if t > maxT:
+            return None
+        if getBlock(x, y, z) != AIR:
+            return (x, y, z), normal, t * BLOCK_SIZE
@@ -0,0 +1,274 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import threading
+from queue import Queue
+
+from world import Chunk
+
+# Mundo salvo em arquivos de região. Cada região guarda 32x32 colunas de
+# chunks: um cabeçalho com a tabela (offset, tamanho) de cada coluna e depois
+# os registros das colunas, com os arrays de blocos comprimidos. Uma coluna é
+# lida direto pelo mmap sem ler o resto do arquivo.
+#
+# Registros novos sempre vão para o fim do arquivo e só então a entrada da
+# tabela muda, então quem lê (threads ou processos de geração) nunca vê um
+# registro pela metade. O espaço dos registros antigos é recuperado por
+# compact() ao fechar.
+
+REGION_SIZE = 32
+MAGIC = b'MCRG'
+VERSION = 1
+HEADER = struct.Struct('<4sI')
+ENTRY = struct.Struct('<II')  # offset, tamanho do registro da coluna
+TABLE_OFFSET = HEADER.size
+DATA_OFFSET = TABLE_OFFSET + REGION_SIZE * REGION_SIZE * ENTRY.size
+COLUMN_HEADER = struct.Struct('<H')  # quantidade de chunks
+CHUNK_HEADER = struct.Struct('<hHI')  # cz, blocos não-ar, tamanho comprimido
+COMPRESSION_LEVEL = 1
+
+
+def encodeColumn(chunks):
+    # chunks: [(cz, bytes dos blocos, quantidade)]
+    parts = [COLUMN_HEADER.pack(len(chunks))]
+    for cz, data, count in chunks:
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        parts.append(CHUNK_HEADER.pack(cz, count, len(compressed)))
+        parts.append(compressed)
+    return b''.join(parts)
+
+
+def decodeColumn(cx, cy, record):
+    chunks = []
+    (chunkCount,) = COLUMN_HEADER.unpack_from(record, 0)
+    offset = COLUMN_HEADER.size
+    for _ in range(chunkCount):
+        cz, count, length = CHUNK_HEADER.unpack_from(record, offset)
+        offset += CHUNK_HEADER.size
+        data = zlib.decompress(record[offset:offset + length])
+        offset += length
+        chunks.append(Chunk.fromBytes((cx, cy, cz), data, count))
+    return chunks
+
+
+class RegionFile:
+    def __init__(self, path, readOnly=False):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            # Cria com outro nome e troca, para ninguém abrir sem cabeçalho
+            temporary = path + '.tmp'
+            with open(temporary, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, VERSION))
+                file.write(bytes(DATA_OFFSET - TABLE_OFFSET))
+            os.replace(temporary, path)
+        self.file = open(path, 'rb' if readOnly else 'r+b')
+        magic, version = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise IOError(f'{path} is not a region file')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def entryOffset(self, lx, ly):
+        return TABLE_OFFSET + (lx + ly * REGION_SIZE) * ENTRY.size
+
+    def readColumn(self, lx, ly):
+        with self.lock:
+            offset, length = ENTRY.unpack_from(self.map, self.entryOffset(lx, ly))
+            if length == 0:
+                return None
+            if offset + length > len(self.map):
+                # O arquivo cresceu depois do mmap
+                self.map.close()
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self.map[offset:offset + length]
+
+    def writeColumn(self, lx, ly, record):
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(record)
+            self.file.flush()
+            self.file.seek(self.entryOffset(lx, ly))
+            self.file.write(ENTRY.pack(offset, len(record)))
+            self.file.flush()
+
+    def usedBytes(self):
+        used = DATA_OFFSET
+        for index in range(REGION_SIZE * REGION_SIZE):
+            used += ENTRY.unpack_from(self.map, TABLE_OFFSET + index * ENTRY.size)[1]
+        return used
+
+    def close(self):
+        with self.lock:
+            self.map.close()
+            self.file.close()
+
+    def compact(self):
+        # Reescreve só os registros em uso quando mais da metade é lixo
+        with self.lock:
+            size = os.path.getsize(self.path)
+            if size == 0:
+                return
+        if self.usedBytes() * 2 >= size:
+            return
+        records = {}
+        for ly in range(REGION_SIZE):
+            for lx in range(REGION_SIZE):
+                record = self.readColumn(lx, ly)
+                if record is not None:
+                    records[(lx, ly)] = record
+        self.close()
+
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as file:
+            table = bytearray(DATA_OFFSET - TABLE_OFFSET)
+            offset = DATA_OFFSET
+            for (lx, ly), record in records.items():
+                ENTRY.pack_into(table, (lx + ly * REGION_SIZE) * ENTRY.size, offset, len(record))
+                offset += len(record)
+            file.write(HEADER.pack(MAGIC, VERSION))
+            file.write(table)
+            for record in records.values():
+                file.write(record)
+        os.replace(temporary, self.path)
+
+
+class WorldSave:
+    def __init__(self, directory, background=True, readOnly=False):
+        self.directory = directory
+        self.readOnly = readOnly
+        if not readOnly:
+            os.makedirs(directory, exist_ok=True)
+        self.regions = {}
+        self.regionsLock = threading.Lock()
+        self.dirtyColumns = set()
+        # Colunas na fila do writer: coluna -> cópia dos blocos
+        self.pending = {}
+        self.pendingLock = threading.Lock()
+
+        # Escrita em uma thread só, na ordem em que as colunas foram salvas
+        self.queue = Queue() if background else None
+        if background:
+            self.writer = threading.Thread(target=self.writeLoop, name='world-save', daemon=True)
+            self.writer.start()
+
+    def region(self, cx, cy, create=False):
+        key = (cx // REGION_SIZE, cy // REGION_SIZE)
+        with self.regionsLock:
+            region = self.regions.get(key)
+            if region is None:
+                path = os.path.join(self.directory, f'r.{key[0]}.{key[1]}.region')
+                if not create and not os.path.exists(path):
+                    return None
+                region = self.regions[key] = RegionFile(path, self.readOnly)
+            return region
+
+    def isPending(self, cx, cy):
+        with self.pendingLock:
+            return (cx, cy) in self.pending
+
+    def loadColumn(self, cx, cy):
+        # -> lista de Chunks (vazia se a coluna foi salva sem blocos), ou None
+        # se a coluna nunca foi salva
+        with self.pendingLock:
+            snapshot = self.pending.get((cx, cy))
+        if snapshot is not None:
+            return [Chunk.fromBytes((cx, cy, cz), data, count) for cz, data, count in snapshot]
+        region = self.region(cx, cy)
+        record = region and region.readColumn(cx % REGION_SIZE, cy % REGION_SIZE)
+        if record is None:
+            return None
+        return decodeColumn(cx, cy, record)
+
+    def loadColumnBuffers(self, cx, cy):
+        chunks = self.loadColumn(cx, cy)
+        if chunks is None:
+            return None
+        return [(chunk.key, chunk.toBytes(), chunk.count) for chunk in chunks]
+
+    def markDirty(self, cx, cy):
+        self.dirtyColumns.add((cx, cy))
+
+    def snapshotColumn(self, world, cx, cy):
+        # Cópia dos blocos feita na thread principal; o resto fica com o writer
+        return [(key[2], world.chunks[key].toBytes(), world.chunks[key].count) for key in world.columnKeys(cx, cy)]
+
+    def saveColumn(self, world, cx, cy):
+        self.dirtyColumns.discard((cx, cy))
+        snapshot = self.snapshotColumn(world, cx, cy)
+        if self.queue is not None:
+            with self.pendingLock:
+                self.pending[(cx, cy)] = snapshot
+            self.queue.put((cx, cy, snapshot))
+        else:
+            self.writeColumn(cx, cy, snapshot)
+
+    def saveColumnIfDirty(self, world, cx, cy):
+        if (cx, cy) in self.dirtyColumns:
+            self.saveColumn(world, cx, cy)
+
+    def saveDirty(self, world):
+        # Salva todas as colunas editadas. Uma coluna que ficou sem nenhum
+        # chunk sai de world.columns mas continua carregada: vai como registro
+        # vazio, que o load lê como salva e vazia em vez de gerar de novo. As
+        # descarregadas já foram salvas ao sair (saveColumnIfDirty).
+        for cx, cy in list(self.dirtyColumns):
+            self.saveColumn(world, cx, cy)
+        return len(self.dirtyColumns)
+
+    def writeColumn(self, cx, cy, snapshot):
+        self.region(cx, cy, create=True).writeColumn(cx % REGION_SIZE, cy % REGION_SIZE, encodeColumn(snapshot))
+
+    def writeLoop(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self.writeColumn(*job)
+                cx, cy, snapshot = job
+                with self.pendingLock:
+                    if self.pending.get((cx, cy)) is snapshot:
+                        del self.pending[(cx, cy)]
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        if self.queue is not None:
+            self.queue.join()
+
+    def readMeta(self):
+        path = os.path.join(self.directory, 'world.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+    def writeMeta(self, meta):
+        with open(os.path.join(self.directory, 'world.json'), 'w') as file:
+            json.dump(meta, file)
+
+    def close(self):
+        if self.queue is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.queue = None
+        with self.regionsLock:
+            for region in self.regions.values():
+                region.compact()
+                if not region.file.closed:
+                    region.close()
+            self.regions = {}
+
+
+# Cache por processo para os trabalhos de chunkjobs
+_openSaves = {}
+
+
+def openWorldSave(directory):
+    save = _openSaves.get(directory)
+    if save is None:
+        save = _openSaves[directory] = WorldSave(directory, background=False, readOnly=True)
+    return save
@@ -0,0 +1,81 @@
+from collections import deque
+from time import perf_counter
+
+from world import CHUNK_SIZE, chunkKey
+
+# Fila de chunks com malha desatualizada. Cada edição marca só o chunk do
+# bloco (e o vizinho quando o bloco está na borda); os chunks são refeitos no
+# máximo uma vez por frame e dentro de um limite de tempo por frame.
+#
+# Com corners, também marca os vizinhos pelas arestas e cantos do chunk: a
+# oclusão ambiente de uma face olha blocos na diagonal.
+
+
+class DirtyChunks:
+    def __init__(self, budgetMs=4.0, latencySamples=120, corners=False):
+        self.budget = budgetMs / 1000.0
+        self.corners = corners
+        # chunk -> momento da primeira edição ainda não visível
+        self.pending = {}
+        self.latencies = deque(maxlen=latencySamples)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def markChunk(self, key, when=None):
+        if key not in self.pending:
+            self.pending[key] = perf_counter() if when is None else when
+
+    def markBlock(self, x, y, z):
+        now = perf_counter()
+        cx, cy, cz = chunkKey(x, y, z)
+        self.markChunk((cx, cy, cz), now)
+
+        last = CHUNK_SIZE - 1
+        lx, ly, lz = x & last, y & last, z & last
+        if self.corners:
+            ranges = [(0, -1) if local == 0 else (0, 1) if local == last else (0,) for local in (lx, ly, lz)]
+            for dx in ranges[0]:
+                for dy in ranges[1]:
+                    for dz in ranges[2]:
+                        self.markChunk((cx + dx, cy + dy, cz + dz), now)
+            return
+        if lx == 0:
+            self.markChunk((cx - 1, cy, cz), now)
+        elif lx == last:
+            self.markChunk((cx + 1, cy, cz), now)
+        if ly == 0:
+            self.markChunk((cx, cy - 1, cz), now)
+        elif ly == last:
+            self.markChunk((cx, cy + 1, cz), now)
+        if lz == 0:
+            self.markChunk((cx, cy, cz - 1), now)
+        elif lz == last:
+            self.markChunk((cx, cy, cz + 1), now)
+
+    def process(self, rebuild):
+        # Refaz chunks na ordem das edições até estourar o orçamento do frame.
+        # Pelo menos um chunk por frame, para a fila nunca parar.
+        start = perf_counter()
+        batch = self.pending
+        self.pending = {}
+        rebuilt = 0
+        for key, editTime in batch.items():
+            if rebuilt and perf_counter() - start >= self.budget:
+                self.pending[key] = editTime
+                continue
+            rebuild(key)
+            rebuilt += 1
+            self.latencies.append(perf_counter() - editTime)
+        return rebuilt
+
+    def lastLatencyMs(self):
+        return self.latencies[-1] * 1000.0 if self.latencies else 0.0
+
+    def averageLatencyMs(self):
+        if not self.latencies:
+            return 0.0
+        return sum(self.latencies) * 1000.0 / len(self.latencies)
+
+    def maxLatencyMs(self):
+        return max(self.latencies) * 1000.0 if self.latencies else 0.0
@@ -0,0 +1,452 @@
+import json
+import struct
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from math import floor
+from time import perf_counter
+
+from world import World, AIR, BLOCK_SIZE, CHUNK_SIZE, blockToWorld, worldToBlock
+from blocks import BLOCK_TYPES
+from terrain import TerrainGenerator
+from raycast import raycastBlock
+from physics import SPAWN_POS, REMOVE_REACH, PLACE_REACH, eyePosition, lookDirection, placementBlocked
+from chunkjobs import loadColumnBuffers, chunksFromBuffers
+from regions import WorldSave
+from netprotocol import (
+    HELLO, MOVE, EDIT, STATS, WELCOME, COLUMN, UNLOAD, BLOCKS, PLAYERS, STATS_REPLY, EDIT_REMOVE, EDIT_PLACE,
+    PROTOCOL_VERSION, DEFAULT_PORT, FRAME_HEADER, MOVE_BODY, EDIT_BODY, COLUMN_KEY,
+    frame, readFrame, unpackHello, packWelcome, packColumn, packBlocks, packPlayers,
+)
+
+# Servidor autoritativo, sem janela e sem Panda3D. O mundo é dele: os
+# clientes recebem as colunas dentro do raio de interesse (raio + 1, a borda
+# que a malha precisa) e pedem edições, que o servidor valida com as mesmas
+# regras do jogo (alcance, raio da câmera, corpo do jogador) antes de aplicar
+# e repassar como deltas. Pedido recusado volta para quem pediu com o bloco
+# verdadeiro, desfazendo a previsão do cliente.
+#
+# Tudo roda em ticks fixos numa thread só (asyncio); a geração das colunas
+# vai para processos. A posição do jogador vem do cliente (a física roda lá),
+# mas a posição de cada edição precisa estar perto da última recebida.
+#
+#   python server.py [--port 25570] [--seed 1234] [--amplitude 0] [--radius 4] [--save DIR]
+
+COLUMN_SIZE = CHUNK_SIZE * BLOCK_SIZE
+
+MAX_EDIT_DRIFT = 4.0  # distância máxima entre a posição da edição e a do último MOVE
+MAX_BACKLOG = 256 * 1024  # bytes esperando no socket: para de mandar colunas
+UNLOAD_INTERVAL = 1.0  # segundos entre as limpezas de colunas sem jogador
+TICK_SAMPLES = 1200
+
+
+def columnAt(x, y):
+    return (floor(x / COLUMN_SIZE), floor(y / COLUMN_SIZE))
+
+
+def columnsAround(center, radius):
+    cx, cy = center
+    columns = [(x, y) for x in range(cx - radius, cx + radius + 1) for y in range(cy - radius, cy + radius + 1)]
+    columns.sort(key=lambda column: (column[0] - cx) ** 2 + (column[1] - cy) ** 2)
+    return columns
+
+
+def columnDistance(a, b):
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+class ClientSession:
+    def __init__(self, playerId, name, writer):
+        self.id = playerId
+        self.name = name
+        self.writer = writer
+        self.pos = None  # até o primeiro MOVE o jogador não recebe colunas
+        self.heading = 0.0
+        self.inbox = deque()
+        self.sentColumns = set()
+        self.center = None
+        self.wanted = []  # colunas do raio de interesse, das mais perto para as mais longe
+        self.streamed = False  # todas as de wanted já foram
+        self.sawPlayers = False  # o último PLAYERS tinha alguém
+        self.bytesOut = 0
+        self.bytesIn = 0
+
+    def send(self, data):
+        self.writer.write(data)
+        self.bytesOut += len(data)
+
+    def backlog(self):
+        return self.writer.transport.get_write_buffer_size()
+
+
+class GameServer:
+    def __init__(self, generator, radius=4, tickRate=20, save=None, processes=2, columnsPerTick=4):
+        self.generator = generator
+        self.radius = radius
+        self.tickRate = tickRate
+        self.save = save
+        self.columnsPerTick = columnsPerTick
+        self.world = World()
+        self.loadedColumns = set()
+        self.loading = {}  # coluna -> future
+        self.payloads = {}  # coluna -> quadro COLUMN pronto, até a próxima edição
+        self.sessions = {}
+        self.nextId = 1
+        self.deltas = []  # (x, y, z, tipo) aplicados neste tick
+
+        if processes > 0:
+            self.executor = ProcessPoolExecutor(max_workers=processes)
+            self.maxJobs = processes * 2
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='column-loader')
+            self.maxJobs = 4
+
+        bx, by, _ = worldToBlock(SPAWN_POS[0], SPAWN_POS[1], 0)
+        ground = blockToWorld(bx, by, generator.heightAt(bx, by))[2] + 1
+        self.spawn = (SPAWN_POS[0], SPAWN_POS[1], ground + 9)  # como Minecraft.findSpawn
+        self.lastUnload = perf_counter()
+        self.resetStats()
+
+    def resetStats(self):
+        self.tickTimes = deque(maxlen=TICK_SAMPLES)
+        self.overruns = 0
+        self.counters = dict.fromkeys(('edits', 'rejected', 'columnsSent', 'bytesOut', 'bytesIn'), 0)
+        for session in self.sessions.values():
+            session.bytesOut = session.bytesIn = 0
+        self.statsStart = perf_counter()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handleClient, host, port)
+        async with server:
+            await self.run()
+
+    async def run(self):
+        interval = 1.0 / self.tickRate
+        nextTick = perf_counter()
+        while True:
+            self.tick()
+            nextTick += interval
+            delay = nextTick - perf_counter()
+            if delay < 0:
+                # Atrasado: não tenta recuperar os ticks perdidos
+                self.overruns += 1
+                nextTick = perf_counter()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def handleClient(self, reader, writer):
+        session = None
+        try:
+            kind, body = await readFrame(reader)
+            if kind != HELLO:
+                return
+            version, name = unpackHello(body)
+            if version != PROTOCOL_VERSION:
+                return
+            while self.nextId in self.sessions:
+                self.nextId = self.nextId % 0xFFFF + 1
+            session = ClientSession(self.nextId, name, writer)
+            self.nextId = self.nextId % 0xFFFF + 1
+            self.sessions[session.id] = session
+            session.send(frame(WELCOME, packWelcome(
+                session.id, self.generator.seed, self.generator.amplitude, self.spawn, self.tickRate, self.radius)))
+            while True:
+                kind, body = await readFrame(reader)
+                session.bytesIn += FRAME_HEADER.size + len(body)
+                session.inbox.append((kind, body))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, struct.error):
+            pass
+        finally:
+            if session is not None:
+                self.dropSession(session)
+            writer.close()
+
+    def dropSession(self, session):
+        if self.sessions.pop(session.id, None) is not None:
+            self.counters['bytesOut'] += session.bytesOut
+            self.counters['bytesIn'] += session.bytesIn
+
+    def tick(self):
+        start = perf_counter()
+        self.collectColumns()
+        for session in list(self.sessions.values()):
+            while session.inbox:
+                try:
+                    self.handleMessage(session, *session.inbox.popleft())
+                except struct.error:
+                    # Mensagem malformada: derruba o cliente
+                    self.dropSession(session)
+                    session.writer.close()
+                    break
+        self.broadcastDeltas()
+        for session in self.sessions.values():
+            self.streamColumns(session)
+        self.broadcastPlayers()
+        if start - self.lastUnload >= UNLOAD_INTERVAL:
+            self.lastUnload = start
+            self.unloadUnused()
+        self.tickTimes.append((perf_counter() - start) * 1000)
+
+    def handleMessage(self, session, kind, body):
+        if kind == MOVE:
+            x, y, z, heading, pitch = MOVE_BODY.unpack(body)
+            session.pos = (x, y, z)
+            session.heading = heading
+        elif kind == EDIT:
+            self.applyEdit(session, body)
+        elif kind == STATS:
+            session.send(frame(STATS_REPLY, json.dumps(self.stats()).encode('utf-8')))
+            if body == b'reset':
+                self.resetStats()
+
+    # Edições
+
+    def applyEdit(self, session, body):
+        kind, x, y, z, heading, pitch, bx, by, bz, blockId = EDIT_BODY.unpack(body)
+        block = (bx, by, bz)
+        newId = AIR if kind == EDIT_REMOVE else blockId
+        if self.editAllowed(session, kind, (x, y, z), heading, pitch, block, newId):
+            self.world.setBlock(bx, by, bz, newId)
+            self.deltas.append((bx, by, bz, newId))
+            column = (bx >> 4, by >> 4)
+            self.payloads.pop(column, None)
+            if self.save is not None:
+                self.save.markDirty(*column)
+            self.counters['edits'] += 1
+        else:
+            # Desfaz a previsão de quem pediu
+            self.counters['rejected'] += 1
+            session.send(frame(BLOCKS, packBlocks([(bx, by, bz, self.world.getBlock(bx, by, bz))])))
+
+    def editAllowed(self, session, kind, pos, heading, pitch, block, newId):
+        if session.pos is None or (block[0] >> 4, block[1] >> 4) not in self.loadedColumns:
+            return False
+        drift = sum((a - b) ** 2 for a, b in zip(pos, session.pos)) ** 0.5
+        if drift > MAX_EDIT_DRIFT:
+            return False
+
+        # O mesmo raio da câmera do cliente, contra o mundo do servidor
+        reach = REMOVE_REACH if kind == EDIT_REMOVE else PLACE_REACH
+        eye = eyePosition(pos, heading)
+        hit = raycastBlock(self.world, eye, lookDirection(heading, pitch), reach)
+        if hit is None:
+            return False
+        target, normal, distance = hit
+        center = blockToWorld(*target)
+        if sum((a - b) ** 2 for a, b in zip(center, eye)) ** 0.5 >= reach:
+            return False
+
+        if kind == EDIT_REMOVE:
+            return target == block
+        if kind != EDIT_PLACE or newId == AIR or newId not in BLOCK_TYPES or normal == (0, 0, 0):
+            return False
+        placed = (target[0] + normal[0], target[1] + normal[1], target[2] + normal[2])
+        return (placed == block and self.world.getBlock(*block) == AIR
+                and not placementBlocked(pos, blockToWorld(*block)))
+
+    def broadcastDeltas(self):
+        if not self.deltas:
+            return
+        byColumn = {}
+        for delta in self.deltas:
+            byColumn.setdefault((delta[0] >> 4, delta[1] >> 4), []).append(delta)
+        self.deltas = []
+        for session in self.sessions.values():
+            deltas = [delta for column, deltas in byColumn.items() if column in session.sentColumns for delta in deltas]
+            if deltas:
+                session.send(frame(BLOCKS, packBlocks(deltas)))
+
+    # Colunas
+
+    def requestColumn(self, column):
+        if column in self.loading or len(self.loading) >= self.maxJobs:
+            return
+        if self.save is not None and self.save.isPending(*column):
+            # Ainda na fila de escrita: a cópia em memória é a versão certa
+            self.addColumn(column, self.save.loadColumn(*column))
+            return
+        directory = self.save.directory if self.save is not None else None
+        self.loading[column] = self.executor.submit(loadColumnBuffers, directory, self.generator, *column)
+
+    def collectColumns(self):
+        for column, future in list(self.loading.items()):
+            if future.done():
+                del self.loading[column]
+                self.addColumn(column, chunksFromBuffers(future.result()))
+
+    def addColumn(self, column, chunks):
+        for chunk in chunks:
+            self.world.addChunk(chunk)
+        self.loadedColumns.add(column)
+
+    def columnPayload(self, column):
+        payload = self.payloads.get(column)
+        if payload is None:
+            chunks = [self.world.chunks[key] for key in self.world.columnKeys(*column)]
+            payload = self.payloads[column] = frame(
+                COLUMN, packColumn(*column, [(chunk.key[2], chunk.toBytes(), chunk.count) for chunk in chunks]))
+        return payload
+
+    def streamColumns(self, session):
+        if session.pos is None:
+            return
+        # O interesse só muda quando o jogador troca de coluna
+        center = columnAt(session.pos[0], session.pos[1])
+        if center != session.center:
+            session.center = center
+            session.wanted = columnsAround(center, self.radius + 1)
+            session.streamed = False
+            for column in [column for column in session.sentColumns if columnDistance(column, center) > self.radius + 2]:
+                session.sentColumns.discard(column)
+                session.send(frame(UNLOAD, COLUMN_KEY.pack(*column)))
+        elif session.streamed:
+            return
+
+        budget = self.columnsPerTick
+        missing = False
+        for column in session.wanted:
+            if column in session.sentColumns:
+                continue
+            if column not in self.loadedColumns:
+                self.requestColumn(column)
+                missing = True
+                continue
+            if budget == 0 or session.backlog() > MAX_BACKLOG:
+                return
+            session.send(self.columnPayload(column))
+            session.sentColumns.add(column)
+            self.counters['columnsSent'] += 1
+            budget -= 1
+        session.streamed = not missing
+
+    def unloadUnused(self):
+        needed = set()
+        for session in self.sessions.values():
+            if session.pos is not None:
+                needed.update(columnsAround(columnAt(session.pos[0], session.pos[1]), self.radius + 2))
+            needed.update(session.sentColumns)
+        for column in self.loadedColumns - needed:
+            if self.save is not None:
+                self.save.saveColumnIfDirty(self.world, *column)
+            self.world.removeColumn(*column)
+            self.loadedColumns.discard(column)
+            self.payloads.pop(column, None)
+
+    # Jogadores
+
+    def broadcastPlayers(self):
+        # session.center já foi atualizado pelo streamColumns deste tick
+        players = [
+            ((session.id, *session.pos, session.heading), session.center)
+            for session in self.sessions.values() if session.pos is not None
+        ]
+        radius = self.radius
+        for session in self.sessions.values():
+            if session.pos is None:
+                continue
+            cx, cy = session.center
+            visible = [
+                state for state, (px, py) in players
+                if state[0] != session.id and abs(px - cx) <= radius and abs(py - cy) <= radius
+            ]
+            # Lista vazia só uma vez, para o cliente tirar quem saiu
+            if visible or session.sawPlayers:
+                session.send(frame(PLAYERS, packPlayers(visible)))
+            session.sawPlayers = bool(visible)
+
+    def stats(self):
+        elapsed = max(perf_counter() - self.statsStart, 1e-9)
+        sessions = self.sessions.values()
+        bytesOut = self.counters['bytesOut'] + sum(session.bytesOut for session in sessions)
+        bytesIn = self.counters['bytesIn'] + sum(session.bytesIn for session in sessions)
+        ticks = list(self.tickTimes)
+        return {
+            'players': sum(1 for session in sessions if session.pos is not None),
+            'ticks': len(ticks),
+            'tickMs': {
+                'mean': sum(ticks) / len(ticks) if ticks else 0.0,
+                'p50': percentile(ticks, 0.5),
+                'p99': percentile(ticks, 0.99),
+                'max': max(ticks, default=0.0),
+            },
+            'tickBudgetMs': 1000.0 / self.tickRate,
+            'overruns': self.overruns,
+            'seconds': elapsed,
+            'bytesOutPerSecond': bytesOut / elapsed,
+            'bytesInPerSecond': bytesIn / elapsed,
+            'loadedColumns': len(self.loadedColumns),
+            'edits': self.counters['edits'],
+            'rejected': self.counters['rejected'],
+            'columnsSent': self.counters['columnsSent'],
+        }
+
+    def shutdown(self):
+        # Cancela as colunas na fila e espera as que estão rodando: sair com
+        # workers no meio deixa o atexit do ProcessPoolExecutor escrevendo
+        # num pipe já fechado
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for column in list(self.loadedColumns):
+            if self.save is not None:
+                self.save.saveColumnIfDirty(self.world, *column)
+        if self.save is not None:
+            self.save.close()
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--amplitude', type=int, default=0)
+    parser.add_argument('--radius', type=int, default=4, help='raio de interesse, em colunas de chunks')
+    parser.add_argument('--tick-rate', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=2, help='processos de geração (0 = threads)')
+    parser.add_argument('--save', default='', help='pasta do mundo salvo')
+    parser.add_argument('--status-interval', type=float, default=5.0, help='segundos entre as linhas de status (0 = sem)')
+    return parser.parse_args()
+
+
+async def printStatus(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        stats = server.stats()
+        server.resetStats()
+        print(f"players {stats['players']:3d}   tick p50 {stats['tickMs']['p50']:6.2f} ms   "
+              f"p99 {stats['tickMs']['p99']:6.2f} ms   out {stats['bytesOutPerSecond'] / 1024:8.1f} KB/s   "
+              f"in {stats['bytesInPerSecond'] / 1024:6.1f} KB/s   columns {stats['loadedColumns']}", flush=True)
+
+
+async def main():
+    args = parseArgs()
+    seed, amplitude = args.seed, args.amplitude
+    save = None
+    if args.save:
+        # Mundo salvo usa sempre a semente com que foi criado
+        save = WorldSave(args.save)
+        meta = save.readMeta()
+        if meta is None:
+            save.writeMeta({'seed': seed, 'amplitude': amplitude})
+        else:
+            seed, amplitude = meta['seed'], meta['amplitude']
+    server = GameServer(TerrainGenerator(seed=seed, amplitude=amplitude), radius=args.radius,
+                        tickRate=args.tick_rate, save=save, processes=args.processes)
+    print(f"Serving on {args.host}:{args.port} (seed {seed}, amplitude {amplitude}, radius {args.radius})", flush=True)
+    if args.status_interval > 0:
+        asyncio.get_running_loop().create_task(printStatus(server, args.status_interval))
+    try:
+        await server.serve(args.host, args.port)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+# Tempo de cada fase da inicialização, do ShowBase até o primeiro frame e o
+# que fica para depois dele (skybox, menu). Mostra se o cache de .bam estava
+# frio ou quente.
+
+
+class StartupTimer:
+    def __init__(self):
+        self.start = perf_counter()
+        self.phases = []  # (nome, segundos, depois do primeiro frame)
+        self.firstFrame = None
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        yield
+        self.phases.append((name, perf_counter() - start, self.firstFrame is not None))
+
+    def record(self, name, seconds):
+        # Fase que terminou fora de um bloco phase (carregamento assíncrono)
+        self.phases.append((name, seconds, self.firstFrame is not None))
+
+    def markFirstFrame(self):
+        self.firstFrame = perf_counter() - self.start
+
+    def report(self, cache):
+        if self.reported:
+            return
+        self.reported = True
+        total = perf_counter() - self.start
+        print(f"Startup ({cache} cache): first frame {self.firstFrame * 1000:.0f} ms, everything {total * 1000:.0f} ms")
+        for name, seconds, deferred in self.phases:
+            where = 'after first frame' if deferred else ''
+            print(f"  {name:<24} {seconds * 1000:8.1f} ms  {where}")
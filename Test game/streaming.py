@@ -0,0 +1,353 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from math import floor
+from time import perf_counter
+
+from world import BLOCK_SIZE, CHUNK_SIZE
+from meshing import buildChunkMesh, chunkOrigin
+from chunkgeom import makeChunkGeomNode, makeGeomNode
+from chunkjobs import loadColumnBuffers, chunksFromBuffers, meshColumnBuffers
+
+# Carrega e descarrega colunas de chunks em volta do jogador. Geração e
+# malhas rodam em threads, ou em processos (processes > 0) para usar todos os
+# núcleos; a thread principal só guarda os chunks prontos no mundo e monta os
+# GeomNodes a partir dos arrays de vértices prontos. Nada do Panda3D roda
+# fora da thread principal (criar Geoms enquanto o render roda derrubava o
+# jogo de vez em quando). Com processos, blocos e vértices vão e voltam como
+# bytes.
+#
+# Raios (distância em colunas, em quadrado): malha até `radius`, dados até
+# radius + 1 (os vizinhos precisam existir para a malha esconder as faces
+# da borda), e descarrega além de radius + 2 para não ficar indo e voltando.
+#
+# Com um WorldSave, colunas já salvas são lidas do disco em vez de geradas, e
+# colunas editadas são salvas quando descarregam.
+#
+# LOD: a partir de lodDistance colunas a malha usa células de 2x2x2 blocos, e
+# a partir do dobro, de 4x4x4. Quando o nível de uma coluna muda, a malha nova
+# é feita nos workers e só troca a antiga quando fica pronta (sem buraco), e
+# há uma coluna de histerese para a borda entre níveis não ficar trocando.
+#
+# Com um LightMap, a coluna e as vizinhas são iluminadas (na thread principal)
+# antes da malha ser feita, e a luz vai junto para os workers. ao liga a
+# oclusão ambiente nos vértices (não nos níveis de LOD).
+#
+# Sem generator (multiplayer), as colunas vêm do servidor: applyColumn e
+# unloadColumn são chamados pelo cliente de rede, e o streamer só faz as malhas.
+
+COLUMN_SIZE = CHUNK_SIZE * BLOCK_SIZE
+
+
+def meshChunk(world, key, chunkState, greedy, lod=0, light=None, ao=False):
+    mesh = buildChunkMesh(world, key, greedy, lod, light, ao)
+    geomNode = None if mesh.isEmpty() else makeChunkGeomNode(mesh, chunkState)
+    return key, geomNode, (mesh.faceCount, mesh.vertexCount, mesh.triangleCount)
+
+
+def meshColumn(world, keys, chunkState, greedy, lod=0, light=None, ao=False):
+    return [meshChunk(world, key, chunkState, greedy, lod, light, ao) for key in keys]
+
+
+def buildColumnMeshes(world, keys, greedy, lod=0, light=None, ao=False):
+    # Só Python puro: pode rodar numa thread de trabalho
+    return [(key, buildChunkMesh(world, key, greedy, lod, light, ao)) for key in keys]
+
+
+def loadColumn(save, generator, cx, cy):
+    chunks = save.loadColumn(cx, cy) if save is not None else None
+    return generator.generateColumn(cx, cy) if chunks is None else chunks
+
+
+class ChunkStreamer:
+    def __init__(self, world, parent, chunkState, generator, radius=4, workers=2, greedy=False, budgetMs=4.0, processes=0, save=None, lodDistance=0, light=None, ambientOcclusion=False):
+        self.world = world
+        self.light = light
+        self.ambientOcclusion = ambientOcclusion
+        self.generator = generator
+        self.save = save
+        self.parent = parent
+        self.chunkNodes = {}
+        self.meshStats = {}  # chunk -> (faces visíveis, vértices, triângulos)
+        self.chunkState = chunkState
+        self.radius = radius
+        self.greedy = greedy
+        self.budget = budgetMs / 1000.0
+
+        self.useProcesses = processes > 0
+        if self.useProcesses:
+            self.executor = ProcessPoolExecutor(max_workers=processes)
+            self.maxJobs = processes * 2
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chunk-worker')
+            self.maxJobs = workers * 2
+        self.loadedColumns = set()
+        self.meshedColumns = {}  # coluna -> nível de LOD da malha
+        self.generating = {}  # coluna -> future
+        self.meshing = {}
+        self.meshingLevels = {}  # coluna -> nível de LOD da malha em andamento
+        self.setLodDistance(lodDistance)
+        self.staleColumns = set()  # editadas enquanto a malha era feita
+        self.version = 0  # muda quando colunas carregam ou descarregam
+        self.center = None
+
+    def columnAt(self, x, y):
+        return (floor(x / COLUMN_SIZE), floor(y / COLUMN_SIZE))
+
+    def isLoaded(self, x, y):
+        return self.columnAt(x, y) in self.meshedColumns
+
+    def distance(self, column):
+        return max(abs(column[0] - self.center[0]), abs(column[1] - self.center[1]))
+
+    def setLodDistance(self, distance):
+        # 0 desliga o LOD; as colunas mudam de nível no próximo schedule
+        self.lodDistances = (distance, distance * 2) if distance > 0 else ()
+
+    def levelAt(self, distance):
+        return sum(1 for threshold in self.lodDistances if distance >= threshold)
+
+    def lodLevel(self, column):
+        distance = self.distance(column)
+        level = self.levelAt(distance)
+        current = self.meshedColumns.get(column)
+        if current is not None and self.levelAt(distance - 1) <= current <= level:
+            return current
+        return level
+
+    def columnsAround(self, radius):
+        cx, cy = self.center
+        columns = [
+            (x, y)
+            for x in range(cx - radius, cx + radius + 1)
+            for y in range(cy - radius, cy + radius + 1)
+        ]
+        columns.sort(key=lambda column: (column[0] - cx) ** 2 + (column[1] - cy) ** 2)
+        return columns
+
+    def neighboursLoaded(self, column):
+        cx, cy = column
+        for x in range(cx - 1, cx + 2):
+            for y in range(cy - 1, cy + 2):
+                if (x, y) not in self.loadedColumns:
+                    return False
+        return True
+
+    def noteEdit(self, x, y, z):
+        # Resultado em andamento dessa coluna ficou velho: descarta quando chegar
+        column = (x >> 4, y >> 4)
+        if column in self.meshing:
+            self.staleColumns.add(column)
+
+    def noteRelit(self, keys):
+        # Luz mudou nesses chunks por uma edição: como noteEdit, para cada coluna
+        for column in {key[:2] for key in keys}:
+            if column in self.meshing:
+                self.staleColumns.add(column)
+
+    def lightAround(self, column):
+        # A malha lê a luz da coluna e da borda das vizinhas
+        if self.light is None:
+            return
+        cx, cy = column
+        for x in range(cx - 1, cx + 2):
+            for y in range(cy - 1, cy + 2):
+                if (x, y) not in self.light.columns:
+                    self.relit(self.light.lightColumn(x, y))
+
+    def relit(self, keys):
+        # A luz de uma coluna nova passou para colunas que já têm malha:
+        # refaz nos workers, como uma troca de LOD
+        for column in {key[:2] for key in keys}:
+            if column in self.meshing:
+                self.staleColumns.add(column)
+            if column in self.meshedColumns:
+                self.meshedColumns[column] = None
+
+    def update(self, x, y):
+        self.center = self.columnAt(x, y)
+        start = perf_counter()
+        self.collectResults(start)
+        self.unloadFar()
+        self.schedule()
+
+    def loadSynchronously(self, x, y, radius=1):
+        # Usado antes do primeiro frame para o jogador ter chão embaixo
+        self.loadDataSynchronously(x, y, radius)
+        self.meshSynchronously(x, y, radius)
+
+    def loadDataSynchronously(self, x, y, radius=1):
+        # Não precisa das texturas: pode rodar enquanto os modelos carregam
+        self.center = self.columnAt(x, y)
+        for column in self.columnsAround(radius + 1):
+            if column not in self.loadedColumns:
+                self.applyColumn(column, loadColumn(self.save, self.generator, *column))
+
+    def meshSynchronously(self, x, y, radius=1):
+        self.center = self.columnAt(x, y)
+        for column in self.columnsAround(radius):
+            if column not in self.meshedColumns:
+                keys = self.world.columnKeys(*column)
+                level = self.meshingLevels[column] = self.lodLevel(column)
+                self.lightAround(column)
+                self.applyMeshes(column, meshColumn(
+                    self.world, keys, self.chunkState, self.greedy, level, self.light, self.ambientOcclusion))
+
+    def collectResults(self, start):
+        for jobs, apply in ((self.generating, self.applyColumn), (self.meshing, self.applyMeshes)):
+            for column, future in list(jobs.items()):
+                if perf_counter() - start >= self.budget:
+                    return
+                if not future.done():
+                    continue
+                del jobs[column]
+                result = future.result()
+                if self.useProcesses:
+                    result = self.fromBuffers(jobs, result)
+                elif jobs is self.meshing:
+                    result = self.fromMeshes(result)
+                apply(column, result)
+
+    def fromMeshes(self, meshes):
+        return [
+            (key, None if mesh.isEmpty() else makeChunkGeomNode(mesh, self.chunkState),
+             (mesh.faceCount, mesh.vertexCount, mesh.triangleCount))
+            for key, mesh in meshes
+        ]
+
+    def fromBuffers(self, jobs, result):
+        if jobs is self.generating:
+            return chunksFromBuffers(result)
+        return [
+            (key, makeGeomNode(key, *buffers, self.chunkState) if buffers else None, stats)
+            for key, buffers, stats in result
+        ]
+
+    def neighbourhoodBuffers(self, column):
+        cx, cy = column
+        buffers = []
+        for x in range(cx - 1, cx + 2):
+            for y in range(cy - 1, cy + 2):
+                for key in self.world.columnKeys(x, y):
+                    chunk = self.world.chunks[key]
+                    buffers.append((key, chunk.toBytes(), chunk.count))
+        return buffers
+
+    def neighbourhoodLight(self, column):
+        if self.light is None:
+            return None
+        cx, cy = column
+        return [self.light.columnBuffers(x, y) for x in range(cx - 1, cx + 2) for y in range(cy - 1, cy + 2)]
+
+    def applyColumn(self, column, chunks):
+        if self.generator is not None and self.distance(column) > self.radius + 2:
+            return
+        for chunk in chunks:
+            self.world.addChunk(chunk)
+        self.loadedColumns.add(column)
+        self.version += 1
+
+    def applyMeshes(self, column, results):
+        level = self.meshingLevels.pop(column, 0)
+        if column in self.staleColumns:
+            self.staleColumns.discard(column)
+            return
+        if column not in self.loadedColumns or self.distance(column) > self.radius + 1:
+            return
+        for key, geomNode, stats in results:
+            self.attachChunk(key, geomNode, stats)
+        self.meshedColumns[column] = level
+
+    def attachChunk(self, key, geomNode, stats):
+        self.detachChunk(key)
+        if geomNode is not None:
+            chunkNode = self.parent.attachNewNode(geomNode)
+            chunkNode.setPos(*chunkOrigin(key))
+            self.chunkNodes[key] = chunkNode
+            self.meshStats[key] = stats
+
+    def detachChunk(self, key):
+        chunkNode = self.chunkNodes.pop(key, None)
+        if chunkNode is not None:
+            chunkNode.removeNode()
+        self.meshStats.pop(key, None)
+
+    def rebuildChunk(self, key):
+        # Refaz na hora, na thread principal (edições de blocos)
+        level = self.meshedColumns.get(key[:2])
+        if level is not None:
+            self.attachChunk(*meshChunk(
+                self.world, key, self.chunkState, self.greedy, level, self.light, self.ambientOcclusion))
+
+    def removeMeshes(self, column):
+        for key in [key for key in self.chunkNodes if key[:2] == column]:
+            self.detachChunk(key)
+        self.meshedColumns.pop(column, None)
+
+    def meshTotals(self):
+        faces = vertices = triangles = 0
+        for chunkFaces, chunkVertices, chunkTriangles in self.meshStats.values():
+            faces += chunkFaces
+            vertices += chunkVertices
+            triangles += chunkTriangles
+        return faces, vertices, triangles
+
+    def unloadFar(self):
+        for column in list(self.meshedColumns):
+            if self.distance(column) > self.radius + 1:
+                self.removeMeshes(column)
+        if self.generator is None:
+            return
+        for column in list(self.loadedColumns):
+            if self.distance(column) > self.radius + 2:
+                self.unloadColumn(column)
+
+    def unloadColumn(self, column):
+        self.removeMeshes(column)
+        if self.save is not None:
+            self.save.saveColumnIfDirty(self.world, *column)
+        self.world.removeColumn(*column)
+        if self.light is not None:
+            self.light.removeColumn(*column)
+        self.loadedColumns.discard(column)
+        self.version += 1
+
+    def schedule(self):
+        inFlight = len(self.generating) + len(self.meshing)
+
+        for column in self.columnsAround(self.radius + 1) if self.generator is not None else ():
+            if inFlight >= self.maxJobs:
+                return
+            if column in self.loadedColumns or column in self.generating:
+                continue
+            if self.save is not None and self.save.isPending(*column):
+                # Ainda na fila de escrita: a cópia em memória é a versão certa
+                self.applyColumn(column, self.save.loadColumn(*column))
+                continue
+            if self.useProcesses:
+                directory = self.save.directory if self.save is not None else None
+                self.generating[column] = self.executor.submit(loadColumnBuffers, directory, self.generator, *column)
+            else:
+                self.generating[column] = self.executor.submit(loadColumn, self.save, self.generator, *column)
+            inFlight += 1
+
+        for column in self.columnsAround(self.radius):
+            if inFlight >= self.maxJobs:
+                return
+            if column in self.meshing or not self.neighboursLoaded(column):
+                continue
+            level = self.lodLevel(column)
+            if self.meshedColumns.get(column) == level:
+                continue
+            keys = self.world.columnKeys(*column)
+            self.lightAround(column)
+            if self.useProcesses:
+                self.meshing[column] = self.executor.submit(
+                    meshColumnBuffers, keys, self.neighbourhoodBuffers(column), self.greedy, level,
+                    self.neighbourhoodLight(column), self.ambientOcclusion)
+            else:
+                self.meshing[column] = self.executor.submit(
+                    buildColumnMeshes, self.world, keys, self.greedy, level, self.light, self.ambientOcclusion)
+            self.meshingLevels[column] = level
+            inFlight += 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
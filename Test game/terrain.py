@@ -0,0 +1,168 @@
+from math import floor
+
+from world import AIR, SAND, DIRT, STONE, CHUNK_SIZE, CHUNK_VOLUME, Chunk
+
+try:
+    import numpy as np
+except ImportError:  # sem numpy, gera bloco a bloco em Python (mais lento)
+    np = None
+
+# Geração de terreno por coluna de chunks, sem acessar o mundo, para poder
+# rodar fora da thread principal. Mesmas camadas de generateTerrain: areia em
+# cima, 3 de terra e o resto de pedra até 8 blocos de profundidade, agora em
+# cima de um mapa de altura de ruído fractal com semente.
+
+TERRAIN_DEPTH = 8
+LAYER_SIZE = CHUNK_SIZE * CHUNK_SIZE
+MASK32 = 0xFFFFFFFF
+
+
+def terrainBlock(depth):
+    # depth: quantos blocos abaixo da superfície
+    if depth < 0 or depth >= TERRAIN_DEPTH:
+        return AIR
+    if depth == 0:
+        return SAND   # Top layer is sand
+    elif depth <= 3:
+        return DIRT   # Next 3 layers are dirt
+    return STONE      # Everything below is stone
+
+
+def hashNoise(ix, iy, seed):
+    # Valor pseudoaleatório em [0, 1) para um ponto inteiro da grade
+    h = (ix * 374761393 + iy * 668265263 + seed) & MASK32
+    h = ((h ^ (h >> 13)) * 1274126177) & MASK32
+    h = h ^ (h >> 16)
+    return h / 4294967296.0
+
+
+def smooth(t):
+    return t * t * (3.0 - 2.0 * t)
+
+
+class TerrainGenerator:
+    def __init__(self, seed=0, amplitude=0, octaves=4, scale=64.0, baseHeight=0):
+        self.seed = seed
+        self.amplitude = amplitude  # altura máxima dos morros, em blocos
+        self.octaves = octaves
+        self.scale = scale  # tamanho da primeira oitava, em blocos
+        self.baseHeight = baseHeight
+        self.useNumpy = np is not None
+
+    def octaveSeeds(self):
+        return [(self.seed * 144665 + octave * 2654435761) & MASK32 for octave in range(self.octaves)]
+
+    def heightAt(self, x, y):
+        if self.amplitude == 0:
+            return self.baseHeight
+        total = 0.0
+        weight = 0.0
+        amplitude = 1.0
+        frequency = 1.0 / self.scale
+        for seed in self.octaveSeeds():
+            fx = x * frequency
+            fy = y * frequency
+            ix = floor(fx)
+            iy = floor(fy)
+            tx = smooth(fx - ix)
+            ty = smooth(fy - iy)
+            n00 = hashNoise(ix, iy, seed)
+            n10 = hashNoise(ix + 1, iy, seed)
+            n01 = hashNoise(ix, iy + 1, seed)
+            n11 = hashNoise(ix + 1, iy + 1, seed)
+            top = n00 + (n10 - n00) * tx
+            bottom = n01 + (n11 - n01) * tx
+            total += (top + (bottom - top) * ty) * amplitude
+            weight += amplitude
+            amplitude *= 0.5
+            frequency *= 2.0
+        return floor(self.baseHeight + (total / weight - 0.5) * 2.0 * self.amplitude)
+
+    def columnHeights(self, cx, cy):
+        # Alturas da superfície da coluna, indexadas [y][x]
+        baseX = cx * CHUNK_SIZE
+        baseY = cy * CHUNK_SIZE
+        if not self.useNumpy:
+            return [[self.heightAt(baseX + x, baseY + y) for x in range(CHUNK_SIZE)] for y in range(CHUNK_SIZE)]
+        if self.amplitude == 0:
+            return np.full((CHUNK_SIZE, CHUNK_SIZE), self.baseHeight, dtype=np.int64)
+
+        xs = np.arange(baseX, baseX + CHUNK_SIZE, dtype=np.float64)[None, :]
+        ys = np.arange(baseY, baseY + CHUNK_SIZE, dtype=np.float64)[:, None]
+        total = np.zeros((CHUNK_SIZE, CHUNK_SIZE))
+        weight = 0.0
+        amplitude = 1.0
+        frequency = 1.0 / self.scale
+        for seed in self.octaveSeeds():
+            fx = xs * frequency
+            fy = ys * frequency
+            ix = np.floor(fx)
+            iy = np.floor(fy)
+            tx = smooth(fx - ix)
+            ty = smooth(fy - iy)
+            ix = ix.astype(np.int64)
+            iy = iy.astype(np.int64)
+            n00 = self.hashNoiseArray(ix, iy, seed)
+            n10 = self.hashNoiseArray(ix + 1, iy, seed)
+            n01 = self.hashNoiseArray(ix, iy + 1, seed)
+            n11 = self.hashNoiseArray(ix + 1, iy + 1, seed)
+            top = n00 + (n10 - n00) * tx
+            bottom = n01 + (n11 - n01) * tx
+            total += (top + (bottom - top) * ty) * amplitude
+            weight += amplitude
+            amplitude *= 0.5
+            frequency *= 2.0
+        return np.floor(self.baseHeight + (total / weight - 0.5) * 2.0 * self.amplitude).astype(np.int64)
+
+    def hashNoiseArray(self, ix, iy, seed):
+        # Mesmo hash de hashNoise, em uint64 com máscara de 32 bits
+        ix = ix.astype(np.uint64) & MASK32
+        iy = iy.astype(np.uint64) & MASK32
+        h = (ix * np.uint64(374761393) + iy * np.uint64(668265263) + np.uint64(seed)) & np.uint64(MASK32)
+        h = ((h ^ (h >> np.uint64(13))) * np.uint64(1274126177)) & np.uint64(MASK32)
+        h = h ^ (h >> np.uint64(16))
+        return h.astype(np.float64) / 4294967296.0
+
+    def chunkHeights(self, heights):
+        # Alturas cz dos chunks que a coluna ocupa
+        if self.useNumpy:
+            low, high = int(heights.min()), int(heights.max())
+        else:
+            low = min(min(row) for row in heights)
+            high = max(max(row) for row in heights)
+        return range((low - (TERRAIN_DEPTH - 1)) >> 4, (high >> 4) + 1)
+
+    def chunkBlocks(self, cz, heights):
+        # -> (bytes dos blocos, quantidade de blocos que não são ar)
+        baseZ = cz * CHUNK_SIZE
+        if self.useNumpy:
+            # depth[z][y][x], na mesma ordem do array do chunk (x + 16y + 256z)
+            zs = np.arange(baseZ, baseZ + CHUNK_SIZE, dtype=np.int64)[:, None, None]
+            depth = heights[None, :, :] - zs
+            blocks = np.zeros(depth.shape, dtype=np.uint8)
+            blocks[(depth >= 4) & (depth < TERRAIN_DEPTH)] = STONE
+            blocks[(depth >= 1) & (depth <= 3)] = DIRT
+            blocks[depth == 0] = SAND
+            return blocks.tobytes(), int(np.count_nonzero(blocks))
+
+        blocks = bytearray(CHUNK_VOLUME)
+        count = 0
+        index = 0
+        for z in range(baseZ, baseZ + CHUNK_SIZE):
+            for row in heights:
+                for height in row:
+                    blockId = terrainBlock(height - z)
+                    if blockId != AIR:
+                        blocks[index] = blockId
+                        count += 1
+                    index += 1
+        return blocks, count
+
+    def generateColumn(self, cx, cy):
+        heights = self.columnHeights(cx, cy)
+        chunks = []
+        for cz in self.chunkHeights(heights):
+            data, count = self.chunkBlocks(cz, heights)
+            if count:
+                chunks.append(Chunk.fromBytes((cx, cy, cz), data, count))
+        return chunks
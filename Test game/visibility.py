@@ -0,0 +1,209 @@
+from collections import deque
+from time import perf_counter
+
+from panda3d.core import BoundingBox, Point3
+
+from world import CHUNK_SIZE, CHUNK_VOLUME, BLOCK_SIZE, worldToBlock
+from meshing import chunkOrigin
+
+# Quais chunks desenhar. Duas etapas:
+#
+# 1. Oclusão por conectividade: para cada chunk, quais pares de faces se
+#    ligam por ar dentro dele (flood fill). A partir do chunk da câmera, uma
+#    busca em largura só atravessa um chunk de uma face para outra se elas se
+#    ligam, e nunca volta na direção da câmera. Camadas de terra e pedra
+#    enterradas não se ligam a nada, então ficam fora.
+# 2. Frustum: dos que sobraram, só os que têm a caixa dentro da visão.
+#
+# A busca só é refeita quando a câmera muda de chunk ou o mundo muda; o
+# frustum é testado todo frame. A conectividade de chunks novos ou editados é
+# calculada aos poucos (budgetMs por frame); até lá o chunk conta como
+# ligado em todas as faces.
+
+# Direções na ordem das faces: -x, +x, -y, +y, -z, +z
+DIRECTIONS = ((-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1))
+OPPOSITE = (1, 0, 3, 2, 5, 4)
+FACE_COUNT = 6
+
+CHUNK_EXTENT = CHUNK_SIZE * BLOCK_SIZE
+
+
+def pairBits(faces):
+    # Conjunto de faces (6 bits) -> bits a * 6 + b de todos os pares
+    bits = 0
+    for a in range(FACE_COUNT):
+        if faces >> a & 1:
+            for b in range(FACE_COUNT):
+                if faces >> b & 1:
+                    bits |= 1 << (a * FACE_COUNT + b)
+    return bits
+
+
+FACE_PAIRS = [pairBits(faces) for faces in range(1 << FACE_COUNT)]
+ALL_CONNECTED = FACE_PAIRS[(1 << FACE_COUNT) - 1]
+
+
+def cellMask(test):
+    # Um byte por célula do chunk (índice x | y << 4 | z << 8), 1 onde test vale
+    return int.from_bytes(bytes(
+        1 if test(index & 15, (index >> 4) & 15, index >> 8) else 0 for index in range(CHUNK_VOLUME)), 'little')
+
+
+AIR_TABLE = bytes([1] + [0] * 255)
+NOT_MIN_X = cellMask(lambda x, y, z: x > 0)
+NOT_MAX_X = cellMask(lambda x, y, z: x < 15)
+NOT_MIN_Y = cellMask(lambda x, y, z: y > 0)
+NOT_MAX_Y = cellMask(lambda x, y, z: y < 15)
+FACE_MASKS = (
+    cellMask(lambda x, y, z: x == 0), cellMask(lambda x, y, z: x == 15),
+    cellMask(lambda x, y, z: y == 0), cellMask(lambda x, y, z: y == 15),
+    cellMask(lambda x, y, z: z == 0), cellMask(lambda x, y, z: z == 15),
+)
+STEP_Y = 16 * 8
+STEP_Z = 256 * 8
+
+
+def faceConnections(chunk):
+    # -> bits a * 6 + b ligados se as faces a e b do chunk se ligam por ar
+    if chunk is None or chunk.count == 0:
+        return ALL_CONNECTED
+    if chunk.count == CHUNK_VOLUME:
+        return 0
+
+    # O ar do chunk vira um inteiro grande (um byte por célula) e cada região
+    # cresce com deslocamentos e máscaras, todas as células de uma vez
+    air = int.from_bytes(chunk.toBytes().translate(AIR_TABLE), 'little')
+    connections = 0
+    while air:
+        region = air & -air
+        while True:
+            grown = air & (
+                region
+                | (region & NOT_MAX_X) << 8 | (region & NOT_MIN_X) >> 8
+                | (region & NOT_MAX_Y) << STEP_Y | (region & NOT_MIN_Y) >> STEP_Y
+                | region << STEP_Z | region >> STEP_Z
+            )
+            if grown == region:
+                break
+            region = grown
+        air &= ~region
+
+        faces = 0
+        for face, mask in enumerate(FACE_MASKS):
+            if region & mask:
+                faces |= 1 << face
+        connections |= FACE_PAIRS[faces]
+        if connections == ALL_CONNECTED:
+            break
+    return connections
+
+
+class ChunkCulling:
+    def __init__(self, world, streamer, budgetMs=2.0):
+        self.world = world
+        self.streamer = streamer
+        self.budget = budgetMs / 1000.0
+        self.connections = {}  # chunk -> bits de faceConnections
+        self.bounds = {}  # chunk -> BoundingBox no render
+        self.reachable = None  # chunks alcançados pela busca
+        self.searchFrom = None
+        self.searchVersion = None
+        self.dirty = True
+        self.stats = {'chunks': 0, 'drawn': 0, 'frustumCulled': 0, 'occlusionCulled': 0}
+
+    def invalidate(self, x, y, z):
+        # Bloco editado: a conectividade do chunk (e a busca) precisam ser refeitas
+        self.connections.pop((x >> 4, y >> 4, z >> 4), None)
+        self.dirty = True
+
+    def chunkBounds(self, key):
+        box = self.bounds.get(key)
+        if box is None:
+            x, y, z = chunkOrigin(key)
+            box = self.bounds[key] = BoundingBox(
+                Point3(x, y, z), Point3(x + CHUNK_EXTENT, y + CHUNK_EXTENT, z + CHUNK_EXTENT))
+        return box
+
+    def chunkConnections(self, key, deadline):
+        connections = self.connections.get(key)
+        if connections is None:
+            chunk = self.world.getChunk(*key)
+            if chunk is not None and chunk.count not in (0, CHUNK_VOLUME) and perf_counter() >= deadline:
+                # Sem tempo neste frame: conta como aberto e tenta de novo depois
+                self.dirty = True
+                return ALL_CONNECTED
+            connections = self.connections[key] = faceConnections(chunk)
+        return connections
+
+    def forgetUnloaded(self):
+        columns = self.streamer.loadedColumns
+        for cache in (self.connections, self.bounds):
+            for key in [key for key in cache if key[:2] not in columns]:
+                del cache[key]
+
+    def search(self, start):
+        # Busca em largura pelos chunks que podem ser vistos do chunk da câmera
+        columns = self.streamer.loadedColumns
+        heights = [cz for column in columns for cz in self.world.columns.get(column, ())]
+        if not heights:
+            return {start}
+        bottom, top = min(heights) - 1, max(heights) + 1
+        deadline = perf_counter() + self.budget
+
+        reachable = {start}
+        queue = deque([(start, -1, 0)])  # chunk, face de entrada, direções usadas
+        while queue:
+            key, entry, used = queue.popleft()
+            connections = ALL_CONNECTED if entry < 0 else self.chunkConnections(key, deadline)
+            for direction, (dx, dy, dz) in enumerate(DIRECTIONS):
+                if used >> OPPOSITE[direction] & 1:
+                    continue
+                if entry >= 0 and not connections >> (entry * FACE_COUNT + direction) & 1:
+                    continue
+                neighbour = (key[0] + dx, key[1] + dy, key[2] + dz)
+                if neighbour in reachable or not bottom <= neighbour[2] <= top or neighbour[:2] not in columns:
+                    continue
+                reachable.add(neighbour)
+                queue.append((neighbour, OPPOSITE[direction], used | 1 << direction))
+        return reachable
+
+    def update(self, camera, lens, parent):
+        cameraPos = camera.getPos(parent)
+        start = tuple(coordinate >> 4 for coordinate in worldToBlock(*cameraPos))
+        if self.dirty or start != self.searchFrom or self.streamer.version != self.searchVersion:
+            if self.streamer.version != self.searchVersion:
+                self.forgetUnloaded()
+            self.dirty = False
+            self.searchFrom = start
+            self.searchVersion = self.streamer.version
+            self.reachable = self.search(start)
+
+        frustum = None
+        if lens is not None:
+            frustum = lens.makeBounds()
+            frustum.xform(camera.getMat(parent))
+
+        drawn = frustumCulled = occlusionCulled = 0
+        for key, chunkNode in self.streamer.chunkNodes.items():
+            if key not in self.reachable:
+                occlusionCulled += 1
+                visible = False
+            elif frustum is not None and not frustum.contains(self.chunkBounds(key)):
+                frustumCulled += 1
+                visible = False
+            else:
+                drawn += 1
+                visible = True
+
+            if visible == chunkNode.isHidden():
+                if visible:
+                    chunkNode.show()
+                else:
+                    chunkNode.hide()
+
+        self.stats = {
+            'chunks': len(self.streamer.chunkNodes),
+            'drawn': drawn,
+            'frustumCulled': frustumCulled,
+            'occlusionCulled': occlusionCulled,
+        }
@@ -0,0 +1,264 @@
+import sys
+from math import floor
+
+# Mundo em chunks de 16x16x16 blocos. Cada chunk guarda só os IDs dos blocos
+# (paleta e índices empacotados, ver Chunk), separado da parte de renderização.
+CHUNK_SIZE = 16
+CHUNK_VOLUME = CHUNK_SIZE * CHUNK_SIZE * CHUNK_SIZE
+BLOCK_SIZE = 2  # cada bloco ocupa 2x2x2 unidades no render
+
+AIR = 0
+DIRT = 1
+SAND = 2
+STONE = 3
+
+
+def blockToWorld(x, y, z):
+    # Centro do bloco em coordenadas do render (mesma grade do terreno original)
+    return (x * BLOCK_SIZE + 1, y * BLOCK_SIZE + 1, z * BLOCK_SIZE)
+
+
+def worldToBlock(wx, wy, wz):
+    return (floor(wx / BLOCK_SIZE), floor(wy / BLOCK_SIZE), floor((wz + 1) / BLOCK_SIZE))
+
+
+def chunkKey(x, y, z):
+    return (x >> 4, y >> 4, z >> 4)
+
+
+def localIndex(x, y, z):
+    return (x & 15) | ((y & 15) << 4) | ((z & 15) << 8)
+
+
+# Bits por índice da paleta: 0 (chunk de um tipo só), 1, 2, 4 ou 8. Com
+# potências de 2 um índice nunca fica dividido entre dois bytes.
+PALETTE_BITS = (0, 1, 2, 4, 8)
+
+
+def paletteBits(size):
+    for bits in PALETTE_BITS:
+        if size <= 1 << bits:
+            return bits
+    raise ValueError(f'palette of {size} block types')
+
+
+def byteMask(value, length):
+    # O mesmo byte repetido, como inteiro grande
+    return int.from_bytes(bytes([value]) * length, 'little')
+
+
+def packIndices(indices, bits):
+    # indices: um byte por bloco (< 2 ** bits) -> bytes empacotados. Cada
+    # fatia indices[k::perByte] vai para os bits k * bits de cada byte; como
+    # os valores cabem no espaço, o deslocamento do inteiro grande não passa
+    # de um byte para o outro.
+    if bits == 8:
+        return bytearray(indices)
+    perByte = 8 // bits
+    packed = 0
+    for slot in range(perByte):
+        packed |= int.from_bytes(indices[slot::perByte], 'little') << (slot * bits)
+    return bytearray(packed.to_bytes(CHUNK_VOLUME // perByte, 'little'))
+
+
+def unpackIndices(data, bits):
+    if bits == 8:
+        return bytes(data)
+    perByte = 8 // bits
+    length = CHUNK_VOLUME // perByte
+    packed = int.from_bytes(data, 'little')
+    mask = byteMask((1 << bits) - 1, length)
+    indices = bytearray(CHUNK_VOLUME)
+    for slot in range(perByte):
+        indices[slot::perByte] = ((packed >> (slot * bits)) & mask).to_bytes(length, 'little')
+    return indices
+
+
+class Chunk:
+    # Blocos guardados como paleta (IDs que aparecem no chunk) mais um
+    # índice por bloco com o mínimo de bits. Chunk de um tipo só (todo de
+    # pedra, ou ar) não guarda índices. A paleta só cresce com edições; volta
+    # ao mínimo quando o chunk é recriado de bytes (save, streaming).
+    # Bits e índices ficam juntos numa tupla (packed), trocada de uma vez: as
+    # threads de streaming leem chunks vivos enquanto a thread principal edita,
+    # e nunca podem ver uma largura nova com os índices antigos.
+    __slots__ = ('key', 'palette', 'packed', 'count')
+
+    def __init__(self, cx, cy, cz, blockId=AIR):
+        self.key = (cx, cy, cz)
+        self.palette = [blockId]
+        self.packed = (0, None)  # (bits por índice, índices empacotados)
+        self.count = 0 if blockId == AIR else CHUNK_VOLUME  # blocos que não são ar
+
+    @classmethod
+    def fromBytes(cls, key, data, count):
+        # data: um ID por bloco, no índice x | y << 4 | z << 8
+        ids = sorted(set(data))
+        chunk = cls(*key, ids[0])
+        chunk.count = count
+        if len(ids) > 1:
+            table = bytearray(256)
+            for index, blockId in enumerate(ids):
+                table[blockId] = index
+            chunk.palette = ids
+            bits = paletteBits(len(ids))
+            chunk.packed = (bits, packIndices(bytes(data).translate(table), bits))
+        return chunk
+
+    @property
+    def bits(self):
+        return self.packed[0]
+
+    def toBytes(self):
+        # Um ID por bloco (para malhas, save e cópias entre processos)
+        bits, data = self.packed
+        if bits == 0:
+            return bytes([self.palette[0]]) * CHUNK_VOLUME
+        table = bytearray(256)
+        table[:len(self.palette)] = bytes(self.palette)
+        return unpackIndices(data, bits).translate(table)
+
+    def get(self, index):
+        bits, data = self.packed
+        if bits == 0:
+            return self.palette[0]
+        if bits == 8:
+            return self.palette[data[index]]
+        perByte = 8 // bits
+        return self.palette[(data[index // perByte] >> (index % perByte * bits)) & ((1 << bits) - 1)]
+
+    def set(self, index, blockId):
+        old = self.get(index)
+        if old == blockId:
+            return old
+        if old == AIR:
+            self.count += 1
+        elif blockId == AIR:
+            self.count -= 1
+
+        try:
+            slot = self.palette.index(blockId)
+        except ValueError:
+            slot = len(self.palette)
+            self.palette.append(blockId)
+            if slot >= 1 << self.bits:
+                self.resize(paletteBits(len(self.palette)))
+
+        bits, data = self.packed
+        if bits == 8:
+            data[index] = slot
+            return old
+        perByte = 8 // bits
+        shift = index % perByte * bits
+        position = index // perByte
+        data[position] = (data[position] & ~(((1 << bits) - 1) << shift)) | (slot << shift)
+        return old
+
+    def resize(self, bits):
+        # Empacota na largura nova antes de publicar bits e índices juntos
+        oldBits, data = self.packed
+        indices = bytes(CHUNK_VOLUME) if oldBits == 0 else unpackIndices(data, oldBits)
+        self.packed = (bits, packIndices(indices, bits))
+
+    def memoryBytes(self):
+        # Objeto, paleta e índices (sem a chave, que o dicionário do mundo divide)
+        size = sys.getsizeof(self) + sys.getsizeof(self.palette)
+        data = self.packed[1]
+        if data is not None:
+            size += sys.getsizeof(data)
+        return size
+
+
+class World:
+    def __init__(self):
+        self.chunks = {}
+        self.columns = {}  # (cx, cy) -> alturas cz dos chunks carregados
+
+    def getChunk(self, cx, cy, cz):
+        return self.chunks.get((cx, cy, cz))
+
+    def addChunk(self, chunk):
+        self.chunks[chunk.key] = chunk
+        self.columns.setdefault(chunk.key[:2], set()).add(chunk.key[2])
+
+    def removeChunk(self, key):
+        self.chunks.pop(key, None)
+        column = self.columns.get(key[:2])
+        if column is not None:
+            column.discard(key[2])
+            if not column:
+                del self.columns[key[:2]]
+
+    def columnKeys(self, cx, cy):
+        return [(cx, cy, cz) for cz in sorted(self.columns.get((cx, cy), ()))]
+
+    def removeColumn(self, cx, cy):
+        keys = self.columnKeys(cx, cy)
+        for key in keys:
+            self.removeChunk(key)
+        return keys
+
+    def getBlock(self, x, y, z):
+        chunk = self.chunks.get((x >> 4, y >> 4, z >> 4))
+        if chunk is None:
+            return AIR
+        return chunk.get((x & 15) | ((y & 15) << 4) | ((z & 15) << 8))
+
+    def setBlock(self, x, y, z, blockId):
+        key = (x >> 4, y >> 4, z >> 4)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if blockId == AIR:
+                return AIR
+            chunk = Chunk(*key)
+            self.addChunk(chunk)
+        old = chunk.set(localIndex(x, y, z), blockId)
+        if chunk.count == 0:
+            self.removeChunk(key)
+        return old
+
+    def memoryStats(self):
+        # Memória dos blocos por tipo de chunk (bits por índice)
+        stats = {'chunks': len(self.chunks), 'blocks': 0, 'bytes': 0, 'byBits': dict.fromkeys(PALETTE_BITS, 0)}
+        for chunk in self.chunks.values():
+            stats['blocks'] += chunk.count
+            stats['bytes'] += chunk.memoryBytes()
+            stats['byBits'][chunk.bits] += 1
+        stats['bytesPerChunk'] = stats['bytes'] / stats['chunks'] if self.chunks else 0
+        return stats
+
+    def isSolid(self, x, y, z):
+        return self.getBlock(x, y, z) != AIR
+
+    def blockCount(self):
+        return sum(chunk.count for chunk in self.chunks.values())
+
+    def iterBlocks(self):
+        for (cx, cy, cz), chunk in self.chunks.items():
+            blocks = chunk.toBytes()
+            for index in range(CHUNK_VOLUME):
+                blockId = blocks[index]
+                if blockId != AIR:
+                    yield (
+                        (cx << 4) | (index & 15),
+                        (cy << 4) | ((index >> 4) & 15),
+                        (cz << 4) | (index >> 8),
+                        blockId,
+                    )
+
+
+def generateDefaultTerrain(world):
+    # Generate optimized 25x25x8 terrain with proper layering
+    for z in range(8):
+        for y in range(25):
+            for x in range(25):
+                # Calculate block type based on depth
+                if z == 0:
+                    blockId = SAND   # Top layer is sand
+                elif z <= 3:
+                    blockId = DIRT   # Next 3 layers are dirt
+                else:
+                    blockId = STONE  # Everything below is stone
+
+                # Center the terrain and build downward
+                world.setBlock(x - 13, y - 13, -z, blockId)